@@ -1,7 +1,9 @@
 from django.contrib.admin.sites import AdminSite
 from .admin_actions import (
     datasource_slugify_name,
+    evaluator_rescore,
     textprocessingjob_run,
+    textprocessingjob_run_batch,
     textprocessingjobrun_recover,
 )
 from django.db.models import Avg
@@ -38,6 +40,8 @@ class LLMAdmin(ModelAdmin):
     list_display = (
         "model",
         "version",
+        "prompt_token_price",
+        "completion_token_price",
     )
     list_filter = (
         "model",
@@ -50,6 +54,7 @@ class LLMAdmin(ModelAdmin):
 class EvaluatorAdmin(ModelAdmin):
     list_display = ("name", "description")
     list_filter = ("name",)
+    actions = [evaluator_rescore]
 
 
 @register(TextPreprocessor)
@@ -96,7 +101,7 @@ class TextProcessingJobAdmin(ModelAdmin):
         "llms",
     )
     readonly_fields = ("created_at",)
-    actions = [textprocessingjob_run]
+    actions = [textprocessingjob_run, textprocessingjob_run_batch]
 
     inlines = [
         TextProcessingJobRunInline,
@@ -149,6 +154,8 @@ class TextProcessingJobRunAdmin(ModelAdmin):
         "run_outputs_count",
         "runtime_per_run_output",
         "processed_outputs_count",
+        "total_tokens",
+        "cost",
         "status",
     )
     list_filter = (
@@ -203,6 +210,20 @@ class TextProcessingJobRunAdmin(ModelAdmin):
 
     processed_outputs_count.short_description = "Processed Outputs"
 
+    def total_tokens(self, obj):
+        if obj.token_budget:
+            return f"{obj.total_tokens} / {obj.token_budget}"
+        return obj.total_tokens
+
+    total_tokens.short_description = "Tokens"
+
+    def cost(self, obj):
+        if obj.cost_budget:
+            return f"${obj.cost:.4f} / ${obj.cost_budget:.2f}"
+        return f"${obj.cost:.4f}"
+
+    cost.short_description = "Cost"
+
 
 class TextProcessingEvaluatorOutputInline(admin.TabularInline):
     model = TextProcessingEvaluatorOutput
@@ -1,12 +1,16 @@
 import json
 import logging
-from .models import RawText, TextProcessingJobRun
+from .models import (
+    Evaluator,
+    RawText,
+    TextProcessingEvaluatorOutput,
+    TextProcessingJobRun,
+)
 from django.contrib import messages, admin
 from django.utils.text import slugify
 
 from background_task import background
 
-
 logger = logging.getLogger(__name__)
 
 
@@ -33,6 +37,25 @@ def textprocessingjob_run(modeladmin, request, queryset):
         )
 
 
+@background(schedule=0)
+def _task_textprocessingjob_run_batch(run_id):
+    logger.info(
+        f"TextProcessingJobRun {run_id} scheduled for background execution in batch mode."
+    )
+    TextProcessingJobRun.objects.get(id=run_id).run(batch=True)
+
+
+@admin.action(description="Run selected %(verbose_name_plural)s through the batch API")
+def textprocessingjob_run_batch(modeladmin, request, queryset):
+    for textprocessingjob in queryset:
+        run_id = textprocessingjob.create_run()
+        _task_textprocessingjob_run_batch(run_id)
+        messages.info(
+            request,
+            f"Created Job Run {run_id} in batch mode. Check Background Tasks for status.",
+        )
+
+
 @background(schedule=0)
 def _task_textprocessingjobrun_recover(run_id):
     logger.info(f"TextProcessingJobRun {run_id} scheduled for background execution.")
@@ -48,3 +71,22 @@ def textprocessingjobrun_recover(modeladmin, request, queryset):
             request,
             f"Initiated recovery of Job Run {textprocessingjobrun.id}. Check Background Tasks for status.",
         )
+
+
+@background(schedule=0)
+def _task_evaluator_rescore(evaluator_ids):
+    logger.info(
+        f"Rescoring with Evaluators {evaluator_ids} scheduled for background execution."
+    )
+    TextProcessingEvaluatorOutput.rescore(
+        Evaluator.objects.filter(id__in=evaluator_ids)
+    )
+
+
+@admin.action(description="Score stored outputs with selected %(verbose_name_plural)s")
+def evaluator_rescore(modeladmin, request, queryset):
+    _task_evaluator_rescore(list(queryset.values_list("id", flat=True)))
+    messages.info(
+        request,
+        "Scoring the outputs missing a score from the selected evaluators. Check Background Tasks for status.",
+    )
@@ -0,0 +1,63 @@
+import logging
+from django.core.management.base import BaseCommand
+from summa.evals import Evaluators
+from core.models import (
+    Evaluator,
+    TextProcessingEvaluatorOutput,
+    TextProcessingOutput,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Score stored TextProcessingOutputs with Evaluators, without generating them again."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--evaluator",
+            dest="evaluators",
+            nargs="+",
+            choices=[e.name for e in Evaluators],
+            default=[e.name for e in Evaluators],
+            help="The evaluators to score with. Defaults to all of them.",
+        )
+        parser.add_argument(
+            "--job", type=int, help="Only score the outputs of this TextProcessingJob."
+        )
+        parser.add_argument(
+            "--run",
+            type=int,
+            help="Only score the outputs of this TextProcessingJobRun.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="The number of outputs fetched, scored and saved at a time.",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Replace existing scores (e.g. after an evaluator changed) instead of only adding the missing ones.",
+        )
+
+    def handle(self, *args, **kwargs):
+        evaluators = [
+            Evaluator.objects.get_or_create(name=name)[0]
+            for name in kwargs["evaluators"]
+        ]
+        outputs = TextProcessingOutput.objects.all()
+        if kwargs["job"] is not None:
+            outputs = outputs.filter(run_output__run__job_id=kwargs["job"])
+        if kwargs["run"] is not None:
+            outputs = outputs.filter(run_output__run_id=kwargs["run"])
+
+        logger.info(f"Rescoring with {', '.join(kwargs['evaluators'])}...")
+        saved = TextProcessingEvaluatorOutput.rescore(
+            evaluators,
+            outputs,
+            chunk_size=kwargs["chunk_size"],
+            replace=kwargs["replace"],
+        )
+        logger.info(f"Finished rescoring, {saved} scores saved.")
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_alter_llm_model_alter_llm_version_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="textprocessingoutput",
+            name="output_tokens_per_second",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="textprocessingoutput",
+            name="time_to_first_token",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="textprocessingoutput",
+            name="time_to_last_token",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_textprocessingoutput_streaming_metrics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llm",
+            name="completion_token_price",
+            field=models.FloatField(
+                blank=True,
+                help_text="USD per 1M completion tokens, used for run cost budgets.",
+                null=True,
+                verbose_name="Completion Token Price",
+            ),
+        ),
+        migrations.AddField(
+            model_name="llm",
+            name="prompt_token_price",
+            field=models.FloatField(
+                blank=True,
+                help_text="USD per 1M prompt tokens, used for run cost budgets.",
+                null=True,
+                verbose_name="Prompt Token Price",
+            ),
+        ),
+        migrations.AddField(
+            model_name="textprocessingjobrun",
+            name="cost_budget",
+            field=models.FloatField(
+                blank=True,
+                help_text="Stop dispatching requests once this cost (USD) has been incurred.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="textprocessingjobrun",
+            name="token_budget",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                help_text="Stop dispatching requests once this many prompt and completion tokens have been used.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="textprocessingoutput",
+            name="completion_tokens",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="textprocessingoutput",
+            name="prompt_tokens",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="textprocessingjobrun",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("CREATED", "Created"),
+                    ("STARTED", "Started"),
+                    ("FINISHED", "Finished"),
+                    ("FAILED", "Failed"),
+                    ("RECOVERING", "Recovering"),
+                    ("BUDGET_EXCEEDED", "Budget Exceeded"),
+                ],
+                default="CREATED",
+                max_length=200,
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_token_usage_and_budgets"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="textprocessor",
+            name="name",
+            field=models.CharField(
+                choices=[
+                    ("BASIC", "Basic Text Processor"),
+                    ("EXPONENTIAL_BACKOFF", "Exponential Backoff Text Processor"),
+                    ("HEDGED", "Hedged Text Processor"),
+                ],
+                max_length=200,
+                unique=True,
+            ),
+        ),
+    ]
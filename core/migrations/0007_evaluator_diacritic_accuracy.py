@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_textprocessor_hedged"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="evaluator",
+            name="name",
+            field=models.CharField(
+                choices=[
+                    (
+                        "RA_CS_CL",
+                        "RA (Case Sensitive, Character Level, Padding Stripped)",
+                    ),
+                    (
+                        "RA_CI_CL",
+                        "RA (Case Insensitive, Character Level, Padding Stripped)",
+                    ),
+                    ("RA_CS_WL", "RA (Case Sensitive, Word Level, Padding Stripped)"),
+                    ("RA_CI_WL", "RA (Case Insensitive, Word Level, Padding Stripped)"),
+                    (
+                        "RER_CS_CL",
+                        "RER (Case Sensitive, Character Level, Padding Stripped)",
+                    ),
+                    (
+                        "RER_CI_CL",
+                        "RER (Case Insensitive, Character Level, Padding Stripped)",
+                    ),
+                    ("RER_CS_WL", "RER (Case Sensitive, Word Level, Padding Stripped)"),
+                    (
+                        "RER_CI_WL",
+                        "RER (Case Insensitive, Word Level, Padding Stripped)",
+                    ),
+                    (
+                        "DRA_CS_CL",
+                        "DRA (Case Sensitive, Character Level, Padding Stripped)",
+                    ),
+                    (
+                        "DRA_CI_CL",
+                        "DRA (Case Insensitive, Character Level, Padding Stripped)",
+                    ),
+                    ("DRA_CS_WL", "DRA (Case Sensitive, Word Level, Padding Stripped)"),
+                    (
+                        "DRA_CI_WL",
+                        "DRA (Case Insensitive, Word Level, Padding Stripped)",
+                    ),
+                ],
+                max_length=200,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_evaluator_diacritic_accuracy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="textprocessingoutput",
+            name="requested_llm",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.llm",
+            ),
+        ),
+    ]
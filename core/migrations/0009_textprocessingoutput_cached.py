@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_textprocessingoutput_requested_llm"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="textprocessingoutput",
+            name="cached",
+            field=models.BooleanField(default=False),
+        ),
+    ]
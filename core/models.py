@@ -2,9 +2,15 @@ import json
 import os
 import logging
 import django.core.exceptions
-import concurrent.futures
+import functools
+import itertools
+from typing import List
 import summa
+from decouple import config
+from django.conf import settings
 from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
 from django.db.utils import IntegrityError
 from django.utils.text import slugify
 from django.core.files.uploadedfile import InMemoryUploadedFile
@@ -14,10 +20,22 @@ import summa.llms
 from .utils import short_text, md5
 from .models_validators import datasource_validate_json
 from summa.llms import TextGenerationLLMs, TextGenerationLLM
+from summa.budgets import BudgetExceededError, TokenBudget
+from summa.singleflight import default_single_flight
 from summa.preprocessors import TextPreprocessors, TextPreprocessor
-from summa.processors import TextProcessors, TextProcessor
-from summa.evals import Evaluators
-from summa.pipelines import PipelineRunner, PipelineRunOutput
+from summa.processors import TextProcessors, TextProcessor, default_circuit_breakers
+from summa.caches import default_evaluator_score_cache
+from summa.evals import Evaluators, default_evaluation_executor, evaluate_batch
+from summa.packing import PromptPacker
+from summa.retries import RetryBudget
+from summa.limiters import concurrency_limiter_stats
+from summa.pipelines import (
+    BatchPipelineRunner,
+    PackedPipelineRunner,
+    PipelineRunner,
+    PipelineRunOutput,
+    ScheduledPipelineRunner,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -146,6 +164,12 @@ def prompt_template_upload_path(instance, filename):
     return _upload_path(instance, filename, "prompt_templates")
 
 
+@functools.lru_cache(maxsize=256)
+def _prompt_template_instance(path: str, text_md5: str) -> summa.llms.PromptTemplate:
+    # Keyed on the template's MD5 hash as well, so that a changed template gets a new instance
+    return summa.llms.PromptTemplate(template_filename=path)
+
+
 class PromptTemplate(MD5TextModel):
     file = models.FileField(
         upload_to=prompt_template_upload_path,
@@ -160,8 +184,8 @@ class PromptTemplate(MD5TextModel):
         super().save(*args, **kwargs)
 
     @property
-    def instance(self) -> str:
-        return summa.llms.PromptTemplate(template_filename=self.file.path)
+    def instance(self) -> summa.llms.PromptTemplate:
+        return _prompt_template_instance(self.file.path, self.text_md5)
 
     def __str__(self):
         return f"{os.path.basename(self.file.name)}"
@@ -180,6 +204,18 @@ class LLM(models.Model):
         unique=True,
         verbose_name="Model Version",
     )
+    prompt_token_price = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name="Prompt Token Price",
+        help_text="USD per 1M prompt tokens, used for run cost budgets.",
+    )
+    completion_token_price = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name="Completion Token Price",
+        help_text="USD per 1M completion tokens, used for run cost budgets.",
+    )
 
     def save(self, *args, **kwargs):
         if self.model is None or self.model == "":
@@ -241,6 +277,7 @@ class TextProcessingJobRun(models.Model):
         FINISHED = "FINISHED", "Finished"
         FAILED = "FAILED", "Failed"
         RECOVERING = "RECOVERING", "Recovering"
+        BUDGET_EXCEEDED = "BUDGET_EXCEEDED", "Budget Exceeded"
 
     job = models.ForeignKey("TextProcessingJob", on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -249,6 +286,72 @@ class TextProcessingJobRun(models.Model):
     status = models.CharField(
         max_length=200, choices=Statuses.choices, default=Statuses.CREATED
     )
+    token_budget = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Stop dispatching requests once this many prompt and completion tokens have been used.",
+    )
+    cost_budget = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Stop dispatching requests once this cost (USD) has been incurred.",
+    )
+
+    @property
+    def _outputs(self) -> models.QuerySet:
+        return TextProcessingOutput.objects.filter(run_output__run=self)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self._outputs.aggregate(total=Sum("prompt_tokens"))["total"] or 0
+
+    @property
+    def completion_tokens(self) -> int:
+        return self._outputs.aggregate(total=Sum("completion_tokens"))["total"] or 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost(self) -> float:
+        return self._cost(self._outputs)
+
+    @staticmethod
+    def _cost(outputs: models.QuerySet) -> float:
+        return (
+            outputs.aggregate(
+                total=Sum(
+                    Coalesce(F("prompt_tokens") * F("llm__prompt_token_price"), 0.0)
+                    + Coalesce(
+                        F("completion_tokens") * F("llm__completion_token_price"), 0.0
+                    ),
+                    output_field=models.FloatField(),
+                )
+            )["total"]
+            or 0.0
+        ) / 1_000_000
+
+    def _budget(self) -> TokenBudget:
+        # Outputs saved by an earlier attempt of this run count towards its budget, unless they were served from the
+        # response cache (and so were free)
+        paid = self._outputs.filter(cached=False)
+        tokens = paid.aggregate(
+            prompt=Sum("prompt_tokens"), completion=Sum("completion_tokens")
+        )
+        return TokenBudget(
+            max_tokens=self.token_budget,
+            max_cost=self.cost_budget,
+            prices={
+                llm.instance.model_version: (
+                    llm.prompt_token_price or 0,
+                    llm.completion_token_price or 0,
+                )
+                for llm in self.job.llms.all()
+            },
+            spent_tokens=(tokens["prompt"] or 0) + (tokens["completion"] or 0),
+            spent_cost=self._cost(paid),
+        )
 
     def set_status(self, status: Statuses):
         self.status = status
@@ -258,8 +361,23 @@ class TextProcessingJobRun(models.Model):
             self.finished_at = timezone.now()
         self.save()
 
+    def _saved_units(self) -> set:
+        # The (raw text MD5 hash, requested LLM id, prompt template id) of every output saved by this run, in a single
+        # query. Outputs saved before the requested LLM was recorded were requested from the LLM that answered them.
+        return set(
+            self._outputs.annotate(
+                requested_llm_or_llm=Coalesce("requested_llm", "llm")
+            ).values_list(
+                "run_output__raw_text__text_md5",
+                "requested_llm_or_llm",
+                "prompt_template_id",
+            )
+        )
+
     @transaction.atomic
-    def _save_output(self, job: "TextProcessingJob", output: PipelineRunOutput):
+    def _save_output(
+        self, job: "TextProcessingJob", output: PipelineRunOutput, saved_units=None
+    ):
         raw_text, created = RawText.objects.get_or_create(
             data_source=job.data_source,
             text_md5=md5(output.raw_text),
@@ -271,72 +389,195 @@ class TextProcessingJobRun(models.Model):
             text_md5=md5(output.preprocessed_text),
             defaults={"text": output.preprocessed_text},
         )
-        run_output = TextProcessingJobRunOutput.objects.create(
-            run=self, raw_text=raw_text, preprocessed_text=preprocessed_text
-        )
+        # A text's outputs may be saved one at a time, all under the same run output
+        run_output = TextProcessingJobRunOutput.objects.filter(
+            run=self, raw_text=raw_text
+        ).first()
+        if run_output is None:
+            run_output = TextProcessingJobRunOutput.objects.create(
+                run=self, raw_text=raw_text, preprocessed_text=preprocessed_text
+            )
+        evaluators = {evaluator.name: evaluator for evaluator in job.evaluators.all()}
+
+        def version(model_version):
+            return next(
+                llm.name
+                for llm in TextGenerationLLMs
+                if llm.model_version == model_version
+            )
+
         for processed_output in output.processed_outputs:
+            # Hedged requests may have been answered by a backup model that is not part of the job
+            llm, created = LLM.objects.get_or_create(
+                model=processed_output.model,
+                version=version(processed_output.model_version),
+            )
+            requested_llm = job.llms.get(
+                version=version(processed_output.requested_model_version)
+            )
+            prompt_template = job.prompt_templates.get(
+                text=processed_output.prompt_template
+            )
+            if (
+                saved_units is not None
+                and (raw_text.text_md5, requested_llm.id, prompt_template.id)
+                in saved_units
+            ):
+                # Saved by an earlier attempt of this run
+                continue
             processing_output = TextProcessingOutput.objects.create(
                 run_output=run_output,
-                llm=job.llms.get(
-                    model=processed_output.model,
-                    version=next(
-                        llm.name
-                        for llm in TextGenerationLLMs
-                        if llm.value.model_version == processed_output.model_version
-                    ),
-                ),
-                prompt_template=job.prompt_templates.get(
-                    text=processed_output.prompt_template
-                ),
+                llm=llm,
+                requested_llm=requested_llm,
+                prompt_template=prompt_template,
                 prompt=processed_output.prompt,
                 output=processed_output.output,
                 generation_time=processed_output.generation_time,
+                time_to_first_token=processed_output.time_to_first_token,
+                time_to_last_token=processed_output.time_to_last_token,
+                output_tokens_per_second=processed_output.output_tokens_per_second,
+                prompt_tokens=processed_output.prompt_tokens,
+                completion_tokens=processed_output.completion_tokens,
+                cached=processed_output.cached,
             )
-            for evaluator_output in processed_output.evals:
-                TextProcessingEvaluatorOutput.objects.create(
+            TextProcessingEvaluatorOutput.objects.bulk_create(
+                TextProcessingEvaluatorOutput(
                     processing_output=processing_output,
-                    evaluator=job.evaluators.get(
-                        name=Evaluators(evaluator_output.evaluator).name
-                    ),
+                    evaluator=evaluators[Evaluators(evaluator_output.evaluator).name],
                     score=evaluator_output.score,
                 )
+                for evaluator_output in processed_output.evals
+            )
 
-    def run(self, recover=False):
+    def _pipeline_runner(self, batch=False) -> PipelineRunner:
         preprocessor = self.job.preprocessor.instance
         processor = self.job.processor.instance
         llms = [llm.instance for llm in self.job.llms.all()]
         prompt_templates = [pt.instance for pt in self.job.prompt_templates.all()]
         evaluators = [eval.instance for eval in self.job.evaluators.all()]
+        budget = self._budget()
+        retry_budget = RetryBudget(
+            ratio=config("SUMMA_RETRY_BUDGET_RATIO", default=0.2, cast=float),
+            min_retries=config("SUMMA_RETRY_BUDGET_MIN_RETRIES", default=100, cast=int),
+        )
+        if batch:
+            return BatchPipelineRunner(
+                preprocessor,
+                processor,
+                llms,
+                prompt_templates,
+                evaluators,
+                batch_dir=os.path.join(settings.MEDIA_ROOT, "batches", str(self.id)),
+                poll_interval=config(
+                    "SUMMA_BATCH_POLL_INTERVAL", default=30, cast=float
+                ),
+                max_wait=config("SUMMA_BATCH_MAX_WAIT", default=86400, cast=float)
+                or None,
+                budget=budget,
+                retry_budget=retry_budget,
+            )
+        max_texts = config("SUMMA_PACK_MAX_TEXTS", default=1, cast=int)
+        if max_texts > 1:
+            return PackedPipelineRunner(
+                preprocessor,
+                processor,
+                llms,
+                prompt_templates,
+                evaluators,
+                packer=PromptPacker(
+                    max_texts=max_texts,
+                    max_tokens=config("SUMMA_PACK_MAX_TOKENS", default=1000, cast=int),
+                ),
+                budget=budget,
+                retry_budget=retry_budget,
+            )
+        return ScheduledPipelineRunner(
+            preprocessor,
+            processor,
+            llms,
+            prompt_templates,
+            evaluators,
+            max_workers=config(
+                "SUMMA_SCHEDULER_WORKERS",
+                default=config("SUMMA_DEFERRED_RETRY_WORKERS", default=64, cast=int),
+                cast=int,
+            ),
+            budget=budget,
+            retry_budget=retry_budget,
+            max_per_model=config("SUMMA_SCHEDULER_MAX_PER_MODEL", default=0, cast=int)
+            or None,
+            max_queued=config("SUMMA_SCHEDULER_MAX_QUEUED", default=0, cast=int)
+            or None,
+            deferred_retries=config("SUMMA_DEFERRED_RETRIES", default=True, cast=bool),
+        )
+
+    def run(self, recover=False, batch=False):
         raw_texts = self.job.data_source.texts
 
-        pipeline_runner = PipelineRunner(
-            preprocessor, processor, llms, prompt_templates, evaluators
-        )
+        pipeline_runner = self._pipeline_runner(batch=batch)
 
+        saved_units = None
         if recover:
             self.set_status(self.Statuses.RECOVERING)
             logger.info(f"Recovering job run {self.id}")
-            existing_outputs = TextProcessingJobRunOutput.objects.filter(run=self)
-            existing_raw_texts = [output.raw_text.text for output in existing_outputs]
-            raw_texts = [
-                raw_text for raw_text in raw_texts if raw_text not in existing_raw_texts
-            ]
+            saved_units = self._saved_units()
+            logger.info(f"{len(saved_units)} outputs were already saved")
         else:
             self.set_status(self.Statuses.STARTED)
             logger.info(f"Starting job run {self.id}")
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [
-                executor.submit(pipeline_runner.run, raw_text) for raw_text in raw_texts
-            ]
-            for future in concurrent.futures.as_completed(futures):
+        # The indices of the runner's LLMs and prompt templates map to the job's, in the same order
+        llm_ids = [llm.id for llm in self.job.llms.all()]
+        prompt_template_ids = [pt.id for pt in self.job.prompt_templates.all()]
+
+        def saved(raw_text, l, j):
+            return (md5(raw_text), llm_ids[l], prompt_template_ids[j]) in saved_units
+
+        if isinstance(pipeline_runner, ScheduledPipelineRunner):
+            # Every (text, LLM, prompt template) output is saved as soon as it is evaluated, and recovering only
+            # dispatches the ones that are missing
+            outputs = pipeline_runner.run_units(
+                raw_texts, done=saved if saved_units else None
+            )
+        else:
+            # Texts are run as a whole, minus the ones that are complete; outputs saved before are not saved twice
+            if saved_units:
+                raw_texts = (
+                    raw_text
+                    for raw_text in raw_texts
+                    if not all(
+                        saved(raw_text, l, j)
+                        for l in range(len(llm_ids))
+                        for j in range(len(prompt_template_ids))
+                    )
+                )
+            outputs = pipeline_runner.run_many(raw_texts)
+
+        try:
+            for output in outputs:
                 try:
-                    self._save_output(self.job, future.result())
+                    self._save_output(self.job, output, saved_units)
                 except Exception as e:
                     logger.error(e, exc_info=True)
                     self.set_status(self.Statuses.FAILED)
-                    logger.error("Job failed, cancelling remaining jobs")
-
+        except BudgetExceededError as e:
+            logger.warning(f"Job run {self.id} stopped: {e}")
+            self.set_status(self.Statuses.BUDGET_EXCEEDED)
+            return
+        except Exception as e:
+            # Every text that could be processed has been saved
+            logger.error(e, exc_info=True)
+            self.set_status(self.Statuses.FAILED)
+            return
+
+        logger.info(
+            f"Job run {self.id} finished ({default_single_flight()}, {pipeline_runner.retry_budget})"
+        )
+        circuit_breakers = default_circuit_breakers()
+        if circuit_breakers is not None:
+            logger.info(f"Circuit breakers: {circuit_breakers.stats}")
+        logger.info(f"Concurrency limits: {concurrency_limiter_stats()}")
+        logger.info(pipeline_runner._get_score_cache())
         self.set_status(self.Statuses.FINISHED)
 
 
@@ -349,8 +590,16 @@ class TextProcessingJob(models.Model):
     evaluators = models.ManyToManyField(Evaluator)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def create_run(self):
-        job_run = TextProcessingJobRun.objects.create(job=self)
+    def create_run(self, token_budget=None, cost_budget=None):
+        job_run = TextProcessingJobRun.objects.create(
+            job=self,
+            token_budget=token_budget
+            or config("SUMMA_RUN_TOKEN_BUDGET", default=0, cast=int)
+            or None,
+            cost_budget=cost_budget
+            or config("SUMMA_RUN_COST_BUDGET", default=0, cast=float)
+            or None,
+        )
         return job_run.id
 
     def __str__(self):
@@ -367,10 +616,24 @@ class TextProcessingJobRunOutput(models.Model):
 class TextProcessingOutput(models.Model):
     run_output = models.ForeignKey(TextProcessingJobRunOutput, on_delete=models.CASCADE)
     llm = models.ForeignKey(LLM, on_delete=models.CASCADE)
+    # The job's LLM the output was requested from, which differs from llm when a hedged request was answered by a
+    # backup model. Not recorded for outputs saved before it was introduced.
+    requested_llm = models.ForeignKey(
+        LLM, null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
     prompt_template = models.ForeignKey(PromptTemplate, on_delete=models.CASCADE)
     prompt = models.TextField()
     output = models.TextField()
     generation_time = models.FloatField()
+    # Only recorded for streamed generations
+    time_to_first_token = models.FloatField(null=True, blank=True)
+    time_to_last_token = models.FloatField(null=True, blank=True)
+    output_tokens_per_second = models.FloatField(null=True, blank=True)
+    # Reported by the provider, or estimated when it does not report usage
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    # Served from the LLM response cache, so not paid for
+    cached = models.BooleanField(default=False)
 
 
 class TextProcessingEvaluatorOutput(models.Model):
@@ -379,3 +642,90 @@ class TextProcessingEvaluatorOutput(models.Model):
     )
     evaluator = models.ForeignKey(Evaluator, on_delete=models.CASCADE)
     score = models.FloatField()
+
+    @classmethod
+    def rescore(
+        cls,
+        evaluators: List[Evaluator],
+        outputs: models.QuerySet = None,
+        chunk_size: int = 500,
+        replace: bool = False,
+    ) -> int:
+        """
+        Scores stored outputs with the given evaluators, without generating them again. Outputs are streamed from the
+        database in chunks (through a server-side cursor where the database supports it), scored in parallel (see
+        summa.evals.evaluate_batch) and their scores bulk-inserted, one transaction per chunk.
+
+        Args:
+            evaluators (List[Evaluator]): The evaluators to score with.
+            outputs (QuerySet, optional): The outputs to score. Defaults to None (every stored output).
+            chunk_size (int, optional): The number of outputs fetched, scored and saved at a time. Defaults to 500.
+            replace (bool, optional): If True, the existing scores of the evaluators are replaced (e.g. after an
+                evaluator changed), and so are their entries in the evaluator score cache. Otherwise, only the missing
+                scores are computed. Defaults to False.
+
+        Returns:
+            int: The number of scores saved.
+        """
+        evaluators = list(evaluators)
+        if outputs is None:
+            outputs = TextProcessingOutput.objects.all()
+        rows = (
+            outputs.order_by()
+            .values_list("id", "run_output__raw_text__text", "output")
+            .iterator(chunk_size=chunk_size)
+        )
+        score_cache = default_evaluator_score_cache()
+        executor = default_evaluation_executor()
+        saved = 0
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            with transaction.atomic():
+                existing = cls.objects.filter(
+                    processing_output_id__in=[output_id for output_id, _, _ in chunk],
+                    evaluator__in=evaluators,
+                )
+                if replace:
+                    existing.delete()
+                    scored = set()
+                else:
+                    scored = set(
+                        existing.values_list("processing_output_id", "evaluator_id")
+                    )
+
+                # Outputs missing the same evaluators are scored together
+                groups = {}
+                for output_id, raw_text, output in chunk:
+                    missing = tuple(
+                        evaluator
+                        for evaluator in evaluators
+                        if (output_id, evaluator.id) not in scored
+                    )
+                    if missing:
+                        groups.setdefault(missing, []).append(
+                            (output_id, raw_text, output)
+                        )
+
+                evaluator_outputs = []
+                for missing, group in groups.items():
+                    scores = evaluate_batch(
+                        [(raw_text, output) for _, raw_text, output in group],
+                        [evaluator.instance for evaluator in missing],
+                        score_cache,
+                        executor,
+                        refresh=replace,
+                    )
+                    for (output_id, _, _), output_scores in zip(group, scores):
+                        evaluator_outputs.extend(
+                            cls(
+                                processing_output_id=output_id,
+                                evaluator=evaluator,
+                                score=score,
+                            )
+                            for evaluator, score in zip(missing, output_scores)
+                        )
+                cls.objects.bulk_create(evaluator_outputs, batch_size=chunk_size)
+            saved += len(evaluator_outputs)
+            logger.info(
+                f"Rescored {len(chunk)} outputs, {len(evaluator_outputs)} scores saved ({saved} so far)"
+            )
+        return saved
@@ -1,3 +1,297 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from summa.llms import Summa, TextGenerationLLMs
+from core import models
+from core.models import (
+    Evaluator,
+    JSONDataSource,
+    LLM,
+    PromptTemplate,
+    TextPreprocessor,
+    TextProcessingEvaluatorOutput,
+    TextProcessingJob,
+    TextProcessingJobRun,
+    TextProcessingOutput,
+    TextProcessor,
+)
+from core.utils import md5
+
+TEXTS = [
+    "Aveți vreo întrebare?",
+    "Transfăgărășanul s-a închis.",
+    "Mâine plouă în București.",
+    "Știința și tehnica.",
+]
+
+
+class JobTestCase(TestCase):
+    """
+    Creates the Summa enum rows and a job over TEXTS with the echo model and two prompt templates, storing the files in
+    a temporary MEDIA_ROOT.
+    """
+
+    evaluators = ["RA_CS_CL", "RER_CS_CL"]
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        call_command("core_load_summa")
+
+        data_source = JSONDataSource(name="Test")
+        data_source.file.save(
+            "texts.json",
+            ContentFile(json.dumps([{"text": text} for text in TEXTS]).encode()),
+        )
+        self.prompt_templates = []
+        for name, text in [
+            ("echo.txt", "{input}"),
+            ("restore.txt", "Restore: {input}"),
+        ]:
+            prompt_template = PromptTemplate(text=text)
+            prompt_template.file.save(name, ContentFile(text.encode()), save=False)
+            prompt_template.save()
+            self.prompt_templates.append(prompt_template)
+        self.job = self._create_job(data_source)
+
+    def _create_job(self, data_source):
+        job = TextProcessingJob.objects.create(
+            data_source=data_source,
+            preprocessor=TextPreprocessor.objects.get(name="STRIP_DIACRITICS"),
+            processor=TextProcessor.objects.get(name="BASIC"),
+        )
+        job.llms.set(LLM.objects.filter(version="SUMMA_ECHO"))
+        job.prompt_templates.set(self.prompt_templates)
+        job.evaluators.set(Evaluator.objects.filter(name__in=self.evaluators))
+        return job
+
+    def _run(self, job=None, **kwargs):
+        # Fetched again, so that the data source file is read from the start
+        run = TextProcessingJobRun.objects.get(id=(job or self.job).create_run())
+        run.run(**kwargs)
+        return TextProcessingJobRun.objects.get(id=run.id)
+
+
+class TestRescore(JobTestCase):
+    def _scores(self, evaluator, outputs=None):
+        return TextProcessingEvaluatorOutput.objects.filter(
+            evaluator__name=evaluator,
+            processing_output__in=outputs or TextProcessingOutput.objects.all(),
+        )
+
+    def test_only_missing_scores_are_added(self):
+        self._run()
+        outputs = TextProcessingOutput.objects.order_by("id")
+        self.assertEqual(outputs.count(), len(TEXTS) * len(self.prompt_templates))
+        expected = dict(
+            self._scores("RA_CS_CL").values_list("processing_output_id", "score")
+        )
+        kept = set(self._scores("RER_CS_CL").values_list("id", flat=True))
+
+        self._scores("RA_CS_CL", outputs[:3]).delete()
+        # A score that is not missing is not computed again
+        self._scores("RA_CS_CL", outputs[3:4]).update(score=-1)
+        call_command("core_rescore", "--evaluator", "RA_CS_CL", "RER_CS_CL")
+
+        scores = dict(
+            self._scores("RA_CS_CL").values_list("processing_output_id", "score")
+        )
+        self.assertEqual(scores, {**expected, outputs[3].id: -1})
+        self.assertEqual(
+            set(self._scores("RER_CS_CL").values_list("id", flat=True)), kept
+        )
+
+    def test_replace(self):
+        self._run()
+        expected = dict(
+            self._scores("RA_CS_CL").values_list("processing_output_id", "score")
+        )
+        replaced = set(self._scores("RA_CS_CL").values_list("id", flat=True))
+        kept = set(self._scores("RER_CS_CL").values_list("id", flat=True))
+        self._scores("RA_CS_CL").update(score=-1)
+
+        call_command("core_rescore", "--evaluator", "RA_CS_CL", "--replace")
+
+        scores = self._scores("RA_CS_CL")
+        self.assertEqual(
+            dict(scores.values_list("processing_output_id", "score")), expected
+        )
+        self.assertFalse(replaced & set(scores.values_list("id", flat=True)))
+        self.assertEqual(
+            set(self._scores("RER_CS_CL").values_list("id", flat=True)), kept
+        )
+
+    def test_replace_scores_again(self):
+        self._run()
+        evaluator = Evaluator.objects.get(name="RA_CS_CL").instance
+
+        # As if the evaluator had changed without its version being bumped, so that its cached scores are stale
+        with mock.patch.object(evaluator, "evaluate_pair", return_value=0.5):
+            call_command("core_rescore", "--evaluator", "RA_CS_CL", "--replace")
+
+        self.assertEqual(
+            set(self._scores("RA_CS_CL").values_list("score", flat=True)), {0.5}
+        )
+
+    def test_job_and_run_filters(self):
+        first_run = self._run()
+        second_run = self._run()
+        other_job = self._create_job(self.job.data_source)
+        other_run = self._run(other_job)
+
+        def rescored(*args):
+            self._scores("DRA_CS_CL").delete()
+            call_command("core_rescore", "--evaluator", "DRA_CS_CL", *args)
+            return set(
+                self._scores("DRA_CS_CL").values_list(
+                    "processing_output__run_output__run_id", flat=True
+                )
+            )
+
+        self.assertEqual(rescored("--run", str(second_run.id)), {second_run.id})
+        self.assertEqual(
+            rescored("--job", str(self.job.id)), {first_run.id, second_run.id}
+        )
+        self.assertEqual(
+            rescored("--job", str(self.job.id), "--run", str(other_run.id)), set()
+        )
+        self.assertEqual(rescored(), {first_run.id, second_run.id, other_run.id})
+
+    def test_chunks(self):
+        self._run()
+        self._scores("RA_CS_CL").delete()
+        outputs = TextProcessingOutput.objects.count()
+
+        with mock.patch.object(
+            models, "evaluate_batch", side_effect=models.evaluate_batch
+        ) as evaluate_batch:
+            saved = TextProcessingEvaluatorOutput.rescore(
+                Evaluator.objects.filter(name__in=self.evaluators), chunk_size=3
+            )
+
+        self.assertEqual(saved, outputs)
+        self.assertEqual(evaluate_batch.call_count, -(-outputs // 3))
+        for evaluator in self.evaluators:
+            self.assertEqual(self._scores(evaluator).count(), outputs)
+
+
+class TestBudget(JobTestCase):
+    def test_cached_outputs_are_not_charged_again(self):
+        run = self._run()
+        outputs = TextProcessingOutput.objects.filter(run_output__run=run)
+        outputs.update(prompt_tokens=10, completion_tokens=5)
+        outputs.filter(
+            id__in=outputs.order_by("id").values_list("id", flat=True)[:3]
+        ).update(cached=True)
+
+        self.assertEqual(run._budget().spent_tokens, (outputs.count() - 3) * 15)
+        self.assertEqual(run.total_tokens, outputs.count() * 15)
+
+
+class TestRecover(JobTestCase):
+    def setUp(self):
+        super().setUp()
+        self.echo = LLM.objects.get(version="SUMMA_ECHO")
+        self.backup = LLM.objects.get(version="OPENAI_GPT_4o")
+
+    def _answered_by_backup(self, processed_output):
+        # As if a hedged request had been answered by the backup model first
+        processed_output.model = self.backup.model
+        processed_output.model_version = TextGenerationLLMs[
+            self.backup.version
+        ].model_version
+
+    def _units(self, run):
+        return sorted(
+            TextProcessingOutput.objects.filter(run_output__run=run).values_list(
+                "run_output__raw_text__text", "requested_llm", "prompt_template"
+            )
+        )
+
+    def _expected_units(self):
+        return sorted(
+            (text, self.echo.id, prompt_template.id)
+            for text in TEXTS
+            for prompt_template in self.prompt_templates
+        )
+
+    def test_save_output(self):
+        run = TextProcessingJobRun.objects.get(id=self.job.create_run())
+        (output,) = run._pipeline_runner().run_many(TEXTS[:1])
+        self._answered_by_backup(output.processed_outputs[0])
+
+        run._save_output(self.job, output)
+        saved = TextProcessingOutput.objects.filter(run_output__run=run)
+        self.assertEqual(
+            sorted(saved.values_list("llm", "requested_llm")),
+            [(self.echo.id, self.echo.id), (self.backup.id, self.echo.id)],
+        )
+        saved_units = run._saved_units()
+        self.assertEqual(
+            saved_units,
+            {
+                (md5(TEXTS[0]), self.echo.id, prompt_template.id)
+                for prompt_template in self.prompt_templates
+            },
+        )
+
+        # Saving again only saves what is missing
+        run._save_output(self.job, output, saved_units)
+        self.assertEqual(saved.count(), 2)
+        saved.filter(llm=self.echo).delete()
+        run._save_output(self.job, output, run._saved_units())
+        self.assertEqual(saved.count(), 2)
+
+    def test_saved_units_without_requested_llm(self):
+        run = self._run()
+        saved_units = run._saved_units()
+        TextProcessingOutput.objects.update(requested_llm=None)
+        self.assertEqual(run._saved_units(), saved_units)
+
+    def _recover(self):
+        run = self._run()
+        self.assertEqual(self._units(run), self._expected_units())
+        outputs = TextProcessingOutput.objects.filter(run_output__run=run)
+        # The first text is complete, but one of its outputs was answered by the backup model
+        outputs.filter(
+            run_output__raw_text__text=TEXTS[0],
+            prompt_template=self.prompt_templates[0],
+        ).update(llm=self.backup)
+        # The last text is missing an output, and the one before it every output
+        outputs.filter(run_output__raw_text__text=TEXTS[-2]).delete()
+        outputs.filter(
+            run_output__raw_text__text=TEXTS[-1],
+            prompt_template=self.prompt_templates[1],
+        ).delete()
+
+        with mock.patch.object(
+            Summa, "_generate", autospec=True, side_effect=Summa._generate
+        ) as generate:
+            run = TextProcessingJobRun.objects.get(id=run.id)
+            run.run(recover=True)
+
+        self.assertEqual(self._units(run), self._expected_units())
+        prompts = [call.args[1].prompt for call in generate.call_args_list]
+        self.assertFalse(any("Aveti" in prompt for prompt in prompts))
+        return prompts
+
+    def test_recover(self):
+        prompts = self._recover()
+        self.assertEqual(len(prompts), 3)
+
+    @mock.patch.dict(os.environ, {"SUMMA_PACK_MAX_TEXTS": "4"})
+    def test_recover_whole_texts(self):
+        prompts = self._recover()
+        # The incomplete texts are packed together, once per prompt template
+        self.assertEqual(len(prompts), 2)
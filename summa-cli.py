@@ -28,30 +28,38 @@ evaluators = [
     Evaluators.RER_CI_CL.value
 ]
 
-runner = PipelineRunner(preprocessor, processor, llms, prompt_templates, evaluators)
-raw_texts = []
 
-json_crawler = "../summa-data/dexonline/crawler/json/dexonline_crawler_10.json"
-with open(json_crawler, "r") as f:
-    json_data = json.load(f)
-    raw_texts = [d["text"] for d in json_data]
+def main():
+    runner = PipelineRunner(preprocessor, processor, llms, prompt_templates, evaluators)
+    raw_texts = []
 
+    json_crawler = "../summa-data/dexonline/crawler/json/dexonline_crawler_10.json"
+    with open(json_crawler, "r") as f:
+        json_data = json.load(f)
+        raw_texts = [d["text"] for d in json_data]
+
+    raw_texts = [
+        "Acolo unde un prozator mai rudimentar ar fi cazut in pornografie, autorul reuseste o pagina admirabila, de, asa zicand, sex elevat: Era ceva special."
+    ]
+
+    run_outputs = []
+    for raw_text in raw_texts:
+        print(f"Processing '{raw_text}'", end="... ")
+        run_output = runner.run(raw_text)
+        print("Done.")
+        run_outputs.append(run_output)
+
+    # average evaluation scores by model
+    model_scores = {}
+    for run_output in run_outputs:
+        for output in run_output.processed_outputs:
+            model_scores.setdefault(output.model_version, []).append(
+                output.evals[0].score
+            )
+    for model_version, scores in model_scores.items():
+        print(f"{model_version}: {sum(scores) / len(scores):.4f}")
 
-raw_texts = [
-    "Acolo unde un prozator mai rudimentar ar fi cazut in pornografie, autorul reuseste o pagina admirabila, de, asa zicand, sex elevat: Era ceva special."
-]
 
-run_outputs = []
-for raw_text in raw_texts:
-    print(f"Processing '{raw_text}'", end="... ")
-    run_output = runner.run(raw_text)
-    print("Done.")
-    run_outputs.append(run_output)
-
-# average evaluation scores by model
-model_scores = {}
-for run_output in run_outputs:
-    for output in run_output.processed_outputs:
-        model_scores.setdefault(output.model_version, []).append(output.evals[0].score)
-for model_version, scores in model_scores.items():
-    print(f"{model_version}: {sum(scores) / len(scores):.4f}")
+# The evaluation worker processes (see summa.evals.default_evaluation_executor) import this module again
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Union
+from .llms import OpenAIClient, Prompt, TextGenerationOutput
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIBatch:
+    """
+    A single batch of chat completion requests for one OpenAI-compatible model, submitted through the provider's
+    batch API (https://platform.openai.com/docs/guides/batch).
+
+    The lifecycle is write() -> submit() -> poll() until done -> results(), or cancel() to give up on it.
+    """
+
+    ENDPOINT = "/v1/chat/completions"
+    TERMINAL_STATUSES = ["completed", "failed", "expired", "cancelled"]
+
+    def __init__(
+        self,
+        llm: OpenAIClient,
+        prompts: Dict[str, Prompt],
+        batch_dir: str,
+        completion_window: str = "24h",
+    ):
+        """
+        Initializes the batch.
+
+        Args:
+            llm (OpenAIClient): The model the requests are sent to.
+            prompts (Dict[str, Prompt]): The prompts to generate text for, keyed by a unique custom ID.
+            batch_dir (str): The directory where the batch request file is written.
+            completion_window (str, optional): The time frame within which the batch should be processed. Defaults to "24h".
+        """
+        self.llm = llm
+        self.prompts = prompts
+        self.batch_dir = batch_dir
+        self.completion_window = completion_window
+        self.path = None
+        self.batch = None
+        self.submitted_at = None
+
+    @property
+    def id(self) -> Optional[str]:
+        return self.batch["id"] if self.batch else None
+
+    @property
+    def status(self) -> Optional[str]:
+        return self.batch["status"] if self.batch else None
+
+    @property
+    def done(self) -> bool:
+        return self.status in self.TERMINAL_STATUSES
+
+    def write(self) -> str:
+        """
+        Writes the batch request JSONL file, one rendered request per line.
+
+        Returns:
+            str: The path of the written file.
+        """
+        os.makedirs(self.batch_dir, exist_ok=True)
+        filename = self.llm.model_version.replace("/", "_")
+        self.path = os.path.join(self.batch_dir, f"{filename}-{time.time_ns()}.jsonl")
+        with open(self.path, "w", encoding="utf-8") as file:
+            for custom_id, prompt in self.prompts.items():
+                request = {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": self.ENDPOINT,
+                    "body": self.llm._completion_kwargs(prompt),
+                }
+                file.write(json.dumps(request, ensure_ascii=False) + "\n")
+        return self.path
+
+    def submit(self) -> str:
+        """
+        Uploads the batch request file and creates the batch.
+
+        Returns:
+            str: The ID of the created batch.
+        """
+        if self.path is None:
+            self.write()
+        client = self.llm.client
+        with open(self.path, "rb") as file:
+            input_file = client.files.create(file=file, purpose="batch")
+        self.batch = client.post(
+            "/batches",
+            body={
+                "input_file_id": input_file.id,
+                "endpoint": self.ENDPOINT,
+                "completion_window": self.completion_window,
+            },
+            cast_to=Dict[str, Any],
+        )
+        self.submitted_at = time.time()
+        logger.info(
+            f"Submitted batch {self.id} with {len(self.prompts)} requests for {self.llm}"
+        )
+        return self.id
+
+    def poll(self) -> str:
+        """
+        Refreshes the status of the batch.
+
+        Returns:
+            str: The status of the batch.
+        """
+        self.batch = self.llm.client.get(f"/batches/{self.id}", cast_to=Dict[str, Any])
+        return self.status
+
+    def cancel(self) -> str:
+        """
+        Cancels the batch, e.g. once its requests have been generated some other way.
+
+        Returns:
+            str: The status of the batch.
+        """
+        self.batch = self.llm.client.post(
+            f"/batches/{self.id}/cancel", cast_to=Dict[str, Any]
+        )
+        return self.status
+
+    def _read_file(self, file_id: Optional[str]) -> list:
+        if not file_id:
+            return []
+        content = self.llm.client.files.content(file_id).text
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    def results(self) -> Dict[str, Union[TextGenerationOutput, Exception]]:
+        """
+        Downloads the results of a finished batch.
+
+        Every prompt gets either an output or the exception describing why it failed, so that the caller can fall
+        back to synchronous generation for the failed ones. The generation time of every output is the turnaround
+        time of the whole batch.
+
+        Returns:
+            Dict[str, Union[TextGenerationOutput, Exception]]: The outputs, keyed by custom ID.
+        """
+        turnaround = time.time() - self.submitted_at
+        results = {}
+        lines = self._read_file(self.batch.get("output_file_id")) + self._read_file(
+            self.batch.get("error_file_id")
+        )
+        for line in lines:
+            custom_id = line["custom_id"]
+            response = line.get("response") or {}
+            if line.get("error") or response.get("status_code") != 200:
+                results[custom_id] = RuntimeError(
+                    f"Batch request {custom_id} failed: {line.get('error') or response}"
+                )
+                continue
+            output = TextGenerationOutput(
+                model=self.llm.model,
+                model_version=self.llm.model_version,
+                prompt=self.prompts[custom_id],
+            )
+            content = response["body"]["choices"][0]["message"]["content"]
+            output.output = content.strip()
+            usage = response["body"].get("usage") or {}
+            output.record_usage(
+                usage.get("prompt_tokens"), usage.get("completion_tokens")
+            )
+            output.generation_time = turnaround
+            results[custom_id] = output
+        for custom_id in self.prompts.keys() - results.keys():
+            results[custom_id] = RuntimeError(
+                f"Batch {self.id} finished with status '{self.status}' without a result for {custom_id}"
+            )
+        return results
+
+    def __str__(self) -> str:
+        return f"Batch {self.id} ({self.llm}): {self.status}"
@@ -0,0 +1,103 @@
+"""
+Compares the edit distance engines of summa.distance with the reference pure-Python DP, on synthetic restoration
+outputs (a Romanian text with some of its diacritics missing) of increasing length, at the character and word level.
+Every engine's distance is checked against the reference.
+
+Usage: python -m summa.benchmarks.edit_distance [--lengths 100 1000 5000] [--error-rate 0.05] [--repeat 3]
+"""
+
+import argparse
+import random
+import time
+from ..distance import (
+    banded_distance,
+    levenshtein_distance,
+    myers_distance,
+    numpy_distance,
+    reference_distance,
+)
+from ..evals import Evaluators
+from ..preprocessors import TextPreprocessors
+
+TEXT = (
+    "Transfăgărășanul s-a închis pentru iarnă, iar șoferii care voiau să treacă munții "
+    "au fost întorși din drum de jandarmi. Aveți vreo întrebare despre starea drumurilor? "
+)
+
+# The reference DP is quadratic in pure Python, so it is skipped above this length
+REFERENCE_MAX_LENGTH = 2000
+
+
+def restoration(length: int, error_rate: float, seed: int = 0) -> tuple:
+    """
+    Returns a raw text of about the given length, and a restoration of it missing about error_rate of its diacritics.
+    """
+    rng = random.Random(seed)
+    raw_text = (TEXT * (length // len(TEXT) + 1))[:length]
+    stripped = TextPreprocessors.STRIP_DIACRITICS.value.preprocess(raw_text)
+    processed_text = "".join(
+        s if r != s and rng.random() < error_rate else r
+        for r, s in zip(raw_text, stripped)
+    )
+    return raw_text, processed_text
+
+
+def best_time(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--lengths", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for length in args.lengths:
+        raw_text, processed_text = restoration(length, args.error_rate)
+        for level, s1, s2 in [
+            ("char", raw_text, processed_text),
+            ("word", raw_text.split(), processed_text.split()),
+        ]:
+            expected = (
+                reference_distance(s1, s2) if length <= REFERENCE_MAX_LENGTH else None
+            )
+            engines = {
+                "reference": reference_distance,
+                "myers": myers_distance,
+                "numpy": numpy_distance,
+                "banded (k=16)": lambda a, b: banded_distance(a, b, 16),
+                "levenshtein_distance": levenshtein_distance,
+            }
+            baseline = None
+            for name, engine in engines.items():
+                if name == "reference" and expected is None:
+                    continue
+                distance = engine(s1, s2)
+                if expected is None:
+                    expected = distance
+                status = "ok" if distance in (expected, None) else "MISMATCH"
+                elapsed = best_time(lambda: engine(s1, s2), args.repeat)
+                baseline = baseline or elapsed
+                print(
+                    f"{length:>6} {level:<4} {name:<21} {elapsed * 1000:9.3f} ms "
+                    f"({baseline / elapsed:7.1f}x) distance {distance} {status}"
+                )
+
+        evaluators = [e.value for e in Evaluators if e.name.startswith("RER")]
+        elapsed = best_time(
+            lambda: [e.evaluate(raw_text, processed_text) for e in evaluators],
+            args.repeat,
+        )
+        print(f"{length:>6} all four RER evaluators      {elapsed * 1000:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compares scoring restoration outputs with every evaluator one by one (each evaluator normalizing, tokenizing and
+comparing the texts on its own) with evaluate_batch, which shares that work across evaluators and outputs. The outputs
+are synthetic restorations of the same raw text, as produced by the models of a job, and the scores of both are checked
+to be equal. With a warm evaluator score cache, re-scoring the same outputs only costs the lookups.
+
+Then scores --texts such batches from the threads of a job run, in those threads (sharing the GIL) and in a pool of
+--processes worker processes.
+
+Usage: python -m summa.benchmarks.evaluation [--length 1000] [--outputs 8] [--error-rate 0.05] [--repeat 3]
+    [--texts 32] [--processes 4]
+"""
+
+import argparse
+import concurrent.futures
+import multiprocessing
+from ..caches import EvaluatorScoreCache
+from ..evals import Evaluators, evaluate_batch
+from .edit_distance import best_time, restoration
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--length", type=int, default=1000)
+    parser.add_argument("--outputs", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--texts", type=int, default=32)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    pairs = [
+        restoration(args.length, args.error_rate, seed=seed)
+        for seed in range(args.outputs)
+    ]
+    evaluators = [e.value for e in Evaluators]
+
+    def one_by_one():
+        return [
+            [e.evaluate(raw, processed) for e in evaluators] for raw, processed in pairs
+        ]
+
+    status = "ok" if one_by_one() == evaluate_batch(pairs, evaluators) else "MISMATCH"
+    baseline = best_time(one_by_one, args.repeat)
+    batched = best_time(lambda: evaluate_batch(pairs, evaluators), args.repeat)
+    print(f"one by one     {baseline * 1000:9.3f} ms")
+    print(
+        f"evaluate_batch {batched * 1000:9.3f} ms ({baseline / batched:.1f}x) {status}"
+    )
+
+    cache = EvaluatorScoreCache()
+    evaluate_batch(pairs, evaluators, cache)
+    cached = best_time(lambda: evaluate_batch(pairs, evaluators, cache), args.repeat)
+    print(f"cached         {cached * 1000:9.3f} ms ({baseline / cached:.1f}x)")
+
+    def score_texts(executor):
+        with concurrent.futures.ThreadPoolExecutor() as threads:
+            return list(
+                threads.map(
+                    lambda _: evaluate_batch(pairs, evaluators, executor=executor),
+                    range(args.texts),
+                )
+            )
+
+    with concurrent.futures.ProcessPoolExecutor(
+        args.processes, mp_context=multiprocessing.get_context("spawn")
+    ) as processes:
+        # Start the workers before timing
+        status = "ok" if score_texts(processes) == score_texts(None) else "MISMATCH"
+        in_threads = best_time(lambda: score_texts(None), args.repeat)
+        in_processes = best_time(lambda: score_texts(processes), args.repeat)
+    print(f"{args.texts} texts, threads {in_threads * 1000:9.3f} ms")
+    print(
+        f"{args.texts} texts, {args.processes} processes {in_processes * 1000:9.3f} ms "
+        f"({in_threads / in_processes:.1f}x) {status}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Measures how long it takes a fresh interpreter to import the summa modules (and, optionally, Django's core.models),
+compared to importing the provider SDKs eagerly.
+
+Usage: python -m summa.benchmarks.import_time [--repeat N] [--django]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules that must not be imported as a side effect of importing summa
+PROVIDER_SDKS = ["openai", "google.generativeai", "grpc", "httpx"]
+
+STATEMENTS = {
+    "summa.pipelines": "import summa.pipelines",
+    "summa.llms + TextGenerationLLMs": "from summa.llms import TextGenerationLLMs; [m.name for m in TextGenerationLLMs]",
+    "provider SDKs (eager)": "import openai, google.generativeai",
+}
+
+DJANGO_STATEMENT = (
+    "import os, django; "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'galandriel.settings.base'); "
+    "django.setup(); import core.models"
+)
+
+
+def time_import(statement: str) -> float:
+    """
+    Runs the statement in a fresh interpreter and returns the wall time it took, in seconds.
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True)
+    return time.perf_counter() - start
+
+
+def loaded_provider_sdks(statement: str) -> list:
+    """
+    Runs the statement in a fresh interpreter and returns the provider SDKs it imported.
+    """
+    check = f"{statement}; import sys; print(','.join(m for m in {PROVIDER_SDKS!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", check], check=True, capture_output=True, text=True
+    )
+    return [m for m in result.stdout.strip().split(",") if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--django", action="store_true")
+    args = parser.parse_args()
+
+    statements = dict(STATEMENTS)
+    if args.django:
+        statements["core.models"] = DJANGO_STATEMENT
+
+    for name, statement in statements.items():
+        timings = [time_import(statement) for _ in range(args.repeat)]
+        print(
+            f"{name:<35} median {statistics.median(timings) * 1000:8.1f} ms "
+            f"(min {min(timings) * 1000:.1f} ms, SDKs loaded: {loaded_provider_sdks(statement) or 'none'})"
+        )
+
+
+if __name__ == "__main__":
+    main()
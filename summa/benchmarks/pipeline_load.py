@@ -0,0 +1,116 @@
+"""
+Runs the full pipeline (preprocessing, an OpenAI-compatible client over HTTP, evaluation) against a local stand-in
+server, and reports throughput and latency percentiles. Nothing leaves the machine, so it can be run as often as
+needed to compare runners, concurrency settings and retry policies under injected latency and errors.
+
+Usage: python -m summa.benchmarks.pipeline_load [--texts 1000] [--latency lognormal:0.5:0.3] [--error-rate-429 0.05]
+"""
+
+import argparse
+import logging
+import statistics
+import time
+from enum import Enum
+from ..caches import LLMResponseCache
+from ..evals import Evaluators
+from ..limiters import concurrency_limiter_stats
+from ..llms import OpenAIClient, PromptTemplate
+from ..pipelines import AsyncPipelineRunner, PipelineRunner, ScheduledPipelineRunner
+from ..preprocessors import TextPreprocessors
+from ..processors import TextProcessors
+from ..standin import LatencyDistribution, StandInConfig, StandInServer
+
+TEXT = "Transfăgărășanul s-a închis pentru iarnă, aveți vreo întrebare {i}?"
+
+
+class StandInLLM(OpenAIClient):
+    class ModelVersions(Enum):
+        STANDIN = "standin"
+
+    def __init__(self, base_url, model_version=ModelVersions.STANDIN):
+        super().__init__("Stand-in", model_version, "standin", base_url=base_url)
+        # Every request must reach the server
+        self.cache = LLMResponseCache(bypass=True)
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument(
+        "--runner", choices=["threads", "async", "scheduled"], default="async"
+    )
+    parser.add_argument("--max-concurrency", type=int, default=1000)
+    parser.add_argument("--max-per-model", type=int)
+    parser.add_argument("--latency", default="lognormal:0.5:0.3")
+    parser.add_argument("--tokens-per-second", type=float)
+    parser.add_argument("--error-rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float)
+    parser.add_argument("--rpm", type=int)
+    parser.add_argument("--tpm", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    config = StandInConfig(
+        latency=LatencyDistribution.parse(args.latency, seed=args.seed),
+        tokens_per_second=args.tokens_per_second,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        retry_after=args.retry_after,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        seed=args.seed,
+    )
+    raw_texts = [TEXT.format(i=i) for i in range(args.texts)]
+
+    with StandInServer(config) as server:
+        runner_args = (
+            TextPreprocessors.STRIP_DIACRITICS.value,
+            TextProcessors.EXPONENTIAL_BACKOFF.value,
+            [StandInLLM(server.base_url)],
+            [PromptTemplate(template_filename="restore_diacritics.md")],
+            [Evaluators.RA_CS_CL.value],
+        )
+        start = time.perf_counter()
+        if args.runner == "async":
+            runner = AsyncPipelineRunner(
+                *runner_args, max_concurrency=args.max_concurrency
+            )
+            outputs = runner.run_many(raw_texts)
+        elif args.runner == "scheduled":
+            runner = ScheduledPipelineRunner(
+                *runner_args,
+                max_workers=args.max_concurrency,
+                max_per_model=args.max_per_model,
+            )
+            outputs = list(runner.run_many(raw_texts))
+        else:
+            runner = PipelineRunner(*runner_args)
+            outputs = [runner.run(raw_text) for raw_text in raw_texts]
+        elapsed = time.perf_counter() - start
+        stats = server.stats
+
+    latencies = [o.generation_time for run in outputs for o in run.processed_outputs]
+    print(
+        f"{len(outputs)} texts in {elapsed:.2f} s ({len(outputs) / elapsed:.1f} texts/s)"
+    )
+    print(
+        f"generation time: mean {statistics.mean(latencies):.3f} s, "
+        f"p50 {percentile(latencies, 50):.3f} s, p95 {percentile(latencies, 95):.3f} s, "
+        f"p99 {percentile(latencies, 99):.3f} s"
+    )
+    print(f"server responses: {stats['responses']}")
+    for name, limiter_stats in concurrency_limiter_stats().items():
+        print(f"concurrency limit {name}: {limiter_stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import contextlib
+import contextvars
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from .llms import TextGenerationOutput
+from .retries import NonRetryableError
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetExceededError(NonRetryableError):
+    """
+    Raised when work is dispatched after a run's token or cost budget has been exhausted.
+    """
+
+
+class TokenBudget:
+    """
+    A thread-safe token and/or cost budget shared by all the requests of a run.
+
+    Requests already in flight when the budget runs out are allowed to finish (and are charged), so a run may
+    overshoot its budget by at most its concurrency; no new request is dispatched afterwards.
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        max_cost: Optional[float] = None,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        spent_tokens: int = 0,
+        spent_cost: float = 0.0,
+    ):
+        """
+        Initializes the budget.
+
+        Args:
+            max_tokens (int, optional): The maximum number of prompt and completion tokens. Defaults to None (unlimited).
+            max_cost (float, optional): The maximum cost. Defaults to None (unlimited).
+            prices (Dict[str, Tuple[float, float]], optional): The (prompt, completion) price per 1M tokens, keyed by model version. Models without a price are free.
+            spent_tokens (int, optional): Tokens already spent, e.g. by an earlier attempt of a recovered run. Defaults to 0.
+            spent_cost (float, optional): Cost already incurred. Defaults to 0.0.
+        """
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.prices = prices or {}
+        self.spent_tokens = spent_tokens
+        self.spent_cost = spent_cost
+        self._lock = threading.Lock()
+
+    def cost(self, output: TextGenerationOutput) -> float:
+        """
+        Returns the cost of an output, based on its model's prices.
+        """
+        prompt_price, completion_price = self.prices.get(output.model_version, (0, 0))
+        return (
+            (output.prompt_tokens or 0) * prompt_price
+            + (output.completion_tokens or 0) * completion_price
+        ) / 1_000_000
+
+    def charge(self, output: TextGenerationOutput) -> None:
+        """
+        Charges the usage of an output to the budget. Outputs served from the response cache are free, while coalesced
+        ones are not: the call they shared was made on their behalf.
+        """
+        if output.cached:
+            return
+        with self._lock:
+            self.spent_tokens += (output.prompt_tokens or 0) + (
+                output.completion_tokens or 0
+            )
+            self.spent_cost += self.cost(output)
+
+    @property
+    def exhausted(self) -> bool:
+        with self._lock:
+            return (
+                self.max_tokens is not None and self.spent_tokens >= self.max_tokens
+            ) or (self.max_cost is not None and self.spent_cost >= self.max_cost)
+
+    def check(self) -> None:
+        """
+        Raises a BudgetExceededError if the budget is exhausted.
+        """
+        if self.exhausted:
+            raise BudgetExceededError(f"Budget exhausted: {self}")
+
+    def __str__(self) -> str:
+        return (
+            f"{self.spent_tokens}/{self.max_tokens or 'unlimited'} tokens, "
+            f"{self.spent_cost:.4f}/{self.max_cost or 'unlimited'} cost"
+        )
+
+
+_current_budget = contextvars.ContextVar("budget", default=None)
+
+
+@contextlib.contextmanager
+def use_budget(budget: Optional[TokenBudget]):
+    """
+    Makes the requests that processors make besides the one whose output they return (e.g. hedges that lost) be
+    charged to the given budget within the block (in the current thread or task).
+    """
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def current_budget() -> Optional[TokenBudget]:
+    return _current_budget.get()
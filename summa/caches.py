@@ -0,0 +1,403 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from cachetools import LRUCache, TTLCache
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+
+class TwoTierCache:
+    """
+    A two-tier cache: an in-memory LRU tier in front of an optional on-disk SQLite tier.
+
+    Values are JSON-serializable, keyed on strings. Both tiers are safe to share between threads, and the SQLite tier
+    can be shared between processes.
+    """
+
+    # The SQLite table holding the entries
+    table = "entries"
+    # The number of entries inserted between two passes over the disk tier evicting expired and excess entries
+    evict_interval = 1000
+    # The number of disk hits whose access times are written in a single statement
+    touch_batch_size = 500
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_memory_entries: int = 10_000,
+        max_disk_entries: int = 1_000_000,
+        ttl: Optional[float] = None,
+        bypass: bool = False,
+    ):
+        """
+        Initializes the cache.
+
+        Args:
+            path (str, optional): The path of the SQLite file backing the on-disk tier. Defaults to None (memory only).
+            max_memory_entries (int, optional): The maximum number of entries kept in memory. Defaults to 10,000.
+            max_disk_entries (int, optional): The maximum number of entries kept on disk. Defaults to 1,000,000.
+            ttl (float, optional): The number of seconds after which an entry expires. Defaults to None (never).
+            bypass (bool, optional): If True, the cache is neither read nor written. Defaults to False.
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.bypass = bypass
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        if ttl is None:
+            self._memory = LRUCache(maxsize=max_memory_entries)
+        else:
+            self._memory = TTLCache(maxsize=max_memory_entries, ttl=ttl)
+        self._disk = self._connect(path) if path else None
+        # The number of entries on disk, counted once and then kept up to date, so that inserting doesn't need a
+        # COUNT(*) (an upper bound: replaced entries and other processes' evictions are only seen at the next eviction)
+        self._disk_entries = (
+            self._disk.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if self._disk is not None
+            else 0
+        )
+        self._inserted_since_eviction = 0
+        # The access times of disk hits not written yet, by key
+        self._accessed = {}
+
+    @classmethod
+    def _connect(cls, path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # WAL lets several processes (e.g. gunicorn workers and process_tasks) read while another one writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {cls.table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        connection.execute(
+            f"CREATE INDEX IF NOT EXISTS {cls.table}_accessed_at ON {cls.table} (accessed_at)"
+        )
+        connection.execute(
+            f"CREATE INDEX IF NOT EXISTS {cls.table}_created_at ON {cls.table} (created_at)"
+        )
+        connection.commit()
+        return connection
+
+    def get(self, key: str):
+        """
+        Looks up a value, first in memory and then on disk. Disk hits are promoted to the memory tier.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            The cached value, or None if it is missing, expired or the cache is bypassed.
+        """
+        if self.bypass:
+            return None
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self.hits += 1
+                self.memory_hits += 1
+                return value
+            value = self._disk_get(key)
+            if value is not None:
+                self._memory[key] = value
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value) -> None:
+        """
+        Stores a value in both tiers.
+
+        Args:
+            key (str): The cache key.
+            value: The JSON-serializable value.
+        """
+        if self.bypass:
+            return
+        with self._lock:
+            self._memory[key] = value
+            self._disk_set(key, value)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, object]:
+        """
+        Looks up many values at once, with a single round trip to the disk tier for the ones missing from memory.
+
+        Args:
+            keys (Iterable[str]): The cache keys.
+
+        Returns:
+            Dict[str, object]: The cached values found, by key.
+        """
+        keys = list(dict.fromkeys(keys))
+        if self.bypass:
+            return {}
+        with self._lock:
+            found = {}
+            for key in keys:
+                value = self._memory.get(key)
+                if value is not None:
+                    found[key] = value
+            self.memory_hits += len(found)
+            on_disk = self._disk_get_many([key for key in keys if key not in found])
+            for key, value in on_disk.items():
+                self._memory[key] = value
+            found.update(on_disk)
+            self.disk_hits += len(on_disk)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+    def set_many(self, values: Dict[str, object]) -> None:
+        """
+        Stores many values in both tiers, in a single transaction on disk.
+
+        Args:
+            values (Dict[str, object]): The JSON-serializable values, by key.
+        """
+        if self.bypass or not values:
+            return
+        with self._lock:
+            self._memory.update(values)
+            self._disk_set_many(values)
+
+    def _disk_get(self, key: str):
+        return self._disk_get_many([key]).get(key)
+
+    def _disk_get_many(self, keys: list) -> dict:
+        if self._disk is None or not keys:
+            return {}
+        found = {}
+        expired = []
+        now = time.time()
+        # Stay below SQLite's limit on the number of parameters of a statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            rows = self._disk.execute(
+                f"SELECT key, value, created_at FROM {self.table} WHERE key IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for key, value, created_at in rows:
+                if self.ttl is not None and created_at + self.ttl < now:
+                    expired.append((key,))
+                else:
+                    found[key] = json.loads(value)
+        if expired:
+            self._disk.executemany(f"DELETE FROM {self.table} WHERE key = ?", expired)
+            self._disk.commit()
+        # Access times only order the evictions, so they are written in batches rather than on every hit
+        self._accessed.update((key, now) for key in found)
+        if len(self._accessed) >= self.touch_batch_size:
+            self._touch()
+        return found
+
+    def _touch(self) -> None:
+        if self._accessed:
+            self._disk.executemany(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+            )
+            self._disk.commit()
+            self._accessed.clear()
+
+    def _disk_set(self, key: str, value) -> None:
+        self._disk_set_many({key: value})
+
+    def _disk_set_many(self, values: dict) -> None:
+        if self._disk is None:
+            return
+        now = time.time()
+        self._disk.executemany(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            [
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+                for key, value in values.items()
+            ],
+        )
+        self._disk.commit()
+        self._disk_entries += len(values)
+        self._inserted_since_eviction += len(values)
+        if (
+            self._disk_entries > self.max_disk_entries
+            or self._inserted_since_eviction >= self.evict_interval
+        ):
+            self._evict()
+
+    def _evict(self) -> None:
+        self._inserted_since_eviction = 0
+        # Evictions follow the latest access times
+        self._touch()
+        if self.ttl is not None:
+            self._disk.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?",
+                (time.time() - self.ttl,),
+            )
+        (count,) = self._disk.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        if count > self.max_disk_entries:
+            # Evict the least recently accessed entries, plus some slack so that we don't evict on every insert
+            excess = count - self.max_disk_entries + self.max_disk_entries // 10
+            self._disk.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            logger.info(f"Evicted {excess} entries from the {self}")
+            count -= excess
+        self._disk.commit()
+        self._disk_entries = count
+
+    def clear(self) -> None:
+        """
+        Removes every entry from both tiers and resets the counters.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute(f"DELETE FROM {self.table}")
+                self._disk.commit()
+                self._disk_entries = self._inserted_since_eviction = 0
+                self._accessed.clear()
+            self.hits = self.memory_hits = self.disk_hits = self.misses = 0
+
+    @property
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+    def __str__(self) -> str:
+        return f"{type(self).__name__} ({self.path or 'memory only'}): {self.stats}"
+
+
+class LLMResponseCache(TwoTierCache):
+    """
+    A two-tier cache for LLM responses. Responses are stored as JSON-serializable dictionaries, keyed on the model, the
+    rendered prompt and the generation parameters (see LLMResponseCache.key).
+    """
+
+    table = "responses"
+
+    @staticmethod
+    def key(model: str, model_version: str, prompt: str, params: dict) -> str:
+        """
+        Computes the cache key for a request.
+
+        Args:
+            model (str): The model vendor.
+            model_version (str): The model version.
+            prompt (str): The rendered prompt.
+            params (dict): The generation parameters (e.g. temperature).
+
+        Returns:
+            str: The SHA-256 hex digest identifying the request.
+        """
+        payload = json.dumps(
+            [model, model_version, prompt, params], sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EvaluatorScoreCache(TwoTierCache):
+    """
+    A two-tier cache for evaluator scores, keyed on the evaluator and the hashes of the raw text and of the model output
+    (see EvaluatorScoreCache.key). Models are deterministic at temperature 0, so the same pairs recur across job runs,
+    recoveries and rescoring; their scores are looked up rather than recomputed.
+    """
+
+    table = "scores"
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """
+        Returns the SHA-256 hex digest of a text.
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def key(evaluator: str, raw_text_hash: str, output_hash: str) -> str:
+        """
+        Computes the cache key for a score.
+
+        Args:
+            evaluator (str): The name of the evaluator, which identifies its variant (e.g. case sensitivity).
+            raw_text_hash (str): The hash of the raw text (see EvaluatorScoreCache.text_hash).
+            output_hash (str): The hash of the model output.
+
+        Returns:
+            str: The key.
+        """
+        return f"{evaluator}:{raw_text_hash}:{output_hash}"
+
+
+_default_llm_response_cache = None
+_default_llm_response_cache_lock = threading.Lock()
+
+
+def default_llm_response_cache() -> LLMResponseCache:
+    """
+    Returns the process-wide LLM response cache, creating it on first use from the SUMMA_LLM_CACHE_* settings.
+
+    Returns:
+        LLMResponseCache: The shared cache.
+    """
+    global _default_llm_response_cache
+    with _default_llm_response_cache_lock:
+        if _default_llm_response_cache is None:
+            ttl = config("SUMMA_LLM_CACHE_TTL", default=0, cast=float)
+            _default_llm_response_cache = LLMResponseCache(
+                path=config("SUMMA_LLM_CACHE_PATH", default="") or None,
+                max_memory_entries=config(
+                    "SUMMA_LLM_CACHE_MAX_MEMORY_ENTRIES", default=10_000, cast=int
+                ),
+                max_disk_entries=config(
+                    "SUMMA_LLM_CACHE_MAX_DISK_ENTRIES", default=1_000_000, cast=int
+                ),
+                ttl=ttl or None,
+                bypass=config("SUMMA_LLM_CACHE_BYPASS", default=False, cast=bool),
+            )
+        return _default_llm_response_cache
+
+
+_default_evaluator_score_cache = None
+_default_evaluator_score_cache_lock = threading.Lock()
+
+
+def default_evaluator_score_cache() -> EvaluatorScoreCache:
+    """
+    Returns the process-wide evaluator score cache, creating it on first use from the SUMMA_SCORE_CACHE_* settings.
+
+    Returns:
+        EvaluatorScoreCache: The shared cache.
+    """
+    global _default_evaluator_score_cache
+    with _default_evaluator_score_cache_lock:
+        if _default_evaluator_score_cache is None:
+            _default_evaluator_score_cache = EvaluatorScoreCache(
+                path=config("SUMMA_SCORE_CACHE_PATH", default="") or None,
+                max_memory_entries=config(
+                    "SUMMA_SCORE_CACHE_MAX_MEMORY_ENTRIES", default=100_000, cast=int
+                ),
+                max_disk_entries=config(
+                    "SUMMA_SCORE_CACHE_MAX_DISK_ENTRIES", default=10_000_000, cast=int
+                ),
+                bypass=config("SUMMA_SCORE_CACHE_BYPASS", default=False, cast=bool),
+            )
+        return _default_evaluator_score_cache
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import threading
+import weakref
+from typing import TYPE_CHECKING, Optional
+from decouple import config
+
+# The provider SDKs (and grpc, pulled in by google.generativeai) are slow to import, so they are only imported when
+# the first client is requested; importing summa (e.g. from Django's core.models) must not pay for them
+if TYPE_CHECKING:
+    import httpx
+    import openai
+    import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """
+    A process-wide registry of provider SDK clients.
+
+    OpenAI-compatible clients are shared per (base_url, api_key), each backed by a single keep-alive connection pool,
+    so that every model served from the same host (e.g. all DeepInfra models) reuses the same TLS connections. Google
+    model objects and their safety settings are built once per model version.
+    """
+
+    # Harm categories that are deprecated (or unspecified) and must not be sent with the safety settings
+    GOOGLE_UNSUPPORTED_HARM_CATEGORIES = [
+        "HARM_CATEGORY_UNSPECIFIED",
+        "HARM_CATEGORY_DEROGATORY",
+        "HARM_CATEGORY_TOXICITY",
+        "HARM_CATEGORY_VIOLENCE",
+        "HARM_CATEGORY_SEXUAL",
+        "HARM_CATEGORY_MEDICAL",
+        "HARM_CATEGORY_DANGEROUS",
+    ]
+
+    def __init__(
+        self,
+        max_connections: int = 1000,
+        max_keepalive_connections: int = 200,
+        keepalive_expiry: float = 60.0,
+    ):
+        """
+        Initializes the registry.
+
+        Args:
+            max_connections (int, optional): The maximum number of concurrent connections per pool. Defaults to 1000.
+            max_keepalive_connections (int, optional): The number of idle connections kept alive per pool. Defaults to 200.
+            keepalive_expiry (float, optional): The number of seconds an idle connection is kept alive. Defaults to 60.
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._limits = None
+        self._lock = threading.Lock()
+        self._openai_clients = {}
+        # Asynchronous connection pools are bound to the event loop they were opened in, hence one set per loop
+        self._async_openai_clients = weakref.WeakKeyDictionary()
+        self._google_models = {}
+        self._google_safety_settings = None
+        self._google_api_key = None
+
+    @property
+    def limits(self) -> "httpx.Limits":
+        """
+        The connection pool limits applied to every OpenAI-compatible client.
+        """
+        if self._limits is None:
+            import httpx
+
+            self._limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+        return self._limits
+
+    def openai_client(
+        self, api_key: str, base_url: Optional[str] = None
+    ) -> "openai.OpenAI":
+        """
+        Returns the shared OpenAI-compatible client for the given API key and base URL.
+        """
+        import httpx
+        import openai
+
+        key = (base_url, api_key)
+        with self._lock:
+            if key not in self._openai_clients:
+                self._openai_clients[key] = openai.OpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    http_client=httpx.Client(
+                        limits=self.limits,
+                        timeout=openai.DEFAULT_TIMEOUT,
+                        follow_redirects=True,
+                    ),
+                )
+                logger.debug(
+                    f"Created OpenAI client for {base_url or 'api.openai.com'}"
+                )
+            return self._openai_clients[key]
+
+    def async_openai_client(
+        self, api_key: str, base_url: Optional[str] = None
+    ) -> "openai.AsyncOpenAI":
+        """
+        Returns the shared asynchronous OpenAI-compatible client for the given API key and base URL, in the running
+        event loop.
+        """
+        import httpx
+        import openai
+
+        loop = asyncio.get_running_loop()
+        key = (base_url, api_key)
+        with self._lock:
+            clients = self._async_openai_clients.setdefault(loop, {})
+            if key not in clients:
+                clients[key] = openai.AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    http_client=httpx.AsyncClient(
+                        limits=self.limits,
+                        timeout=openai.DEFAULT_TIMEOUT,
+                        follow_redirects=True,
+                    ),
+                )
+            return clients[key]
+
+    def google_safety_settings(self) -> dict:
+        """
+        Returns the Google safety settings, disabling blocking for every supported harm category.
+        """
+        import google.generativeai as genai
+
+        with self._lock:
+            if self._google_safety_settings is None:
+                self._google_safety_settings = {
+                    harm_category: genai.types.HarmBlockThreshold.BLOCK_NONE
+                    for harm_category in genai.types.HarmCategory
+                    if harm_category.name not in self.GOOGLE_UNSUPPORTED_HARM_CATEGORIES
+                }
+            return self._google_safety_settings
+
+    def google_model(
+        self, model_version: str, generation_config: dict, api_key: str
+    ) -> "genai.GenerativeModel":
+        """
+        Returns the shared Google model object for the given model version, configured with the generation config
+        and the safety settings.
+        """
+        import google.generativeai as genai
+
+        safety_settings = self.google_safety_settings()
+        key = (model_version, tuple(sorted(generation_config.items())))
+        with self._lock:
+            # The Google SDK keeps a single, global API key
+            if api_key != self._google_api_key:
+                genai.configure(api_key=api_key)
+                self._google_api_key = api_key
+            if key not in self._google_models:
+                self._google_models[key] = genai.GenerativeModel(
+                    model_version,
+                    generation_config=generation_config,
+                    safety_settings=safety_settings,
+                )
+            return self._google_models[key]
+
+    @property
+    def stats(self) -> dict:
+        """
+        Returns the number of clients held by the registry, along with the connection pool limits.
+        """
+        with self._lock:
+            return {
+                "openai_clients": len(self._openai_clients),
+                "async_openai_clients": sum(
+                    len(clients) for clients in self._async_openai_clients.values()
+                ),
+                "google_models": len(self._google_models),
+                "max_connections": self.max_connections,
+                "max_keepalive_connections": self.max_keepalive_connections,
+                "keepalive_expiry": self.keepalive_expiry,
+            }
+
+    def close(self) -> None:
+        """
+        Closes every synchronous connection pool. Asynchronous pools are released together with their event loop.
+        """
+        with self._lock:
+            for client in self._openai_clients.values():
+                client.close()
+            self._openai_clients.clear()
+
+
+_default_client_registry = None
+_default_client_registry_lock = threading.Lock()
+
+
+def default_client_registry() -> ClientRegistry:
+    """
+    Returns the process-wide client registry, creating it on first use from the SUMMA_HTTP_* settings.
+
+    Returns:
+        ClientRegistry: The shared registry.
+    """
+    global _default_client_registry
+    with _default_client_registry_lock:
+        if _default_client_registry is None:
+            _default_client_registry = ClientRegistry(
+                max_connections=config(
+                    "SUMMA_HTTP_MAX_CONNECTIONS", default=1000, cast=int
+                ),
+                max_keepalive_connections=config(
+                    "SUMMA_HTTP_MAX_KEEPALIVE_CONNECTIONS", default=200, cast=int
+                ),
+                keepalive_expiry=config(
+                    "SUMMA_HTTP_KEEPALIVE_EXPIRY", default=60.0, cast=float
+                ),
+            )
+        return _default_client_registry
@@ -0,0 +1,291 @@
+"""
+Levenshtein (edit) distance engines for the restoration evaluators.
+
+All engines return exactly the same distances as the textbook dynamic programming (reference_distance); they only
+differ in how fast they get there:
+
+- myers_distance: Myers/Hyyrö bit-parallel algorithm, processing a whole column of the DP matrix per element with a
+  handful of (arbitrary-precision) integer operations. Works on characters and on word sequences alike.
+- numpy_distance: row-by-row DP vectorized with NumPy, for sequences of words (or any hashable elements).
+- banded_distance: DP restricted to a diagonal band, for when the distance is known to be small; gives up (returning
+  None) as soon as the distance exceeds max_distance.
+
+levenshtein_distance picks the engine, after trimming the common prefix and suffix (which never changes the distance).
+Myers' algorithm is the fastest on both characters and words (see summa.benchmarks.edit_distance), so it is used
+unless a small max_distance lets the banded DP stop early.
+
+alignment_counts goes further and counts the matches, substitutions, deletions and insertions of an optimal alignment,
+choosing the same one whichever engine computed the distance.
+"""
+
+from typing import Hashable, Optional, Sequence, Tuple
+
+
+def reference_distance(s1: Sequence[Hashable], s2: Sequence[Hashable]) -> int:
+    """
+    The textbook O(n·m) dynamic programming, kept as the reference the other engines are tested and benchmarked
+    against.
+    """
+    if len(s1) < len(s2):
+        return reference_distance(s2, s1)
+
+    if len(s2) == 0:
+        return len(s1)
+
+    previous_row = range(len(s2) + 1)
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1]
+        for j, c2 in enumerate(s2):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (c1 != c2)
+            current_row.append(min(insertions, deletions, substitutions))
+        previous_row = current_row
+
+    return previous_row[-1]
+
+
+def _common_prefix_length(s1: Sequence[Hashable], s2: Sequence[Hashable]) -> int:
+    # Binary search over slice comparisons, which run in C, rather than comparing element by element in Python
+    lo, hi = 0, min(len(s1), len(s2))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if s1[lo:mid] == s2[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _trim(s1: Sequence[Hashable], s2: Sequence[Hashable]) -> tuple:
+    # The common prefix and suffix don't contribute to the distance
+    start = _common_prefix_length(s1, s2)
+    s1, s2 = s1[start:], s2[start:]
+    end = _common_prefix_length(s1[::-1], s2[::-1])
+    return s1[: len(s1) - end], s2[: len(s2) - end]
+
+
+def myers_distance(s1: Sequence[Hashable], s2: Sequence[Hashable]) -> int:
+    """
+    Myers' bit-parallel edit distance, in Hyyrö's formulation. The shorter sequence is the pattern, encoded as one bit
+    per element; Python integers lift the usual 64-element limit.
+    """
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    m = len(s2)
+    if m == 0:
+        return len(s1)
+    # The positions of every element of the pattern
+    peq = {}
+    for i, c in enumerate(s2):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for c in s1:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return score
+
+
+def numpy_distance(s1: Sequence[Hashable], s2: Sequence[Hashable]) -> int:
+    """
+    Edit distance with each row of the DP matrix computed by vectorized NumPy operations. Elements are mapped to
+    integer ids first, so that comparing a row is a single array comparison.
+    """
+    import numpy as np
+
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    m = len(s2)
+    if m == 0:
+        return len(s1)
+    ids = {}
+    a = np.array([ids.setdefault(c, len(ids)) for c in s1], dtype=np.int64)
+    b = np.array([ids.setdefault(c, len(ids)) for c in s2], dtype=np.int64)
+    columns = np.arange(m + 1, dtype=np.int64)
+    previous_row = columns.copy()
+    current_row = np.empty(m + 1, dtype=np.int64)
+    for i in range(len(a)):
+        current_row[0] = i + 1
+        # Insertions and substitutions only depend on the previous row
+        np.minimum(
+            previous_row[1:] + 1, previous_row[:-1] + (b != a[i]), out=current_row[1:]
+        )
+        # Deletions chain along the row: current[j] = min over k <= j of (current[k] + j - k)
+        current_row = np.minimum.accumulate(current_row - columns) + columns
+        previous_row, current_row = current_row, previous_row
+    return int(previous_row[-1])
+
+
+def banded_distance(
+    s1: Sequence[Hashable], s2: Sequence[Hashable], max_distance: int
+) -> Optional[int]:
+    """
+    Edit distance computed only on the cells within max_distance of the main diagonal (Ukkonen's cutoff), in
+    O(max_distance·n) time.
+
+    Returns:
+        Optional[int]: The distance, or None if it is greater than max_distance.
+    """
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    n, m = len(s1), len(s2)
+    if n - m > max_distance:
+        return None
+    if m == 0:
+        return n
+    big = max_distance + 1
+    # previous_row[j] for j in [lo, hi], offset by lo; cells outside the band count as "too far"
+    previous_row = list(range(min(m, max_distance) + 1))
+    previous_lo = 0
+    for i in range(1, n + 1):
+        c1 = s1[i - 1]
+        lo, hi = max(0, i - max_distance), min(m, i + max_distance)
+        current_row = []
+        row_min = big
+        for j in range(lo, hi + 1):
+            if j == 0:
+                value = i
+            else:
+                k = j - previous_lo
+                diagonal = previous_row[k - 1] if 0 < k <= len(previous_row) else big
+                above = previous_row[k] if 0 <= k < len(previous_row) else big
+                left = current_row[-1] if current_row else big
+                value = min(above + 1, left + 1, diagonal + (c1 != s2[j - 1]))
+            current_row.append(value)
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return None
+        previous_row, previous_lo = current_row, lo
+    distance = previous_row[m - previous_lo]
+    return distance if distance <= max_distance else None
+
+
+# Beyond this width, the band costs more than a bit-parallel pass over the whole matrix
+BANDED_MAX_DISTANCE = 16
+
+
+def levenshtein_distance(
+    s1: Sequence[Hashable],
+    s2: Sequence[Hashable],
+    max_distance: Optional[int] = None,
+) -> int:
+    """
+    Returns the Levenshtein distance between two strings (character level) or two lists of words (word level).
+
+    Args:
+        s1 (Sequence[Hashable]): The first sequence.
+        s2 (Sequence[Hashable]): The second sequence.
+        max_distance (int, optional): If given, distances greater than max_distance are not computed exactly, and
+            max_distance + 1 is returned for them. Defaults to None (always exact).
+
+    Returns:
+        int: The distance.
+    """
+    s1, s2 = _trim(s1, s2)
+    if not s1 or not s2:
+        distance = len(s1) + len(s2)
+    elif max_distance is not None and max_distance <= BANDED_MAX_DISTANCE:
+        distance = banded_distance(s1, s2, max_distance)
+        return max_distance + 1 if distance is None else distance
+    else:
+        distance = myers_distance(s1, s2)
+    if max_distance is not None and distance > max_distance:
+        return max_distance + 1
+    return distance
+
+
+def alignment_counts(
+    s1: Sequence[Hashable],
+    s2: Sequence[Hashable],
+    marked: Optional[Sequence[bool]] = None,
+) -> Tuple[int, int, int, int, int]:
+    """
+    Counts the matches and edits of an optimal alignment of two sequences. Several alignments may have the minimum
+    number of edits (the Levenshtein distance), with more or fewer matches: "ab" and "ba" are aligned with 2
+    substitutions, or with a deletion, a match and an insertion. Among them, the one with the most matches counts,
+    then the one matching the most marked units of s1, so that the counts only depend on the sequences.
+
+    The DP weighs each edit far more than each deletion or insertion it saves a substitution with, and those far more
+    than each marked match, and only computes the diagonals of the matrix an alignment with the minimum number of edits
+    can go through, row by row with NumPy, in O(n·d) time for a distance d.
+
+    Args:
+        s1 (Sequence[Hashable]): The first sequence.
+        s2 (Sequence[Hashable]): The second sequence.
+        marked (Sequence[bool], optional): The units of s1 whose matches are counted separately. Defaults to None.
+
+    Returns:
+        Tuple[int, int, int, int, int]: The numbers of matches, substitutions, deletions (of units of s1), insertions
+            (of units of s2) and matched marked units.
+    """
+    import numpy as np
+
+    n, m = len(s1), len(s2)
+    ids = {}
+    a = np.array([ids.setdefault(c, len(ids)) for c in s1], dtype=np.int64)
+    b = np.array([ids.setdefault(c, len(ids)) for c in s2], dtype=np.int64)
+    bonus = (
+        np.zeros(n, dtype=np.int64)
+        if marked is None
+        else np.asarray(marked, dtype=np.int64)
+    )
+    distance = levenshtein_distance(s1, s2)
+
+    # Any alignment with `distance` edits stays within these diagonals (k = j - i)
+    slack = (distance - abs(m - n)) // 2
+    lo, hi = min(0, m - n) - slack, max(0, m - n) + slack
+    diagonals = np.arange(lo, hi + 1, dtype=np.int64)
+    width = len(diagonals)
+    indel_weight = int(bonus.sum()) + 1
+    # Any extra edit costs more than all the indels and marked matches it could add
+    edit_weight = indel_weight * (distance + 2)
+    substitution, indel = edit_weight, edit_weight - indel_weight
+    infinity = np.iinfo(np.int64).max // 4
+    offsets = diagonals * indel
+
+    # s2 padded, so that the units compared with s1[i - 1] on row i are b[i + lo - 1:i + hi] for any i
+    padding = n + width + 1
+    b = np.concatenate(
+        [np.full(padding, -1, dtype=np.int64), b, np.full(padding, -1, dtype=np.int64)]
+    )
+    row = np.where((diagonals >= 0) & (diagonals <= m), offsets, infinity)
+    for i in range(1, n + 1):
+        units = b[padding + i + lo - 1 : padding + i + hi]
+        current = row + np.where(units == a[i - 1], -bonus[i - 1], substitution)
+        # Deletions come from the next diagonal of the previous row
+        np.minimum(current[:-1], row[1:] + indel, out=current[:-1])
+        # Insertions chain along the row
+        current = np.minimum.accumulate(current - offsets) + offsets
+        # Cells outside the matrix (j < 0 or j > m)
+        current[: max(-i - lo, 0)] = infinity
+        current[max(m - i - lo + 1, 0) :] = infinity
+        row = current
+
+    cost = int(row[m - n - lo])
+    edits = -(-cost // edit_weight)
+    rest = edits * edit_weight - cost
+    indels, marked_matches = divmod(rest, indel_weight)
+    deletions = (indels + n - m) // 2
+    insertions = indels - deletions
+    substitutions = edits - indels
+    return (
+        n - substitutions - deletions,
+        substitutions,
+        deletions,
+        insertions,
+        marked_matches,
+    )
@@ -1,9 +1,23 @@
+import concurrent.futures
 import logging
+import multiprocessing
+import operator
+import os
+import threading
+import unicodedata
 from abc import ABC, abstractmethod
 from enum import Enum
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from decouple import config
+from .caches import EvaluatorScoreCache
+from .distance import alignment_counts, levenshtein_distance
 
 logger = logging.getLogger(__name__)
 
+# Below this number of characters to score, handing the pairs over to worker processes costs more than it saves (see
+# summa.benchmarks.evaluation)
+EVALUATION_MIN_CHARS = 2000
+
 
 class EvaluatorOutput:
     """
@@ -25,11 +39,178 @@ class EvaluatorOutput:
         return f"{self.evaluator.name}: {self.score}"
 
 
+def _has_diacritics(unit: str) -> bool:
+    return any(unicodedata.combining(c) for c in unicodedata.normalize("NFD", unit))
+
+
+class NormalizedText:
+    """
+    A text together with its normalized forms (lowercased and/or stripped, split into words, as arrays), each computed
+    once, when first needed, and shared by every evaluator and every pair the text is part of.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._hash = None
+        self._adjusted = {}
+        self._words = {}
+        self._diacritics = {}
+
+    @property
+    def hash(self) -> str:
+        """
+        The hash identifying the text in the evaluator score cache.
+        """
+        if self._hash is None:
+            self._hash = EvaluatorScoreCache.text_hash(self.text)
+        return self._hash
+
+    def adjusted(self, case_sensitive: bool, strip_padding: bool) -> str:
+        key = (case_sensitive, strip_padding)
+        if key not in self._adjusted:
+            text = self.text
+            if not case_sensitive:
+                text = text.lower()
+            if strip_padding:
+                text = text.strip()
+            self._adjusted[key] = text
+        return self._adjusted[key]
+
+    def words(self, case_sensitive: bool, strip_padding: bool) -> List[str]:
+        key = (case_sensitive, strip_padding)
+        if key not in self._words:
+            self._words[key] = self.adjusted(case_sensitive, strip_padding).split()
+        return self._words[key]
+
+    def units(
+        self, case_sensitive: bool, strip_padding: bool, word_level: bool
+    ) -> Union[str, List[str]]:
+        """
+        Returns the units compared by the evaluators: the adjusted text (characters) or its words.
+        """
+        if word_level:
+            return self.words(case_sensitive, strip_padding)
+        return self.adjusted(case_sensitive, strip_padding)
+
+    def diacritics(self, case_sensitive: bool, strip_padding: bool, word_level: bool):
+        """
+        Returns a NumPy boolean mask of the units bearing diacritics (characters, or words containing one).
+        """
+        import numpy as np
+
+        key = (case_sensitive, strip_padding, word_level)
+        if key not in self._diacritics:
+            self._diacritics[key] = np.fromiter(
+                (
+                    _has_diacritics(unit)
+                    for unit in self.units(case_sensitive, strip_padding, word_level)
+                ),
+                dtype=bool,
+            )
+        return self._diacritics[key]
+
+
+class Alignment:
+    """
+    The counts every restoration metric is computed from: processed units (characters or words) compared position by
+    position with raw units of the same length, or otherwise aligned with them (see summa.distance.alignment_counts).
+    """
+
+    def __init__(
+        self,
+        raw_units: Sequence[str],
+        processed_units: Sequence[str],
+        diacritics: Sequence[bool],
+    ):
+        """
+        Compares the units. Unequal lengths are aligned with the fewest edits, then the most matches, then the most
+        matched units bearing diacritics, so that the counts only depend on the texts.
+
+        Args:
+            raw_units (Sequence[str]): The original units.
+            processed_units (Sequence[str]): The processed units.
+            diacritics (Sequence[bool]): Whether each raw unit bears diacritics (see NormalizedText.diacritics).
+        """
+        import numpy as np
+
+        self.raw_length = len(raw_units)
+        self.processed_length = len(processed_units)
+        # The Levenshtein distance, whether the units are aligned or not
+        self.distance = levenshtein_distance(raw_units, processed_units)
+        if self.raw_length == self.processed_length:
+            matched = np.fromiter(
+                map(operator.eq, raw_units, processed_units),
+                dtype=bool,
+                count=self.raw_length,
+            )
+            self.matches = int(np.count_nonzero(matched))
+            self.substitutions = self.raw_length - self.matches
+            self.deletions = self.insertions = 0
+            self.diacritic_matches = int(np.count_nonzero(matched & diacritics))
+        else:
+            (
+                self.matches,
+                self.substitutions,
+                self.deletions,
+                self.insertions,
+                self.diacritic_matches,
+            ) = alignment_counts(raw_units, processed_units, diacritics)
+
+        # The number of compared positions, or of columns of the alignment
+        self.length = (
+            self.matches + self.substitutions + self.deletions + self.insertions
+        )
+
+
+class TextPair:
+    """
+    A raw text and a processed text to be scored against it. The alignments of its units are computed once, when
+    first needed, and shared by all the metrics.
+    """
+
+    def __init__(
+        self,
+        raw_text: Union[str, NormalizedText],
+        processed_text: Union[str, NormalizedText],
+    ):
+        if not isinstance(raw_text, NormalizedText):
+            raw_text = NormalizedText(raw_text)
+        if not isinstance(processed_text, NormalizedText):
+            processed_text = NormalizedText(processed_text)
+        self.raw = raw_text
+        self.processed = processed_text
+        self._alignments = {}
+
+    def alignment(
+        self, case_sensitive: bool, strip_padding: bool, word_level: bool
+    ) -> Alignment:
+        """
+        Returns the alignment of the processed units against the raw units.
+        """
+        # Keyed by the compared texts themselves, so that variants normalizing to the same texts (e.g. the case
+        # sensitive and insensitive variants of a text without capitals) share the alignment
+        key = (
+            word_level,
+            self.raw.adjusted(case_sensitive, strip_padding),
+            self.processed.adjusted(case_sensitive, strip_padding),
+        )
+        if key not in self._alignments:
+            self._alignments[key] = Alignment(
+                self.raw.units(case_sensitive, strip_padding, word_level),
+                self.processed.units(case_sensitive, strip_padding, word_level),
+                self.raw.diacritics(case_sensitive, strip_padding, word_level),
+            )
+        return self._alignments[key]
+
+
 class Evaluator(ABC):
     """
     Abstract base class for all evaluators.
     """
 
+    # Bump when the scores of an evaluator change, so that the scores cached before are not reused
+    version = 1
+
     def __init__(self, name: str, description: str):
         """
         Initializes the evaluator.
@@ -44,6 +225,13 @@ class Evaluator(ABC):
     def __str__(self) -> str:
         return self.name
 
+    @property
+    def cache_name(self) -> str:
+        """
+        The name identifying the evaluator (and the version of its scores) in the evaluator score cache.
+        """
+        return f"{self.name} v{self.version}"
+
     @abstractmethod
     def evaluate(self, raw_text: str, processed_text: str) -> EvaluatorOutput:
         """
@@ -55,6 +243,19 @@ class Evaluator(ABC):
         """
         pass
 
+    def evaluate_pair(self, pair: "TextPair") -> float:
+        """
+        Evaluates a text pair, reusing the intermediate results it already holds. Evaluators that can share work
+        override this; the default evaluates the texts from scratch.
+
+        Args:
+            pair (TextPair): The original and processed texts.
+
+        Returns:
+            float: The score of the evaluator.
+        """
+        return self.evaluate(pair.raw.text, pair.processed.text)
+
 
 class RestorationEvaluator(Evaluator, ABC):
     """
@@ -100,6 +301,15 @@ class RestorationEvaluator(Evaluator, ABC):
 
 
 class RestorationAccuracyEvaluator(RestorationEvaluator):
+    """
+    Restoration Accuracy: the share of raw units (characters or words) restored, i.e. equal to the processed unit at
+    the same position. When a unit was added or dropped and the texts have different lengths, the units are aligned
+    first (see Alignment), and the matches are counted over the columns of the alignment.
+    """
+
+    # 3: positions compared again for equal lengths, and an alignment only depending on the texts otherwise
+    version = 3
+
     def __init__(
         self,
         case_sensitive=True,
@@ -114,47 +324,11 @@ class RestorationAccuracyEvaluator(RestorationEvaluator):
             word_level,
         )
 
-    def _evaluate_word_level(self, raw_text: str, processed_text: str) -> float:
-        # Splitting the texts into words
-        raw_words = raw_text.split()
-        processed_words = processed_text.split()
-
-        # Check if the number of words match, otherwise return 0
-        if len(raw_words) != len(processed_words):
-            logger.info(
-                "The lengths of original and restored texts must be the same for accuracy calculation."
-            )
-            return 0
-
-        # Initialize counts
-        total_words = len(raw_words)
-        correct_restorations = 0
-
-        # Iterate through the words
-        for raw_word, proc_word in zip(raw_words, processed_words):
-            if raw_word == proc_word:
-                correct_restorations += 1
-
-        return correct_restorations / total_words
-
-    def _evaluate_char_level(self, raw_text: str, processed_text: str) -> float:
-        # Check if the number of characters match, otherwise return 0
-        if len(raw_text) != len(processed_text):
-            logger.info(
-                "The lengths of original and restored texts must be the same for accuracy calculation."
-            )
-            return 0
-
-        # Initialize counts
-        total_chars = len(raw_text)
-        correct_restorations = 0
-
-        # Iterate through the characters
-        for raw_char, proc_char in zip(raw_text, processed_text):
-            if raw_char == proc_char:
-                correct_restorations += 1
-
-        return correct_restorations / total_chars
+    def evaluate_pair(self, pair: TextPair) -> float:
+        alignment = pair.alignment(
+            self.case_sensitive, self.strip_padding, self.word_level
+        )
+        return alignment.matches / alignment.length
 
     def evaluate(self, raw_text: str, processed_text: str) -> float:
         """
@@ -167,13 +341,7 @@ class RestorationAccuracyEvaluator(RestorationEvaluator):
         Returns:
             float: The score of the evaluator.
         """
-
-        (raw_text, processed_text) = self.adjust_inputs(raw_text, processed_text)
-
-        if self.word_level:
-            return self._evaluate_word_level(raw_text, processed_text)
-        else:
-            return self._evaluate_char_level(raw_text, processed_text)
+        return self.evaluate_pair(TextPair(raw_text, processed_text))
 
 
 class RestorationErrorRateEvaluator(RestorationEvaluator):
@@ -193,23 +361,7 @@ class RestorationErrorRateEvaluator(RestorationEvaluator):
 
     @staticmethod
     def levenshtein_distance(s1, s2):
-        if len(s1) < len(s2):
-            return RestorationErrorRateEvaluator.levenshtein_distance(s2, s1)
-
-        if len(s2) == 0:
-            return len(s1)
-
-        previous_row = range(len(s2) + 1)
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-
-        return previous_row[-1]
+        return levenshtein_distance(s1, s2)
 
     @staticmethod
     def calculate_cer(original_text, restored_text):
@@ -229,14 +381,52 @@ class RestorationErrorRateEvaluator(RestorationEvaluator):
         # using min to avoid supra-unitary values
         return min(distance / len(original_words), 1)
 
-    def evaluate(self, raw_text: str, processed_text: str) -> EvaluatorOutput:
-        (raw_text, processed_text) = self.adjust_inputs(raw_text, processed_text)
+    def evaluate_pair(self, pair: TextPair) -> float:
+        alignment = pair.alignment(
+            self.case_sensitive, self.strip_padding, self.word_level
+        )
+        # As in calculate_cer/calculate_wer, using min to avoid supra-unitary values
+        error_rate = min(alignment.distance / alignment.raw_length, 1)
 
         # calculations are inverted (1 - error rate) because we want to be consistent with the other evaluators
-        if self.word_level:
-            return 1 - self.calculate_wer(raw_text, processed_text)
-        else:
-            return 1 - self.calculate_cer(raw_text, processed_text)
+        return 1 - error_rate
+
+    def evaluate(self, raw_text: str, processed_text: str) -> EvaluatorOutput:
+        return self.evaluate_pair(TextPair(raw_text, processed_text))
+
+
+class DiacriticRestorationAccuracyEvaluator(RestorationEvaluator):
+    # 3: positions compared again for equal lengths, and an alignment only depending on the texts otherwise
+    version = 3
+
+    def __init__(
+        self,
+        case_sensitive=True,
+        strip_padding=True,
+        word_level=False,
+    ):
+        super().__init__(
+            "DRA",
+            "Diacritic Restoration Accuracy: Evaluator for calculating the accuracy of a restoration on the characters (or words) bearing diacritics.",
+            case_sensitive,
+            strip_padding,
+            word_level,
+        )
+
+    def evaluate_pair(self, pair: TextPair) -> float:
+        import numpy as np
+
+        settings = (self.case_sensitive, self.strip_padding, self.word_level)
+        diacritics = pair.raw.diacritics(*settings)
+        total = int(np.count_nonzero(diacritics))
+        # Nothing to restore
+        if total == 0:
+            return 1.0
+
+        return pair.alignment(*settings).diacritic_matches / total
+
+    def evaluate(self, raw_text: str, processed_text: str) -> float:
+        return self.evaluate_pair(TextPair(raw_text, processed_text))
 
 
 class Evaluators(Enum):
@@ -264,3 +454,173 @@ class Evaluators(Enum):
     RER_CI_WL = RestorationErrorRateEvaluator(
         case_sensitive=False, strip_padding=True, word_level=True
     )
+    DRA_CS_CL = DiacriticRestorationAccuracyEvaluator(
+        case_sensitive=True, strip_padding=True, word_level=False
+    )
+    DRA_CI_CL = DiacriticRestorationAccuracyEvaluator(
+        case_sensitive=False, strip_padding=True, word_level=False
+    )
+    DRA_CS_WL = DiacriticRestorationAccuracyEvaluator(
+        case_sensitive=True, strip_padding=True, word_level=True
+    )
+    DRA_CI_WL = DiacriticRestorationAccuracyEvaluator(
+        case_sensitive=False, strip_padding=True, word_level=True
+    )
+
+
+def _text_pairs(pairs: Iterable[Union[Tuple[str, str], TextPair]]) -> List[TextPair]:
+    # Each distinct text is normalized once, whichever pairs it is part of
+    texts: Dict[str, NormalizedText] = {}
+
+    def normalized(text: str) -> NormalizedText:
+        if text not in texts:
+            texts[text] = NormalizedText(text)
+        return texts[text]
+
+    text_pairs = []
+    for pair in pairs:
+        if not isinstance(pair, TextPair):
+            raw_text, processed_text = pair
+            pair = TextPair(normalized(raw_text), normalized(processed_text))
+        text_pairs.append(pair)
+    return text_pairs
+
+
+def _evaluate_chunk(
+    items: List[Tuple[str, str, List[int]]], evaluators: List[Evaluator]
+) -> List[List[float]]:
+    # Runs in the worker processes of the evaluation executor: scores each (raw text, processed text) pair with the
+    # evaluators at the given indices
+    text_pairs = _text_pairs(
+        (raw_text, processed_text) for raw_text, processed_text, _ in items
+    )
+    return [
+        [evaluators[i].evaluate_pair(pair) for i in indices]
+        for pair, (_, _, indices) in zip(text_pairs, items)
+    ]
+
+
+def evaluate_batch(
+    pairs: Iterable[Union[Tuple[str, str], TextPair]],
+    evaluators: Iterable[Evaluator],
+    cache: EvaluatorScoreCache = None,
+    executor: concurrent.futures.Executor = None,
+    min_chars: int = EVALUATION_MIN_CHARS,
+    refresh: bool = False,
+) -> List[List[float]]:
+    """
+    Scores many (raw text, processed text) pairs with many evaluators in one pass. Each distinct text is normalized
+    and tokenized once (a raw text is typically shared by the outputs of every model), and each pair is aligned once
+    for all the metrics and evaluator variants.
+
+    Args:
+        pairs (Iterable[Union[Tuple[str, str], TextPair]]): The original and processed texts. Text pairs keep their
+            alignments, e.g. when cached on a model output.
+        evaluators (Iterable[Evaluator]): The evaluators to apply to every pair.
+        cache (EvaluatorScoreCache, optional): The cache to look scores up in, and to store the computed ones in.
+            Defaults to None (no caching).
+        executor (concurrent.futures.Executor, optional): A process pool to score the pairs in, in chunks of at least
+            min_chars characters, so that scoring doesn't hold the GIL of the threads doing network I/O. Alignments
+            computed there are not kept on the text pairs. Defaults to None (scoring in the calling thread).
+        min_chars (int, optional): The number of characters to score below which the executor is not worth its
+            overhead. Defaults to EVALUATION_MIN_CHARS.
+        refresh (bool, optional): If True, every score is computed again and overwrites the cached one, e.g. after an
+            evaluator changed without its version being bumped. Defaults to False.
+
+    Returns:
+        List[List[float]]: The scores of each pair, in the order of the evaluators.
+    """
+    evaluators = list(evaluators)
+    text_pairs = _text_pairs(pairs)
+    scores = [[None] * len(evaluators) for _ in text_pairs]
+
+    if cache is not None:
+        keys = [
+            [
+                cache.key(evaluator.cache_name, pair.raw.hash, pair.processed.hash)
+                for evaluator in evaluators
+            ]
+            for pair in text_pairs
+        ]
+    if cache is not None and not refresh:
+        cached = cache.get_many(key for pair_keys in keys for key in pair_keys)
+        for pair_scores, pair_keys in zip(scores, keys):
+            for i, key in enumerate(pair_keys):
+                pair_scores[i] = cached.get(key)
+
+    # Only the pairs with a score missing get aligned
+    missing = [
+        (p, [i for i, score in enumerate(pair_scores) if score is None])
+        for p, pair_scores in enumerate(scores)
+    ]
+    missing = [(p, indices) for p, indices in missing if indices]
+
+    def chars(p: int) -> int:
+        return len(text_pairs[p].raw.text) + len(text_pairs[p].processed.text)
+
+    if executor is not None and sum(chars(p) for p, _ in missing) >= min_chars:
+        chunks = [[]]
+        chunk_chars = 0
+        for p, indices in missing:
+            if chunk_chars >= min_chars:
+                chunks.append([])
+                chunk_chars = 0
+            chunks[-1].append((p, indices))
+            chunk_chars += chars(p)
+        futures = [
+            executor.submit(
+                _evaluate_chunk,
+                [
+                    (text_pairs[p].raw.text, text_pairs[p].processed.text, indices)
+                    for p, indices in chunk
+                ],
+                evaluators,
+            )
+            for chunk in chunks
+        ]
+        for chunk, future in zip(chunks, futures):
+            for (p, indices), chunk_scores in zip(chunk, future.result()):
+                for i, score in zip(indices, chunk_scores):
+                    scores[p][i] = score
+    else:
+        for p, indices in missing:
+            for i in indices:
+                scores[p][i] = evaluators[i].evaluate_pair(text_pairs[p])
+
+    if cache is not None:
+        cache.set_many(
+            {keys[p][i]: scores[p][i] for p, indices in missing for i in indices}
+        )
+    return scores
+
+
+_default_evaluation_executor = None
+_default_evaluation_executor_lock = threading.Lock()
+
+
+def default_evaluation_executor() -> Optional[concurrent.futures.ProcessPoolExecutor]:
+    """
+    Returns the process-wide pool of evaluation worker processes, creating it on first use from the
+    SUMMA_EVALUATION_PROCESS_POOL and SUMMA_EVALUATION_PROCESSES settings.
+
+    The pool is opt-in: its worker processes are spawned, and import the main module of the program again, which
+    must therefore only start running under an `if __name__ == "__main__":` guard (as manage.py and summa-cli.py do).
+
+    Returns:
+        concurrent.futures.ProcessPoolExecutor: The shared pool, or None if disabled.
+    """
+    global _default_evaluation_executor
+    with _default_evaluation_executor_lock:
+        if _default_evaluation_executor is None and config(
+            "SUMMA_EVALUATION_PROCESS_POOL", default=False, cast=bool
+        ):
+            # 0 means one process per core; with a single core, worker processes would only compete with the threads
+            processes = config("SUMMA_EVALUATION_PROCESSES", default=0, cast=int)
+            if processes or (os.cpu_count() or 1) > 1:
+                # Spawned rather than forked: the parent runs threads (and database connections) that must not be
+                # copied
+                _default_evaluation_executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=processes or os.cpu_count(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return _default_evaluation_executor
@@ -0,0 +1,464 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+from decouple import config
+from .retries import ErrorKinds, classify_error
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a text, using the common heuristic of ~4 characters per token.
+
+    Args:
+        text (str): The text to estimate the token count for.
+
+    Returns:
+        int: The estimated number of tokens (at least 1).
+    """
+    return max(1, math.ceil(len(text) / 4))
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. Tokens are reserved up front, letting the balance go negative, so that concurrent
+    callers queue up behind each other instead of all waking up at the same time when the bucket refills.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float):
+        """
+        Initializes the bucket, full.
+
+        Args:
+            capacity (float): The maximum number of tokens the bucket can hold (i.e. the allowed burst).
+            refill_rate (float): The number of tokens added to the bucket every second.
+        """
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.refill_rate
+        )
+        self._updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes the given amount of tokens from the bucket.
+
+        Args:
+            amount (float): The number of tokens to take. Amounts larger than the capacity are capped to it.
+
+        Returns:
+            float: The number of seconds the caller must wait before the reservation becomes valid.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= min(amount, self.capacity)
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.refill_rate
+
+    def refund(self, amount: float) -> None:
+        """
+        Puts tokens back into the bucket, e.g. when a reservation overestimated the actual usage.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class RateLimiter:
+    """
+    A requests-per-minute and tokens-per-minute limiter for a single provider/API key.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        """
+        Initializes the rate limiter.
+
+        Args:
+            name (str): The name of the limiter, used for logging.
+            requests_per_minute (float, optional): The request quota. Defaults to None (unlimited).
+            tokens_per_minute (float, optional): The token quota. Defaults to None (unlimited).
+        """
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = (
+            TokenBucket(requests_per_minute, requests_per_minute / 60)
+            if requests_per_minute
+            else None
+        )
+        self._tokens = (
+            TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+            if tokens_per_minute
+            else None
+        )
+
+    def _reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens))
+        if wait > 0:
+            logger.debug(
+                f"Rate limiter {self.name} throttling request for {wait:.2f} seconds"
+            )
+        return wait
+
+    def acquire(self, tokens: int = 1) -> float:
+        """
+        Blocks until a request using the given number of tokens is allowed to go out.
+
+        Args:
+            tokens (int, optional): The (estimated) number of tokens the request will use. Defaults to 1.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: int = 1) -> float:
+        """
+        Asynchronous counterpart of acquire(), waiting without blocking the event loop.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, reserved: int, used: int) -> None:
+        """
+        Reconciles the tokens reserved by acquire() with the tokens the request actually used, once known: tokens
+        reserved in excess are given back, and tokens used beyond the reservation are taken, delaying the next requests.
+
+        Args:
+            reserved (int): The number of tokens passed to acquire().
+            used (int): The number of prompt and completion tokens the request used.
+        """
+        if self._tokens is None:
+            return
+        # Reservations are capped to the bucket's capacity
+        reserved = min(reserved, self._tokens.capacity)
+        if used > reserved:
+            self._tokens.reserve(used - reserved)
+        elif used < reserved:
+            self._tokens.refund(reserved - used)
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.requests_per_minute or 'unlimited'} RPM, {self.tokens_per_minute or 'unlimited'} TPM)"
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, api_key: str) -> Optional[RateLimiter]:
+    """
+    Returns the rate limiter shared by every client of a provider/API key in this process.
+
+    Quotas are read from the SUMMA_RATE_LIMIT_<PROVIDER>_RPM and SUMMA_RATE_LIMIT_<PROVIDER>_TPM settings, e.g.
+    SUMMA_RATE_LIMIT_DEEPINFRA_RPM=600.
+
+    Args:
+        provider (str): The provider name (e.g. "deepinfra").
+        api_key (str): The API key the quota is attached to.
+
+    Returns:
+        RateLimiter: The shared limiter, or None if no quota is configured for the provider.
+    """
+    # Only a digest of the key is kept, so that keys don't end up in logs or debuggers
+    key = (provider, hashlib.sha256(str(api_key).encode("utf-8")).hexdigest())
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            prefix = f"SUMMA_RATE_LIMIT_{provider.upper()}"
+            rpm = config(f"{prefix}_RPM", default=0, cast=float)
+            tpm = config(f"{prefix}_TPM", default=0, cast=float)
+            _rate_limiters[key] = (
+                RateLimiter(provider, rpm or None, tpm or None) if rpm or tpm else None
+            )
+            if _rate_limiters[key] is not None:
+                logger.info(f"Rate limiting enabled for {_rate_limiters[key]}")
+        return _rate_limiters[key]
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of requests in flight to a model, adapting the limit to what the model can take (AIMD).
+
+    The limit grows while requests succeed with a healthy latency: by one per success at first (slow start, doubling
+    the limit every round trip), then by one per round trip. It is cut multiplicatively on rate limits, timeouts and
+    server errors, and when a request takes more than latency_tolerance times the average latency. Only one cut is
+    made per round trip: failures of requests that started before the last cut are already accounted for.
+
+    Args:
+        name (str): The name of the limiter, used for logging.
+        initial_limit (int, optional): The limit to start with. Defaults to 16.
+        min_limit (int, optional): The lowest the limit can go. Defaults to 1.
+        max_limit (int, optional): The highest the limit can go. Defaults to 256.
+        backoff (float, optional): The factor the limit is multiplied by when cut. Defaults to 0.5.
+        latency_tolerance (float, optional): The latency, relative to the average, counted as a spike. Defaults to 2.5.
+        min_samples (int, optional): The number of successes needed before detecting latency spikes. Defaults to 20.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.5,
+        min_samples: int = 20,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.min_samples = min_samples
+        self.in_flight = 0
+        self.latency = None
+        self.decreases = 0
+        self._samples = 0
+        self._slow_start = True
+        self._decreased_at = 0.0
+        # Blocked callers, in arrival order: threading.Event for threads, (loop, future) for coroutines
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _has_room(self) -> bool:
+        return self.in_flight < max(self.min_limit, int(self.limit))
+
+    def _wake_waiters(self) -> None:
+        # Slots are handed over to waiters directly, so that new callers can't overtake them
+        while self._waiters and self._has_room():
+            waiter = self._waiters.popleft()
+            self.in_flight += 1
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(self._hand_over, future)
+
+    def _hand_over(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            # The waiter gave up after the slot was handed over to it
+            self._release()
+        else:
+            future.set_result(None)
+
+    def _release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._wake_waiters()
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request can be sent.
+
+        Returns:
+            float: The time.monotonic() at which the slot was acquired, to be passed to release().
+        """
+        with self._lock:
+            if self._waiters or not self._has_room():
+                waiter = threading.Event()
+                self._waiters.append(waiter)
+            else:
+                self.in_flight += 1
+                waiter = None
+        if waiter is not None:
+            waiter.wait()
+        return time.monotonic()
+
+    async def aacquire(self) -> float:
+        """
+        Asynchronous counterpart of acquire(), waiting without blocking the event loop.
+        """
+        with self._lock:
+            if self._waiters or not self._has_room():
+                future = asyncio.get_running_loop().create_future()
+                waiter = (asyncio.get_running_loop(), future)
+                self._waiters.append(waiter)
+            else:
+                self.in_flight += 1
+                future = None
+        if future is not None:
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                raise
+        return time.monotonic()
+
+    def release(self, acquired_at: float, error: Optional[Exception] = None) -> None:
+        """
+        Frees the slot taken at acquired_at and adapts the limit to the outcome of the request.
+
+        Args:
+            acquired_at (float): The value returned by acquire().
+            error (Exception, optional): The error the request failed with, if any.
+        """
+        latency = time.monotonic() - acquired_at
+        with self._lock:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            if error is None:
+                self._on_success(latency, acquired_at, in_flight)
+            elif classify_error(error) != ErrorKinds.FATAL:
+                self._decrease(acquired_at, classify_error(error))
+            self._wake_waiters()
+
+    def _on_success(self, latency: float, acquired_at: float, in_flight: int) -> None:
+        spike = (
+            self._samples >= self.min_samples
+            and latency > self.latency_tolerance * self.latency
+        )
+        self._samples += 1
+        self.latency = (
+            latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+        )
+        if spike:
+            self._decrease(acquired_at, f"latency {latency:.2f} s")
+        elif in_flight >= self.limit / 2:
+            # Only a limit that is actually used is raised, or it would grow without bound while demand is low
+            limit = self.limit + (1 if self._slow_start else 1 / self.limit)
+            if int(limit) > int(self.limit):
+                logger.debug(
+                    f"Concurrency limit for {self.name} raised to {int(limit)}"
+                )
+            self.limit = min(self.max_limit, limit)
+
+    def _decrease(self, acquired_at: float, reason: str) -> None:
+        if acquired_at < self._decreased_at:
+            return
+        self._slow_start = False
+        self._decreased_at = time.monotonic()
+        self.decreases += 1
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        logger.info(
+            f"Concurrency limit for {self.name} cut to {int(self.limit)} ({reason})"
+        )
+
+    @contextlib.contextmanager
+    def slot(self):
+        """
+        Holds a slot for the duration of the block, adapting the limit to how the block went.
+        """
+        acquired_at = self.acquire()
+        try:
+            yield
+        except Exception as e:
+            self.release(acquired_at, e)
+            raise
+        except BaseException:
+            # Interrupted, so the outcome says nothing about the model
+            self._release()
+            raise
+        self.release(acquired_at)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self):
+        """
+        Asynchronous counterpart of slot().
+        """
+        acquired_at = await self.aacquire()
+        try:
+            yield
+        except Exception as e:
+            self.release(acquired_at, e)
+            raise
+        except BaseException:
+            self._release()
+            raise
+        self.release(acquired_at)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "latency": round(self.latency, 3) if self.latency is not None else None,
+                "decreases": self.decreases,
+            }
+
+    def __str__(self) -> str:
+        return f"{self.name} (concurrency {self.stats})"
+
+
+_concurrency_limiters = {}
+_concurrency_limiters_lock = threading.Lock()
+
+
+def get_concurrency_limiter(
+    provider: str, model_version: str
+) -> Optional[AdaptiveConcurrencyLimiter]:
+    """
+    Returns the adaptive concurrency limiter shared by every client of a model in this process, configured by the
+    SUMMA_CONCURRENCY_* settings.
+
+    Args:
+        provider (str): The provider name (e.g. "deepinfra").
+        model_version (str): The model version.
+
+    Returns:
+        AdaptiveConcurrencyLimiter: The shared limiter, or None if adaptive concurrency is disabled.
+    """
+    if not config("SUMMA_ADAPTIVE_CONCURRENCY", default=True, cast=bool):
+        return None
+    key = (provider, model_version)
+    with _concurrency_limiters_lock:
+        if key not in _concurrency_limiters:
+            _concurrency_limiters[key] = AdaptiveConcurrencyLimiter(
+                f"{provider}/{model_version}",
+                initial_limit=config(
+                    "SUMMA_CONCURRENCY_INITIAL_LIMIT", default=16, cast=int
+                ),
+                min_limit=config("SUMMA_CONCURRENCY_MIN_LIMIT", default=1, cast=int),
+                max_limit=config("SUMMA_CONCURRENCY_MAX_LIMIT", default=256, cast=int),
+                latency_tolerance=config(
+                    "SUMMA_CONCURRENCY_LATENCY_TOLERANCE", default=2.5, cast=float
+                ),
+            )
+        return _concurrency_limiters[key]
+
+
+def concurrency_limiter_stats() -> Dict[str, dict]:
+    """
+    Returns the state of every adaptive concurrency limiter created in this process, e.g. for logging.
+    """
+    with _concurrency_limiters_lock:
+        limiters = list(_concurrency_limiters.values())
+    return {limiter.name: limiter.stats for limiter in limiters}
@@ -1,15 +1,112 @@
-import openai
-import google.generativeai as genai
+import asyncio
+import contextlib
+import hashlib
 import logging
+import string
+import threading
 import time
 import os
 from abc import ABC, abstractmethod
+from cachetools import LRUCache
 from decouple import config
 from enum import Enum
+from typing import TYPE_CHECKING
+from .clients import default_client_registry
+from .caches import LLMResponseCache, default_llm_response_cache
+from .limiters import (
+    AdaptiveConcurrencyLimiter,
+    RateLimiter,
+    estimate_tokens,
+    get_concurrency_limiter,
+    get_rate_limiter,
+)
+from .singleflight import SingleFlight, default_single_flight
+
+# Provider SDKs are imported lazily by summa.clients, see ClientRegistry
+if TYPE_CHECKING:
+    import openai
+    import google.generativeai as genai
+    from .processors import CircuitBreakers
 
 logger = logging.getLogger(__name__)
 
 
+class CompiledTemplate:
+    """
+    A prompt template parsed once into its literal text and replacement fields, so that rendering it doesn't
+    re-parse the format string. Rendering is identical to str.format.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.md5 = hashlib.md5(source.encode("utf-8")).hexdigest()
+        self.parts = list(string.Formatter().parse(source))
+        self.fields = {name for _, name, _, _ in self.parts if name is not None}
+        # Templates with only plain {name} fields (the common case) are rendered by joining their parts,
+        # anything fancier (attributes, indexes, format specs, conversions, positional fields) by str.format
+        self._simple = all(
+            name is None or (name.isidentifier() and not spec and conversion is None)
+            for _, name, spec, conversion in self.parts
+        )
+
+    def render(self, kwargs: dict) -> str:
+        if not self._simple:
+            return self.source.format(**kwargs)
+        return "".join(
+            literal if name is None else literal + format(kwargs[name])
+            for literal, name, _, _ in self.parts
+        )
+
+
+_compiled_templates = LRUCache(maxsize=1024)
+_template_files = {}
+_templates_lock = threading.Lock()
+
+
+def compile_template(source: str) -> CompiledTemplate:
+    """
+    Returns the compiled form of a prompt template, compiling it only the first time its content is seen.
+
+    Args:
+        source (str): The prompt template string.
+
+    Returns:
+        CompiledTemplate: The compiled template, shared by every template with the same content (MD5 hash).
+    """
+    md5 = hashlib.md5(source.encode("utf-8")).hexdigest()
+    with _templates_lock:
+        compiled = _compiled_templates.get(md5)
+    if compiled is None:
+        compiled = CompiledTemplate(source)
+        with _templates_lock:
+            _compiled_templates[md5] = compiled
+    return compiled
+
+
+def load_template(template_path: str) -> CompiledTemplate:
+    """
+    Returns the compiled form of a prompt template file. The file is only read again when its modification time or
+    size changes, and only recompiled when its content (MD5 hash) has changed.
+
+    Args:
+        template_path (str): The path of the prompt template file.
+
+    Returns:
+        CompiledTemplate: The compiled template.
+    """
+    stat = os.stat(template_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _templates_lock:
+        cached = _template_files.get(template_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with open(template_path, "r") as file:
+        compiled = compile_template(file.read())
+    with _templates_lock:
+        _template_files[template_path] = (signature, compiled)
+    return compiled
+
+
 class PromptTemplate:
     """
     A class for storing a prompt template and its keyword arguments.
@@ -27,13 +124,15 @@ class PromptTemplate:
             ValueError: If neither template nor template_filename is specified.
         """
         if template is not None:
-            self.template = template
+            self.compiled = compile_template(template)
             self.template_filename = None
+            self.template_path = None
         elif template_filename is not None:
             self.template_filename = template_filename
             self._set_template_from_file(template_filename, prompts_dir=prompts_dir)
         else:
             raise ValueError("Prompt template or template filename must be specified")
+        self.template = self.compiled.source
 
     def _set_template_from_file(self, template_filename, prompts_dir):
         """
@@ -49,11 +148,13 @@ class PromptTemplate:
         # Construct the path to the prompt template file
         template_path = os.path.join(module_dir, prompts_dir, template_filename)
 
-        with open(template_path, "r") as file:
-            self.template = file.read()
-
+        self.compiled = load_template(template_path)
         self.template_path = template_path
 
+    @property
+    def md5(self) -> str:
+        return self.compiled.md5
+
     def render(self, *args, **kwargs):
         """
         Renders the prompt by substituting keyword arguments in the template.
@@ -64,14 +165,11 @@ class PromptTemplate:
         Returns:
             str: The rendered prompt string.
         """
-        if self.template is None:
-            return None
-
         # Check if only a single positional argument is provided and no keyword arguments
         if len(args) == 1 and not kwargs:
             kwargs = {"input": args[0]}
 
-        return self.template.format(**kwargs)
+        return self.compiled.render(kwargs)
 
     def __str__(self):
         """
@@ -88,32 +186,257 @@ class Prompt:
         self.prompt_template = prompt_template
         if len(args) == 1 and not kwargs:
             self.kwargs = {"input": args[0]}
+        else:
+            self.kwargs = kwargs
+        self._prompt = None
 
     @property
     def prompt(self):
-        return self.prompt_template.render(**self.kwargs)
+        # Rendered on first access only, every later read (output, cache key, request body) reuses it
+        if self._prompt is None:
+            self._prompt = self.prompt_template.render(**self.kwargs)
+        return self._prompt
 
     def __str__(self):
         return self.prompt
 
 
+class DeadlineExceededError(TimeoutError):
+    """
+    Raised when a call to an LLM takes longer than its deadline (see TextGenerationLLM.timeout).
+    """
+
+
 class TextGenerationLLM(ABC):
+    # Whether outputs of this model may be served from the LLM response cache
+    cacheable = True
+    # The API serving the model, shared by every model it serves (e.g. for circuit breakers)
+    provider = None
+
     def __init__(self, model, model_version):
         self.model = model
         self.model_version = model_version.value
+        # The response cache to use; None means the process-wide default cache (see summa.caches)
+        self.cache = None
+        # The provider rate limiter enforced before every request; None means unlimited (see summa.limiters)
+        self.rate_limiter: RateLimiter = None
+        # The limiter adapting the number of requests in flight to the model; None means unlimited
+        self.concurrency_limiter: AdaptiveConcurrencyLimiter = None
+        # The single-flight group that coalesces concurrent identical requests; None means the process-wide default
+        self.single_flight: SingleFlight = None
+        self.coalesce = config("SUMMA_LLM_SINGLE_FLIGHT", default=True, cast=bool)
+        # The deadline of a single call, in seconds; None means no deadline
+        self.timeout = config("SUMMA_LLM_TIMEOUT", default=120.0, cast=float) or None
+        # Whether to stream responses, recording time-to-first-token and decode speed (opt-in)
+        self.stream = config("SUMMA_LLM_STREAM", default=False, cast=bool)
 
     def __str__(self):
         return f"{self.model_version} ({self.model})"
 
+    @property
+    def generation_params(self) -> dict:
+        """
+        The generation parameters sent with every request, used as part of the response cache key.
+        """
+        return {}
+
+    def _get_cache(self) -> LLMResponseCache:
+        if not self.cacheable:
+            return None
+        return self.cache if self.cache is not None else default_llm_response_cache()
+
+    def _cache_key(self, prompt: Prompt) -> str:
+        return LLMResponseCache.key(
+            self.model, self.model_version, prompt.prompt, self.generation_params
+        )
+
+    def _from_cache(self, prompt: Prompt) -> "TextGenerationOutput":
+        cache = self._get_cache()
+        if cache is None:
+            return None
+        value = cache.get(self._cache_key(prompt))
+        if value is None:
+            return None
+        return TextGenerationOutput.from_cache(self, prompt, value)
+
+    def _to_cache(self, prompt: Prompt, output: "TextGenerationOutput") -> None:
+        cache = self._get_cache()
+        if cache is not None:
+            cache.set(self._cache_key(prompt), output.to_cache())
+
+    def _get_single_flight(self) -> SingleFlight:
+        # Only deterministic (i.e. cacheable) outputs may be shared between requests
+        if not (self.cacheable and self.coalesce):
+            return None
+        if self.single_flight is not None:
+            return self.single_flight
+        return default_single_flight()
+
+    def _concurrency_slot(self):
+        # Only requests that reach the model take a slot: cache hits and coalesced requests don't
+        if self.concurrency_limiter is None:
+            return contextlib.nullcontext()
+        return self.concurrency_limiter.slot()
+
+    def _aconcurrency_slot(self):
+        if self.concurrency_limiter is None:
+            return contextlib.nullcontext()
+        return self.concurrency_limiter.aslot()
+
+    def _request(self, prompt: Prompt) -> "TextGenerationOutput":
+        # The provider quota is waited for before taking a slot: the slot measures the model's latency, which waiting
+        # for the quota would inflate (and be mistaken for overload), and it would sit idle meanwhile
+        self._acquire_rate_limit(prompt)
+        with self._concurrency_slot():
+            output = self._generate(prompt)
+        self._settle_rate_limit(prompt, output)
+        return output
+
+    async def _arequest(self, prompt: Prompt) -> "TextGenerationOutput":
+        await self._aacquire_rate_limit(prompt)
+        async with self._aconcurrency_slot():
+            output = await self._agenerate(prompt)
+        self._settle_rate_limit(prompt, output)
+        return output
+
+    def _generate_and_cache(
+        self, prompt: Prompt, circuit_breakers: "CircuitBreakers" = None
+    ) -> "TextGenerationOutput":
+        # Only requests that reach the provider go through its circuit breaker: cache hits and coalesced requests
+        # neither wait for it nor count towards its error rate
+        if circuit_breakers is None:
+            output = self._request(prompt)
+        else:
+            output = circuit_breakers.call(self, self._request, prompt)
+        self._to_cache(prompt, output)
+        return output
+
+    async def _agenerate_and_cache(
+        self, prompt: Prompt, circuit_breakers: "CircuitBreakers" = None
+    ) -> "TextGenerationOutput":
+        if circuit_breakers is None:
+            output = await self._arequest(prompt)
+        else:
+            output = await circuit_breakers.acall(self, self._arequest, prompt)
+        self._to_cache(prompt, output)
+        return output
+
+    def _share(
+        self, prompt: Prompt, output: "TextGenerationOutput"
+    ) -> "TextGenerationOutput":
+        # Every request gets its own output object, since evaluations are attached to it later. A follower waited for
+        # a call to the provider, just not its own, so it isn't a cache hit
+        output = TextGenerationOutput.from_cache(self, prompt, output.to_cache())
+        output.cached = False
+        output.coalesced = True
+        return output
+
+    @staticmethod
+    def _estimate_tokens(prompt: Prompt) -> int:
+        # The prompt itself, plus a completion about as long as the input (true for restoration tasks)
+        return estimate_tokens(prompt.prompt) + sum(
+            estimate_tokens(str(v)) for v in prompt.kwargs.values()
+        )
+
+    def _acquire_rate_limit(self, prompt: Prompt) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self._estimate_tokens(prompt))
+
+    async def _aacquire_rate_limit(self, prompt: Prompt) -> None:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(self._estimate_tokens(prompt))
+
+    def _settle_rate_limit(
+        self, prompt: Prompt, output: "TextGenerationOutput"
+    ) -> None:
+        # The quota was reserved from an estimate, while the provider counts the actual prompt and completion tokens
+        if self.rate_limiter is not None and output.prompt_tokens is not None:
+            self.rate_limiter.settle(
+                self._estimate_tokens(prompt),
+                output.prompt_tokens + (output.completion_tokens or 0),
+            )
+
     @abstractmethod
-    def generate(self, prompt: Prompt) -> "TextGenerationOutput":
+    def _generate(self, prompt: Prompt) -> "TextGenerationOutput":
         pass
 
+    async def _agenerate(self, prompt: Prompt) -> "TextGenerationOutput":
+        """
+        Asynchronous counterpart of _generate(). Clients with a native asynchronous transport override this; the
+        default implementation runs the blocking _generate() in the event loop's default executor.
+        """
+        return await asyncio.to_thread(self._generate, prompt)
+
+    def generate(
+        self,
+        prompt: Prompt,
+        coalesce: bool = True,
+        circuit_breakers: "CircuitBreakers" = None,
+    ) -> "TextGenerationOutput":
+        """
+        Generates text for the given prompt, serving it from the response cache when possible. Concurrent identical
+        requests are coalesced into a single call, whose output is shared (see summa.singleflight).
+
+        Args:
+            prompt (Prompt): The prompt to generate text for.
+            coalesce (bool, optional): Whether the request may share an identical in-flight call. Hedged requests
+                must not, since they exist to race it. Defaults to True.
+            circuit_breakers (CircuitBreakers, optional): The circuit breakers guarding the call to the provider (see
+                summa.processors.CircuitBreakers). Defaults to None (no circuit breaker).
+
+        Returns:
+            TextGenerationOutput: The generated output.
+        """
+        output = self._from_cache(prompt)
+        if output is not None:
+            return output
+        single_flight = self._get_single_flight() if coalesce else None
+        if single_flight is None:
+            return self._generate_and_cache(prompt, circuit_breakers)
+        output, shared = single_flight.do(
+            self._cache_key(prompt),
+            lambda: self._generate_and_cache(prompt, circuit_breakers),
+        )
+        return self._share(prompt, output) if shared else output
+
+    async def agenerate(
+        self,
+        prompt: Prompt,
+        coalesce: bool = True,
+        circuit_breakers: "CircuitBreakers" = None,
+    ) -> "TextGenerationOutput":
+        """
+        Asynchronous counterpart of generate().
+
+        Args:
+            prompt (Prompt): The prompt to generate text for.
+            coalesce (bool, optional): Whether the request may share an identical in-flight call. Defaults to True.
+            circuit_breakers (CircuitBreakers, optional): The circuit breakers guarding the call to the provider.
+                Defaults to None (no circuit breaker).
+
+        Returns:
+            TextGenerationOutput: The generated output.
+        """
+        output = self._from_cache(prompt)
+        if output is not None:
+            return output
+        single_flight = self._get_single_flight() if coalesce else None
+        if single_flight is None:
+            return await self._agenerate_and_cache(prompt, circuit_breakers)
+        output, shared = await single_flight.ado(
+            self._cache_key(prompt),
+            lambda: self._agenerate_and_cache(prompt, circuit_breakers),
+        )
+        return self._share(prompt, output) if shared else output
+
 
 class TextGenerationOutput:
     def __init__(self, model: TextGenerationLLM, model_version, prompt: Prompt):
         self.model = model
         self.model_version = model_version
+        # The model version the output was requested from, which differs from model_version when a backup model
+        # answered the request (see summa.processors.HedgedTextProcessor)
+        self.requested_model_version = model_version
         self.prompt_template = prompt.prompt_template.template
         self.prompt_template_filename = prompt.prompt_template.template_filename
         self.prompt_template_path = prompt.prompt_template.template_path
@@ -121,24 +444,130 @@ class TextGenerationOutput:
         self.prompt_kwargs = prompt.kwargs
         self.output = None
         self.generation_time = None
-        self._generation_time_start = time.time()
+        # Only measured for streamed responses
+        self.time_to_first_token = None
+        self.time_to_last_token = None
+        self.output_tokens_per_second = None
+        self._streamed_tokens = 0
+        # Token usage as reported by the provider (or estimated when it isn't reported)
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self._generation_time_start = time.perf_counter()
+        self.cached = False
+        # Whether the output was shared by an identical request in flight (see summa.singleflight)
+        self.coalesced = False
         self.evals = None
+        # The alignment of the output against the raw text (see summa.evals.TextPair), set when evaluated
+        self.text_pair = None
 
     def __str__(self):
-        return f"{self.model} - {self.model_version} - {self.prompt_template_filename}: {self.output} ({self.generation_time} seconds)"
+        return f"{self.model} - {self.model_version} - {self.prompt_template_filename}: {self.output} ({self.generation_time} seconds{', cached' if self.cached else ''})"
+
+    def start_generation_timer(self):
+        """
+        Starts measuring the generation time. Clients call this right before sending the request, so that prompt
+        rendering and client-side waiting are not counted.
+        """
+        self._generation_time_start = time.perf_counter()
+
+    def measure_token(self, tokens=1):
+        """
+        Records the arrival of a streamed chunk.
+
+        Args:
+            tokens (int, optional): The number of tokens in the chunk. Defaults to 1.
+        """
+        elapsed = time.perf_counter() - self._generation_time_start
+        if self.time_to_first_token is None:
+            self.time_to_first_token = elapsed
+        else:
+            # The first chunk marks the end of queueing/prefill, so only later chunks count towards decode speed
+            self._streamed_tokens += tokens
+        self.time_to_last_token = elapsed
+
+    def record_usage(self, prompt_tokens=None, completion_tokens=None):
+        """
+        Records the token usage of the generation. Counts the provider did not report are estimated from the text.
+
+        Args:
+            prompt_tokens (int, optional): The number of prompt tokens reported by the provider.
+            completion_tokens (int, optional): The number of completion tokens reported by the provider.
+        """
+        self.prompt_tokens = (
+            prompt_tokens if prompt_tokens is not None else estimate_tokens(self.prompt)
+        )
+        self.completion_tokens = (
+            completion_tokens
+            if completion_tokens is not None
+            else estimate_tokens(self.output or "")
+        )
+
+    def check_deadline(self, timeout):
+        """
+        Raises a DeadlineExceededError if the generation has been running for longer than the given timeout. Streaming
+        clients call this for every chunk, since socket timeouts don't bound the total time of a slow-dripping stream.
+        """
+        if (
+            timeout is not None
+            and time.perf_counter() - self._generation_time_start > timeout
+        ):
+            raise DeadlineExceededError(
+                f"Generation exceeded its {timeout} seconds deadline ({self.model_version})"
+            )
 
     def measure_generation_time(self):
-        self.generation_time = time.time() - self._generation_time_start
+        self.generation_time = time.perf_counter() - self._generation_time_start
+        if self._streamed_tokens and self.time_to_last_token > self.time_to_first_token:
+            self.output_tokens_per_second = self._streamed_tokens / (
+                self.time_to_last_token - self.time_to_first_token
+            )
+
+    def to_cache(self) -> dict:
+        """
+        Returns the part of the output that is stored in the LLM response cache.
+        """
+        return {
+            "output": self.output,
+            "generation_time": self.generation_time,
+            "time_to_first_token": self.time_to_first_token,
+            "time_to_last_token": self.time_to_last_token,
+            "output_tokens_per_second": self.output_tokens_per_second,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+    @classmethod
+    def from_cache(
+        cls, llm: TextGenerationLLM, prompt: Prompt, value: dict
+    ) -> "TextGenerationOutput":
+        """
+        Rebuilds an output from a cached response. The generation time is the one measured when the response was
+        originally generated, so cached outputs remain comparable with fresh ones.
+        """
+        output = cls(model=llm.model, model_version=llm.model_version, prompt=prompt)
+        output.output = value["output"]
+        output.generation_time = value["generation_time"]
+        output.time_to_first_token = value.get("time_to_first_token")
+        output.time_to_last_token = value.get("time_to_last_token")
+        output.output_tokens_per_second = value.get("output_tokens_per_second")
+        output.prompt_tokens = value.get("prompt_tokens")
+        output.completion_tokens = value.get("completion_tokens")
+        output.cached = True
+        return output
 
 
 class Summa(TextGenerationLLM):
+    # Echoing is cheaper than a cache lookup
+    cacheable = False
+    provider = "summa"
+
     class ModelVersions(Enum):
         SUMMA_ECHO = "summa-echo"
 
     def __init__(self, model_version=ModelVersions.SUMMA_ECHO):
         super().__init__("Summa", model_version)
 
-    def generate(self, prompt):
+    def _generate(self, prompt):
         if self.model_version != Summa.ModelVersions.SUMMA_ECHO.value:
             raise ValueError(
                 f"Invalid model version for Summa: {self.model_version}. Expected: {self.ModelVersions.SUMMA_ECHO.value}"
@@ -148,31 +577,86 @@ class Summa(TextGenerationLLM):
         )
         # Return the prompt input as the output, effectively echoing it (used for baseline comparison)
         output.output = "\n".join(prompt.kwargs.values())
+        # Echoing doesn't consume any tokens
+        output.record_usage(0, 0)
         output.measure_generation_time()
         return output
 
+    async def _agenerate(self, prompt):
+        # Echoing does no I/O, so there is nothing to await
+        return self._generate(prompt)
+
 
 class OpenAIClient(TextGenerationLLM):
-    def __init__(self, model, model_version, api_key, base_url=None):
-        if base_url is None:
-            self.client = openai.OpenAI(api_key=api_key)
-        else:
-            self.client = openai.OpenAI(api_key=api_key, base_url=base_url)
+    def __init__(self, model, model_version, api_key, base_url=None, provider="openai"):
+        self.api_key = api_key
+        self.provider = provider
+        # Lets any OpenAI-compatible provider be pointed elsewhere, e.g. at a local stand-in (see summa.standin)
+        self.base_url = (
+            config(f"SUMMA_{provider.upper()}_BASE_URL", default="") or base_url
+        )
         super().__init__(model, model_version)
+        self.rate_limiter = get_rate_limiter(provider, api_key)
+        self.concurrency_limiter = get_concurrency_limiter(provider, self.model_version)
+
+    @property
+    def client(self) -> "openai.OpenAI":
+        # Shared by every model served from the same host with the same key, so they reuse one connection pool
+        return default_client_registry().openai_client(self.api_key, self.base_url)
 
-    def generate(self, prompt):
+    @property
+    def async_client(self) -> "openai.AsyncOpenAI":
+        return default_client_registry().async_openai_client(
+            self.api_key, self.base_url
+        )
+
+    @property
+    def generation_params(self):
+        return {"temperature": 0}
+
+    def _completion_kwargs(self, prompt):
+        return {
+            "messages": [{"role": "user", "content": prompt.prompt}],
+            "model": self.model_version,
+            **self.generation_params,
+        }
+
+    @staticmethod
+    def _record_usage(output, completion):
+        usage = completion.usage
+        output.record_usage(
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else None,
+        )
+
+    def _generate(self, prompt):
         try:
             output = TextGenerationOutput(
                 model=self.model, model_version=self.model_version, prompt=prompt
             )
+            kwargs = self._completion_kwargs(prompt)
+            output.start_generation_timer()
             # Generate text using the OpenAI chat completions API
-            completion = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt.prompt}],
-                model=self.model_version,
-                temperature=0,
-            )
-            # Return the first choice (the best one), stripped of whitespace
-            output.output = completion.choices[0].message.content.strip()
+            if self.stream:
+                chunks = []
+                for chunk in self.client.chat.completions.create(
+                    **kwargs, stream=True, timeout=self.timeout
+                ):
+                    output.check_deadline(self.timeout)
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if content:
+                        output.measure_token()
+                        chunks.append(content)
+                output.output = "".join(chunks).strip()
+                # Usage is not reported for streamed responses
+                output.record_usage()
+            else:
+                completion = self.client.chat.completions.create(
+                    **kwargs, timeout=self.timeout
+                )
+                # Return the first choice (the best one), stripped of whitespace
+                output.output = completion.choices[0].message.content.strip()
+                self._record_usage(output, completion)
             # Store the output and the time it took to generate it
             output.measure_generation_time()
             return output
@@ -182,6 +666,41 @@ class OpenAIClient(TextGenerationLLM):
             )
             raise e
 
+    async def _agenerate(self, prompt):
+        try:
+            output = TextGenerationOutput(
+                model=self.model, model_version=self.model_version, prompt=prompt
+            )
+            kwargs = self._completion_kwargs(prompt)
+            output.start_generation_timer()
+            # Generate text using the asynchronous OpenAI chat completions API
+            if self.stream:
+                chunks = []
+                stream = await self.async_client.chat.completions.create(
+                    **kwargs, stream=True, timeout=self.timeout
+                )
+                async for chunk in stream:
+                    output.check_deadline(self.timeout)
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if content:
+                        output.measure_token()
+                        chunks.append(content)
+                output.output = "".join(chunks).strip()
+                output.record_usage()
+            else:
+                completion = await self.async_client.chat.completions.create(
+                    **kwargs, timeout=self.timeout
+                )
+                output.output = completion.choices[0].message.content.strip()
+                self._record_usage(output, completion)
+            output.measure_generation_time()
+            return output
+        except Exception as e:
+            logger.error(
+                f"Error occurred during text generation: {str(e)} (Model: {self.model}, Model Version: {self.model_version})"
+            )
+            raise e
+
 
 class DeepInfraClient(OpenAIClient):
     def __init__(self, model, model_version):
@@ -191,52 +710,113 @@ class DeepInfraClient(OpenAIClient):
             model_version,
             api_key,
             base_url="https://api.deepinfra.com/v1/openai",
+            provider="deepinfra",
         )
 
 
 class GoogleAIClient(TextGenerationLLM):
+    provider = "google"
+
     def __init__(self, model, model_version, api_key):
-        genai.configure(api_key=api_key)
+        self.api_key = api_key
         super().__init__(model, model_version)
+        self.rate_limiter = get_rate_limiter("google", api_key)
+        self.concurrency_limiter = get_concurrency_limiter("google", self.model_version)
+
+    @property
+    def generation_params(self):
+        return {"temperature": 0.0}
+
+    def _generative_model(self) -> "genai.GenerativeModel":
+        # The model object, generation config and safety settings are built once and shared across calls
+        return default_client_registry().google_model(
+            self.model_version, self.generation_params, self.api_key
+        )
+
+    @staticmethod
+    def _record_usage(output, response):
+        usage = getattr(response, "usage_metadata", None)
+        output.record_usage(
+            usage.prompt_token_count if usage else None,
+            usage.candidates_token_count if usage else None,
+        )
+
+    @property
+    def _request_options(self):
+        return {"timeout": self.timeout} if self.timeout is not None else None
+
+    def _log_error(self, e, prompt, response):
+        prompt_feedback = (
+            response.prompt_feedback
+            if response is not None and response.prompt_feedback
+            else "N/A"
+        )
+        logger.error(
+            f"Unexpected error during text generation: {str(e)} (Model: {self.model}, Model Version: {self.model_version}, Prompt Feedback: {prompt_feedback}, Prompt: {prompt.prompt})"
+        )
 
-    def generate(self, prompt):
+    def _generate(self, prompt):
+        response = None
         try:
             output = TextGenerationOutput(
                 model=self.model, model_version=self.model_version, prompt=prompt
             )
-
-            # Setting up the model
-            generation_config = {
-                "temperature": 0.0,
-            }
-            safety_settings = {}
-            for harm_category in genai.types.HarmCategory:
-                if not harm_category in [
-                    genai.types.HarmCategory.HARM_CATEGORY_UNSPECIFIED,
-                    genai.types.HarmCategory.HARM_CATEGORY_DEROGATORY,
-                    genai.types.HarmCategory.HARM_CATEGORY_TOXICITY,
-                    genai.types.HarmCategory.HARM_CATEGORY_VIOLENCE,
-                    genai.types.HarmCategory.HARM_CATEGORY_SEXUAL,
-                    genai.types.HarmCategory.HARM_CATEGORY_MEDICAL,
-                    genai.types.HarmCategory.HARM_CATEGORY_DANGEROUS,
-                ]:
-                    safety_settings[harm_category] = (
-                        genai.types.HarmBlockThreshold.BLOCK_NONE
-                    )
+            model = self._generative_model()
+            output.start_generation_timer()
             # Generate text using the Google chat completions API, stripping whitespace
-            response = genai.GenerativeModel(self.model_version).generate_content(
-                prompt.prompt,
-                generation_config=generation_config,
-                safety_settings=safety_settings,
-            )
-            output.output = response.text.strip()
+            if self.stream:
+                response = model.generate_content(
+                    prompt.prompt, stream=True, request_options=self._request_options
+                )
+                chunks = []
+                for chunk in response:
+                    output.check_deadline(self.timeout)
+                    # Google streams multi-token chunks, so their size is estimated
+                    output.measure_token(estimate_tokens(chunk.text))
+                    chunks.append(chunk.text)
+                output.output = "".join(chunks).strip()
+            else:
+                response = model.generate_content(
+                    prompt.prompt, request_options=self._request_options
+                )
+                output.output = response.text.strip()
+            self._record_usage(output, response)
             # Calculate the time it took to generate it
             output.measure_generation_time()
             return output
         except Exception as e:
-            logger.error(
-                f"Unexpected error during text generation: {str(e)} (Model: {self.model}, Model Version: {self.model_version}, Prompt Feedback: {response.prompt_feedback if response.prompt_feedback else 'N/A'}, Prompt: {prompt.prompt})"
+            self._log_error(e, prompt, response)
+            raise e
+
+    async def _agenerate(self, prompt):
+        response = None
+        try:
+            output = TextGenerationOutput(
+                model=self.model, model_version=self.model_version, prompt=prompt
             )
+            model = self._generative_model()
+            output.start_generation_timer()
+            # Generate text using the asynchronous Google API, stripping whitespace
+            if self.stream:
+                response = await model.generate_content_async(
+                    prompt.prompt, stream=True, request_options=self._request_options
+                )
+                chunks = []
+                async for chunk in response:
+                    output.check_deadline(self.timeout)
+                    output.measure_token(estimate_tokens(chunk.text))
+                    chunks.append(chunk.text)
+                output.output = "".join(chunks).strip()
+            else:
+                response = await model.generate_content_async(
+                    prompt.prompt, request_options=self._request_options
+                )
+                output.output = response.text.strip()
+            self._record_usage(output, response)
+            output.measure_generation_time()
+            return output
+        except Exception as e:
+            self._log_error(e, prompt, response)
             raise e
 
 
@@ -300,35 +880,68 @@ class Google(GoogleAIClient):
         super().__init__("Google", model_version, api_key)
 
 
+_text_generation_llms = {}
+_text_generation_llms_lock = threading.Lock()
+
+
 class TextGenerationLLMs(Enum):
-    SUMMA_ECHO = Summa()
+    """
+    An enum for the available text generation LLMs.
 
-    OPENAI_GPT_3_5_TURBO = OpenAI(model_version=OpenAI.ModelVersions.GPT_3_5_TURBO)
-    OPENAI_GPT_4 = OpenAI(model_version=OpenAI.ModelVersions.GPT_4)
-    OPENAI_GPT_4_TURBO = OpenAI(model_version=OpenAI.ModelVersions.GPT_4_TURBO)
-    OPENAI_GPT_4o = OpenAI(model_version=OpenAI.ModelVersions.GPT_4o)
+    Members are declared as (class, model version) pairs and only instantiated the first time their value is
+    accessed, so that importing this module does not build every client up front.
+    """
 
-    GOOGLE_GEMINI_1_0_PRO = Google(model_version=Google.ModelVersions.GEMINI_1_0_PRO)
-    GOOGLE_GEMINI_1_5_PRO = Google(model_version=Google.ModelVersions.GEMINI_1_5_PRO)
-    GOOGLE_GEMINI_1_5_FLASH = Google(
-        model_version=Google.ModelVersions.GEMINI_1_5_FLASH
-    )
+    SUMMA_ECHO = (Summa, Summa.ModelVersions.SUMMA_ECHO)
 
-    META_LLAMA_2_7B_CHAT_HF = Meta(
-        model_version=Meta.ModelVersions.META_LLAMA_2_7B_CHAT_HF
-    )
-    META_LLAMA_2_70B_CHAT_HF = Meta(
-        model_version=Meta.ModelVersions.META_LLAMA_2_70B_CHAT_HF
-    )
-    META_LLAMA_3_8B_INSTRUCT = Meta(
-        model_version=Meta.ModelVersions.META_LLAMA_3_8B_INSTRUCT
+    OPENAI_GPT_3_5_TURBO = (OpenAI, OpenAI.ModelVersions.GPT_3_5_TURBO)
+    OPENAI_GPT_4 = (OpenAI, OpenAI.ModelVersions.GPT_4)
+    OPENAI_GPT_4_TURBO = (OpenAI, OpenAI.ModelVersions.GPT_4_TURBO)
+    OPENAI_GPT_4o = (OpenAI, OpenAI.ModelVersions.GPT_4o)
+
+    GOOGLE_GEMINI_1_0_PRO = (Google, Google.ModelVersions.GEMINI_1_0_PRO)
+    GOOGLE_GEMINI_1_5_PRO = (Google, Google.ModelVersions.GEMINI_1_5_PRO)
+    GOOGLE_GEMINI_1_5_FLASH = (Google, Google.ModelVersions.GEMINI_1_5_FLASH)
+
+    META_LLAMA_2_7B_CHAT_HF = (Meta, Meta.ModelVersions.META_LLAMA_2_7B_CHAT_HF)
+    META_LLAMA_2_70B_CHAT_HF = (Meta, Meta.ModelVersions.META_LLAMA_2_70B_CHAT_HF)
+    META_LLAMA_3_8B_INSTRUCT = (Meta, Meta.ModelVersions.META_LLAMA_3_8B_INSTRUCT)
+    META_LLAMA_3_70B_INSTRUCT = (Meta, Meta.ModelVersions.META_LLAMA_3_70B_INSTRUCT)
+
+    DEEPINFRA_AIROBOROS_70B = (
+        DeepInfra,
+        DeepInfra.ModelVersions.DEEPINFRA_AIROBOROS_70B,
     )
-    META_LLAMA_3_70B_INSTRUCT = Meta(
-        model_version=Meta.ModelVersions.META_LLAMA_3_70B_INSTRUCT
+
+    MISTRALAI_MIXTRAL_8X7B_INSTRUCT_V0_1 = (
+        MistralAI,
+        MistralAI.ModelVersions.MISTRALAI_MIXTRAL_8X7B_INSTRUCT_V0_1,
     )
 
-    DEEPINFRA_AIROBOROS_70B = DeepInfra()
+    OPENLLMRO_ROLLAMA_2_7B_CHAT_V1 = (
+        OpenLLMRO,
+        OpenLLMRO.ModelVersions.OPENLLMRO_ROLLAMA_2_7B_CHAT_V1,
+    )
 
-    MISTRALAI_MIXTRAL_8X7B_INSTRUCT_V0_1 = MistralAI()
+    @property
+    def value(self) -> TextGenerationLLM:
+        """
+        The client instance for this LLM, created on first access and shared afterwards.
+        """
+        llm = _text_generation_llms.get(self.name)
+        if llm is None:
+            with _text_generation_llms_lock:
+                llm = _text_generation_llms.get(self.name)
+                if llm is None:
+                    llm_class, model_version = self._value_
+                    llm = _text_generation_llms[self.name] = llm_class(
+                        model_version=model_version
+                    )
+        return llm
 
-    OPENLLMRO_ROLLAMA_2_7B_CHAT_V1 = OpenLLMRO()
+    @property
+    def model_version(self) -> str:
+        """
+        The model version of this LLM, available without instantiating its client.
+        """
+        return self._value_[1].value
@@ -0,0 +1,156 @@
+import logging
+import re
+from typing import List, Optional
+from .limiters import estimate_tokens
+from .llms import Prompt, PromptTemplate, TextGenerationOutput
+
+logger = logging.getLogger(__name__)
+
+PACKING_INSTRUCTION = """# Format
+The INPUT below contains {count} numbered lines, each starting with a marker such as [#1]. Process every line \
+independently and answer with exactly {count} lines, each starting with the same marker as its input line, in the \
+same order.
+
+"""
+
+
+class PromptPacker:
+    """
+    Packs several short texts into a single prompt, one per numbered line, and splits the response back into one output
+    per text. Packing amortizes the prompt template and the per-request overhead over up to max_texts texts.
+
+    Args:
+        max_texts (int): The maximum number of texts in a packed prompt.
+        max_tokens (int): The maximum (estimated) number of input tokens in a packed prompt.
+    """
+
+    MARKER = "[#{}] "
+    LINE = re.compile(r"^\s*\[#(\d+)\]\s?(.*?)\s*$", re.MULTILINE)
+
+    def __init__(self, max_texts: int = 8, max_tokens: int = 1000):
+        self.max_texts = max_texts
+        self.max_tokens = max_tokens
+
+    def packable(self, text: str) -> bool:
+        # Texts spanning several lines, or looking like markers, can't be split back reliably
+        return "\n" not in text and "[#" not in text and text.strip() != ""
+
+    def pack(self, texts: List[str]) -> List[List[int]]:
+        """
+        Groups packable texts into packs, in order, without exceeding max_texts texts or max_tokens tokens per pack.
+        Texts that can't be packed get a pack of their own.
+
+        Args:
+            texts (List[str]): The texts to pack.
+
+        Returns:
+            List[List[int]]: The indices of the texts in each pack.
+        """
+        packs, pack, tokens = [], [], 0
+        for i, text in enumerate(texts):
+            if not self.packable(text):
+                packs.append([i])
+                continue
+            text_tokens = estimate_tokens(text)
+            if pack and (
+                len(pack) >= self.max_texts or tokens + text_tokens > self.max_tokens
+            ):
+                packs.append(pack)
+                pack, tokens = [], 0
+            pack.append(i)
+            tokens += text_tokens
+        if pack:
+            packs.append(pack)
+        return packs
+
+    def template(self, prompt_template: PromptTemplate, count: int) -> PromptTemplate:
+        """
+        Returns the prompt template extended with the instructions for answering a pack of the given size.
+        """
+        instruction = PACKING_INSTRUCTION.format(count=count)
+        # Literal braces in the instruction must not be taken for template fields
+        instruction = instruction.replace("{", "{{").replace("}", "}}")
+        packed = PromptTemplate(template=instruction + prompt_template.template)
+        packed.template_filename = prompt_template.template_filename
+        packed.template_path = prompt_template.template_path
+        return packed
+
+    def prompt(self, prompt_template: PromptTemplate, texts: List[str]) -> Prompt:
+        """
+        Returns the packed prompt for the given texts.
+        """
+        lines = [self.MARKER.format(i) + text for i, text in enumerate(texts, start=1)]
+        return Prompt(
+            self.template(prompt_template, len(texts)), "\n" + "\n".join(lines)
+        )
+
+    def split(self, output: str, count: int) -> Optional[List[str]]:
+        """
+        Splits a packed response into one output per text.
+
+        Args:
+            output (str): The response to a packed prompt.
+            count (int): The number of texts in the pack.
+
+        Returns:
+            Optional[List[str]]: The outputs, in order, or None if the response doesn't have exactly one line per text.
+        """
+        lines = {}
+        for match in self.LINE.finditer(output or ""):
+            index = int(match.group(1))
+            if index in lines:
+                return None
+            lines[index] = match.group(2)
+        if sorted(lines) != list(range(1, count + 1)):
+            return None
+        return [lines[i] for i in range(1, count + 1)]
+
+    def unpack(
+        self,
+        packed_output: TextGenerationOutput,
+        prompt_template: PromptTemplate,
+        texts: List[str],
+    ) -> Optional[List[TextGenerationOutput]]:
+        """
+        Turns the output of a packed prompt into one output per text, as if each text had been processed on its own.
+        Each output keeps the generation time of the packed call and a share of its token usage, proportional to the
+        length of its text.
+
+        Args:
+            packed_output (TextGenerationOutput): The output of the packed prompt.
+            prompt_template (PromptTemplate): The original (unpacked) prompt template.
+            texts (List[str]): The texts in the pack.
+
+        Returns:
+            Optional[List[TextGenerationOutput]]: The outputs, in order, or None if the response couldn't be split.
+        """
+        split = self.split(packed_output.output, len(texts))
+        if split is None:
+            logger.warning(
+                f"Could not split the response to a pack of {len(texts)} texts ({packed_output.model_version})"
+            )
+            return None
+        total = sum(estimate_tokens(text) for text in texts)
+        outputs = []
+        for text, content in zip(texts, split):
+            output = TextGenerationOutput(
+                packed_output.model,
+                packed_output.model_version,
+                Prompt(prompt_template, text),
+            )
+            output.requested_model_version = packed_output.requested_model_version
+            # What was actually sent to the model
+            output.prompt = packed_output.prompt
+            output.output = content
+            output.generation_time = packed_output.generation_time
+            share = estimate_tokens(text) / total
+            if packed_output.prompt_tokens is not None:
+                output.prompt_tokens = round(packed_output.prompt_tokens * share)
+            if packed_output.completion_tokens is not None:
+                output.completion_tokens = round(
+                    packed_output.completion_tokens * share
+                )
+            output.cached = packed_output.cached
+            output.coalesced = packed_output.coalesced
+            outputs.append(output)
+        return outputs
@@ -1,9 +1,35 @@
-from typing import List
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Tuple
+import asyncio
 import concurrent.futures
+import logging
+import queue
+import threading
+import time
 from .preprocessors import TextPreprocessor
 from .processors import TextProcessor
-from .llms import TextGenerationLLM, TextGenerationOutput, PromptTemplate, Prompt
-from .evals import Evaluator, EvaluatorOutput
+from .llms import (
+    OpenAIClient,
+    TextGenerationLLM,
+    TextGenerationOutput,
+    PromptTemplate,
+    Prompt,
+)
+from .evals import (
+    Evaluator,
+    EvaluatorOutput,
+    NormalizedText,
+    TextPair,
+    default_evaluation_executor,
+    evaluate_batch,
+)
+from .batches import OpenAIBatch
+from .budgets import BudgetExceededError, TokenBudget, use_budget
+from .caches import EvaluatorScoreCache, default_evaluator_score_cache
+from .retries import RetryBudget, use_retry_budget
+from .packing import PromptPacker
+from .scheduling import WorkQueue
+
+logger = logging.getLogger(__name__)
 
 
 class PipelineRunOutput:
@@ -37,22 +63,64 @@ class PipelineRunner:
         llms: List[TextGenerationLLM],
         prompt_templates: List[PromptTemplate],
         evaluators: List[Evaluator],
+        budget: TokenBudget = None,
+        retry_budget: RetryBudget = None,
     ):
         self.preprocessor = preprocessor
         self.processor = processor
         self.llms = llms
         self.prompt_templates = prompt_templates
         self.evaluators = evaluators
+        self.budget = budget
+        self.retry_budget = retry_budget
+        # The evaluator score cache to use; None means the process-wide default cache (see summa.caches)
+        self.score_cache = None
+        # The process pool scoring the outputs (the CPU-bound stage, kept off the threads doing network I/O); None
+        # means the process-wide default pool (see summa.evals)
+        self.evaluation_executor = None
+
+    def _get_score_cache(self) -> EvaluatorScoreCache:
+        return (
+            self.score_cache
+            if self.score_cache is not None
+            else default_evaluator_score_cache()
+        )
+
+    def _get_evaluation_executor(self) -> concurrent.futures.Executor:
+        return (
+            self.evaluation_executor
+            if self.evaluation_executor is not None
+            else default_evaluation_executor()
+        )
 
     def _preprocess(self, raw_text: str) -> str:
         return self.preprocessor.preprocess(raw_text)
 
+    def _check_budget(self) -> None:
+        if self.budget is not None:
+            self.budget.check()
+
+    def _charge_budget(self, output: TextGenerationOutput) -> TextGenerationOutput:
+        if self.budget is not None:
+            self.budget.charge(output)
+        return output
+
+    def _process_prompt(
+        self, model: TextGenerationLLM, prompt: Prompt
+    ) -> TextGenerationOutput:
+        # No new request is dispatched once the budget is exhausted
+        self._check_budget()
+        # Retries made by the processor are drawn from the run's retry budget, and its other requests (e.g. hedges that
+        # lost) are charged to the run's budget
+        with use_retry_budget(self.retry_budget), use_budget(self.budget):
+            return self._charge_budget(self.processor.process(model, prompt))
+
     def _process(self, preprocessed_text: str) -> List[TextGenerationOutput]:
         processed_outputs = []
         for model in self.llms:
             for prompt_template in self.prompt_templates:
                 prompt = Prompt(prompt_template, preprocessed_text)
-                processed_outputs.append(self.processor.process(model, prompt))
+                processed_outputs.append(self._process_prompt(model, prompt))
         return processed_outputs
 
     def _process_parallel(self, preprocessed_text: str) -> List[TextGenerationOutput]:
@@ -60,7 +128,7 @@ class PipelineRunner:
         with concurrent.futures.ThreadPoolExecutor() as executor:
             # Submit process tasks to the executor
             futures = [
-                executor.submit(self.processor.process, model, prompt)
+                executor.submit(self._process_prompt, model, prompt)
                 for model in self.llms
                 for prompt_template in self.prompt_templates
                 for prompt in [Prompt(prompt_template, preprocessed_text)]
@@ -75,14 +143,30 @@ class PipelineRunner:
     def _evaluate(
         self, raw_text: str, processed_outputs: List[TextGenerationOutput]
     ) -> None:
-        for output in processed_outputs:
-            evaluated_outputs = []
-            for evaluator in self.evaluators:
-                evaluator_output = EvaluatorOutput(
-                    evaluator, evaluator.evaluate(raw_text, output.output)
-                )
-                evaluated_outputs.append(evaluator_output)
-            output.evals = evaluated_outputs
+        self._evaluate_outputs([(raw_text, output) for output in processed_outputs])
+
+    def _evaluate_outputs(
+        self, outputs: List[Tuple[str, TextGenerationOutput]]
+    ) -> None:
+        # Scores (raw text, output) pairs in one batch. Every output is aligned against its raw text once; the
+        # alignments computed in this process are kept on it
+        raws = {}
+        for raw_text, output in outputs:
+            if raw_text not in raws:
+                raws[raw_text] = NormalizedText(raw_text)
+            output.text_pair = TextPair(raws[raw_text], output.output)
+        processed_outputs = [output for _, output in outputs]
+        scores = evaluate_batch(
+            [output.text_pair for output in processed_outputs],
+            self.evaluators,
+            self._get_score_cache(),
+            self._get_evaluation_executor(),
+        )
+        for output, output_scores in zip(processed_outputs, scores):
+            output.evals = [
+                EvaluatorOutput(evaluator, score)
+                for evaluator, score in zip(self.evaluators, output_scores)
+            ]
 
     def run(self, raw_text: str, sequential=False) -> PipelineRunOutput:
         preprocessed_text = self._preprocess(raw_text)
@@ -94,3 +178,651 @@ class PipelineRunner:
         return PipelineRunOutput(
             raw_text, self.preprocessor, preprocessed_text, processed_outputs
         )
+
+
+class AsyncPipelineRunner(PipelineRunner):
+    """
+    A pipeline runner that issues every request from a single asyncio event loop instead of a thread per request.
+
+    Args:
+        max_concurrency (int): The maximum number of requests in flight at any given time, across all texts.
+    """
+
+    def __init__(
+        self,
+        preprocessor: TextPreprocessor,
+        processor: TextProcessor,
+        llms: List[TextGenerationLLM],
+        prompt_templates: List[PromptTemplate],
+        evaluators: List[Evaluator],
+        max_concurrency: int = 1000,
+        budget: TokenBudget = None,
+        retry_budget: RetryBudget = None,
+    ):
+        super().__init__(
+            preprocessor,
+            processor,
+            llms,
+            prompt_templates,
+            evaluators,
+            budget,
+            retry_budget,
+        )
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # The semaphore is bound to the loop it is first used in, so a new one is needed for every asyncio.run()
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _aprocess_prompt(
+        self, model: TextGenerationLLM, prompt: Prompt
+    ) -> TextGenerationOutput:
+        async with self._get_semaphore():
+            self._check_budget()
+            with use_retry_budget(self.retry_budget), use_budget(self.budget):
+                output = await self.processor.aprocess(model, prompt)
+            return self._charge_budget(output)
+
+    async def _aprocess(self, preprocessed_text: str) -> List[TextGenerationOutput]:
+        return list(
+            await asyncio.gather(
+                *[
+                    self._aprocess_prompt(
+                        model, Prompt(prompt_template, preprocessed_text)
+                    )
+                    for model in self.llms
+                    for prompt_template in self.prompt_templates
+                ]
+            )
+        )
+
+    async def _aevaluate(
+        self, raw_text: str, processed_outputs: List[TextGenerationOutput]
+    ) -> None:
+        # Scoring (and waiting for the evaluation processes) happens in a worker thread, off the event loop
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._evaluate, raw_text, processed_outputs
+        )
+
+    async def arun(self, raw_text: str) -> PipelineRunOutput:
+        preprocessed_text = self._preprocess(raw_text)
+        processed_outputs = await self._aprocess(preprocessed_text)
+        await self._aevaluate(raw_text, processed_outputs)
+        return PipelineRunOutput(
+            raw_text, self.preprocessor, preprocessed_text, processed_outputs
+        )
+
+    async def arun_many(
+        self, raw_texts: Iterable[str]
+    ) -> AsyncIterator[PipelineRunOutput]:
+        """
+        Runs the pipeline over many texts concurrently, yielding each text's output as soon as it is complete.
+
+        Args:
+            raw_texts (Iterable[str]): The texts to run the pipeline over.
+
+        Yields:
+            PipelineRunOutput: The output for each text, in completion order.
+        """
+        tasks = [asyncio.ensure_future(self.arun(raw_text)) for raw_text in raw_texts]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def run(self, raw_text: str, sequential=False) -> PipelineRunOutput:
+        if sequential:
+            return super().run(raw_text, sequential=True)
+        return asyncio.run(self.arun(raw_text))
+
+    def run_many(self, raw_texts: Iterable[str]) -> List[PipelineRunOutput]:
+        async def _collect():
+            return [output async for output in self.arun_many(raw_texts)]
+
+        return asyncio.run(_collect())
+
+
+class BatchPipelineRunner(PipelineRunner):
+    """
+    A pipeline runner for large, offline runs. Every (text, LLM, prompt template) request is rendered up front and
+    submitted through the provider's batch API, which is cheaper and has higher quotas than the synchronous one.
+
+    LLMs without a batch API, requests that fail within a batch, and the requests of batches that are not finished
+    after max_wait seconds, are processed synchronously with the processor.
+
+    Args:
+        batch_dir (str): The directory where batch request files are written.
+        poll_interval (float): The number of seconds between two batch status checks. It doubles, up to 16 times, while
+            checks fail.
+        max_wait (float, optional): The number of seconds to wait for the batches, after which the unfinished ones are
+            cancelled. Defaults to None (no limit).
+    """
+
+    def __init__(
+        self,
+        preprocessor: TextPreprocessor,
+        processor: TextProcessor,
+        llms: List[TextGenerationLLM],
+        prompt_templates: List[PromptTemplate],
+        evaluators: List[Evaluator],
+        batch_dir: str,
+        poll_interval: float = 30.0,
+        budget: TokenBudget = None,
+        retry_budget: RetryBudget = None,
+        max_wait: float = None,
+    ):
+        super().__init__(
+            preprocessor,
+            processor,
+            llms,
+            prompt_templates,
+            evaluators,
+            budget,
+            retry_budget,
+        )
+        self.batch_dir = batch_dir
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+
+    def _submit_batches(self, prompts: dict, outputs: dict) -> List[tuple]:
+        batches = []
+        for l, llm in enumerate(self.llms):
+            if not isinstance(llm, OpenAIClient):
+                continue
+            batch_prompts = {}
+            for (i, j), prompt in prompts.items():
+                # Responses already in the cache don't need to be requested again
+                output = llm._from_cache(prompt)
+                if output is not None:
+                    outputs[(i, l, j)] = output
+                else:
+                    batch_prompts[f"{i}-{j}"] = prompt
+            if not batch_prompts:
+                continue
+            batch = OpenAIBatch(llm, batch_prompts, self.batch_dir)
+            try:
+                batch.submit()
+                batches.append((l, batch))
+            except Exception as e:
+                logger.warning(
+                    f"Could not submit batch for {llm}, falling back to synchronous processing: {e}"
+                )
+        return batches
+
+    def _wait_for_batches(self, batches: List[tuple]) -> None:
+        pending = [batch for _, batch in batches]
+        deadline = None if self.max_wait is None else time.monotonic() + self.max_wait
+        interval = self.poll_interval
+        while pending:
+            if deadline is not None:
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(min(interval, deadline - time.monotonic()))
+            else:
+                time.sleep(interval)
+            failed = False
+            for batch in pending:
+                try:
+                    batch.poll()
+                    logger.info(batch)
+                except Exception as e:
+                    # A transient error must not fail a run that may wait for hours, with its batches paid for
+                    logger.warning(f"Could not check the status of {batch}: {e!r}")
+                    failed = True
+            interval = (
+                min(2 * interval, 16 * self.poll_interval)
+                if failed
+                else self.poll_interval
+            )
+            pending = [batch for batch in pending if not batch.done]
+        for batch in pending:
+            logger.warning(
+                f"{batch} not finished after {self.max_wait} seconds, falling back to synchronous processing"
+            )
+            try:
+                batch.cancel()
+            except Exception as e:
+                logger.warning(f"Could not cancel {batch}: {e!r}")
+
+    def _collect_batches(self, batches: List[tuple], prompts: dict, outputs: dict):
+        for l, batch in batches:
+            if not batch.done:
+                continue
+            try:
+                results = batch.results()
+            except Exception as e:
+                logger.warning(
+                    f"Could not download the results of {batch}, falling back to synchronous processing: {e!r}"
+                )
+                continue
+            for custom_id, result in results.items():
+                i, j = map(int, custom_id.split("-"))
+                if isinstance(result, Exception):
+                    logger.warning(f"{result}, falling back to synchronous processing")
+                    continue
+                batch.llm._to_cache(prompts[(i, j)], result)
+                outputs[(i, l, j)] = self._charge_budget(result)
+
+    def run_many(self, raw_texts: Iterable[str]) -> Iterator[PipelineRunOutput]:
+        """
+        Runs the pipeline over many texts through the batch APIs.
+
+        Args:
+            raw_texts (Iterable[str]): The texts to run the pipeline over.
+
+        Yields:
+            PipelineRunOutput: The evaluated output for each text, once every batch has finished.
+        """
+        raw_texts = list(raw_texts)
+        preprocessed_texts = [self._preprocess(raw_text) for raw_text in raw_texts]
+        prompts = {
+            (i, j): Prompt(prompt_template, preprocessed_text)
+            for i, preprocessed_text in enumerate(preprocessed_texts)
+            for j, prompt_template in enumerate(self.prompt_templates)
+        }
+        outputs = {}
+        self._check_budget()
+        batches = self._submit_batches(prompts, outputs)
+        self._wait_for_batches(batches)
+        self._collect_batches(batches, prompts, outputs)
+
+        executor = concurrent.futures.ThreadPoolExecutor()
+        try:
+            # Whatever the batches did not produce is generated synchronously, every text at once
+            futures = {
+                (i, l, j): executor.submit(
+                    self._process_prompt, self.llms[l], prompts[(i, j)]
+                )
+                for i in range(len(raw_texts))
+                for l in range(len(self.llms))
+                for j in range(len(self.prompt_templates))
+                if (i, l, j) not in outputs
+            }
+            for i, raw_text in enumerate(raw_texts):
+                processed_outputs = [
+                    outputs.pop((i, l, j), None) or futures.pop((i, l, j)).result()
+                    for l in range(len(self.llms))
+                    for j in range(len(self.prompt_templates))
+                ]
+                self._evaluate(raw_text, processed_outputs)
+                yield PipelineRunOutput(
+                    raw_text,
+                    self.preprocessor,
+                    preprocessed_texts[i],
+                    processed_outputs,
+                )
+        finally:
+            # Requests in flight are allowed to finish; the queued ones are dropped if the run stops early
+            executor.shutdown(cancel_futures=True)
+
+
+class PackedPipelineRunner(PipelineRunner):
+    """
+    A pipeline runner for datasets of short texts: up to max_texts preprocessed texts are packed into a single
+    request (see summa.packing), whose response is split back into one output per text. Each text is then evaluated
+    and returned exactly as with the other runners.
+
+    When a response can't be split, the texts of its pack are processed one by one.
+
+    Args:
+        packer (PromptPacker): Decides which texts are packed together, and packs and unpacks them.
+        chunk_size (int): The number of texts processed (and yielded) together.
+    """
+
+    def __init__(
+        self,
+        preprocessor: TextPreprocessor,
+        processor: TextProcessor,
+        llms: List[TextGenerationLLM],
+        prompt_templates: List[PromptTemplate],
+        evaluators: List[Evaluator],
+        packer: PromptPacker = None,
+        chunk_size: int = 256,
+        budget: TokenBudget = None,
+        retry_budget: RetryBudget = None,
+    ):
+        super().__init__(
+            preprocessor,
+            processor,
+            llms,
+            prompt_templates,
+            evaluators,
+            budget,
+            retry_budget,
+        )
+        self.packer = packer or PromptPacker()
+        self.chunk_size = chunk_size
+
+    def _process_pack(
+        self,
+        model: TextGenerationLLM,
+        prompt_template: PromptTemplate,
+        texts: List[str],
+    ) -> List[TextGenerationOutput]:
+        if len(texts) > 1:
+            self._check_budget()
+            with use_retry_budget(self.retry_budget), use_budget(self.budget):
+                packed_output = self.processor.process(
+                    model, self.packer.prompt(prompt_template, texts)
+                )
+            outputs = self.packer.unpack(packed_output, prompt_template, texts)
+            if outputs is not None:
+                return [self._charge_budget(output) for output in outputs]
+            # The failed pack still cost tokens
+            self._charge_budget(packed_output)
+        return [
+            self._process_prompt(model, Prompt(prompt_template, text)) for text in texts
+        ]
+
+    def _run_chunk(self, raw_texts: List[str]) -> Iterator[PipelineRunOutput]:
+        preprocessed_texts = [self._preprocess(raw_text) for raw_text in raw_texts]
+        packs = self.packer.pack(preprocessed_texts)
+        outputs = {}
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = {
+                executor.submit(
+                    self._process_pack,
+                    model,
+                    prompt_template,
+                    [preprocessed_texts[i] for i in pack],
+                ): (l, j, pack)
+                for l, model in enumerate(self.llms)
+                for j, prompt_template in enumerate(self.prompt_templates)
+                for pack in packs
+            }
+            for future in concurrent.futures.as_completed(futures):
+                l, j, pack = futures[future]
+                for i, output in zip(pack, future.result()):
+                    outputs[(i, l, j)] = output
+
+        for i, raw_text in enumerate(raw_texts):
+            processed_outputs = [
+                outputs[(i, l, j)]
+                for l in range(len(self.llms))
+                for j in range(len(self.prompt_templates))
+            ]
+            self._evaluate(raw_text, processed_outputs)
+            yield PipelineRunOutput(
+                raw_text, self.preprocessor, preprocessed_texts[i], processed_outputs
+            )
+
+    def run_many(self, raw_texts: Iterable[str]) -> Iterator[PipelineRunOutput]:
+        """
+        Runs the pipeline over many texts, packing them into as few requests as possible.
+
+        Args:
+            raw_texts (Iterable[str]): The texts to run the pipeline over.
+
+        Yields:
+            PipelineRunOutput: The evaluated output for each text, in order, one chunk of texts at a time.
+        """
+        raw_texts = list(raw_texts)
+        for start in range(0, len(raw_texts), self.chunk_size):
+            yield from self._run_chunk(raw_texts[start : start + self.chunk_size])
+
+
+class ScheduledPipelineRunner(PipelineRunner):
+    """
+    A pipeline runner that flattens the work of all texts into units (a text, a model and a prompt template) on a
+    single bounded WorkQueue, served by a fixed pool of worker threads: the global cap on requests in flight. Models take
+    turns, and each may only have so many requests in flight (max_per_model, and never more than its adaptive
+    concurrency limit, see summa.limiters), so that a slow model can't tie up the workers serving the others. Texts are
+    read lazily, so that at most max_queued units wait in the queue.
+
+    Worker threads never sleep to back off either: an attempt that fails, and that the processor's retry policy allows
+    to retry, goes back into the queue, becoming available again once its backoff expires.
+
+    Args:
+        max_workers (int): The number of worker threads, i.e. the maximum number of requests in flight.
+        max_per_model (int, optional): The maximum number of requests in flight to each model. Defaults to None (only
+            bounded by max_workers and the model's concurrency limiter).
+        max_queued (int, optional): The number of queued units above which no more texts are read. Defaults to None
+            (4 units per worker).
+        deferred_retries (bool): Whether failed attempts are retried through the queue. If False, each unit is
+            processed with its retries, as in PipelineRunner. Defaults to True.
+    """
+
+    def __init__(
+        self,
+        preprocessor: TextPreprocessor,
+        processor: TextProcessor,
+        llms: List[TextGenerationLLM],
+        prompt_templates: List[PromptTemplate],
+        evaluators: List[Evaluator],
+        max_workers: int = 64,
+        budget: TokenBudget = None,
+        retry_budget: RetryBudget = None,
+        max_per_model: int = None,
+        max_queued: int = None,
+        deferred_retries: bool = True,
+    ):
+        super().__init__(
+            preprocessor,
+            processor,
+            llms,
+            prompt_templates,
+            evaluators,
+            budget,
+            retry_budget,
+        )
+        self.max_workers = max_workers
+        self.max_per_model = max_per_model
+        self.max_queued = max_queued or 4 * max_workers
+        self.deferred_retries = deferred_retries
+
+    def _model_limit(self, l: int) -> int:
+        limit = self.max_per_model or self.max_workers
+        limiter = getattr(self.llms[l], "concurrency_limiter", None)
+        if limiter is not None:
+            # Units beyond the limiter's limit would only hold a worker while waiting for a slot
+            limit = min(limit, max(limiter.min_limit, int(limiter.limit)))
+        return limit
+
+    def _attempt_prompt(
+        self, model: TextGenerationLLM, prompt: Prompt
+    ) -> TextGenerationOutput:
+        if not self.deferred_retries:
+            return self._process_prompt(model, prompt)
+        self._check_budget()
+        with use_retry_budget(self.retry_budget), use_budget(self.budget):
+            return self._charge_budget(self.processor.attempt(model, prompt))
+
+    def _retry_delay(self, e: Exception, attempt: int) -> float:
+        # None if the failed attempt must not be retried
+        retry_policy = self.processor.retry_policy
+        if retry_policy is None or not self.deferred_retries:
+            return None
+        with use_retry_budget(self.retry_budget):
+            if not retry_policy.should_retry(e, attempt):
+                return None
+        return retry_policy.delay(e, attempt)
+
+    def _work(self, work: WorkQueue, results: queue.Queue) -> None:
+        while True:
+            unit = work.get()
+            if unit is None:
+                return
+            l, (i, _, j, prompt, attempt) = unit
+            model = self.llms[l]
+            if attempt == 1 and self.retry_budget is not None:
+                self.retry_budget.record_request()
+            try:
+                result = self._attempt_prompt(model, prompt)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is not None:
+                    logger.info(
+                        f"Retrying {model} in {delay:.2f} seconds after {e!r} "
+                        f"(attempt {attempt} of {self.processor.retry_policy.max_attempts})"
+                    )
+                    work.done(l)
+                    work.put(l, (i, l, j, prompt, attempt + 1), delay)
+                    continue
+                result = e
+            work.done(l)
+            results.put(((i, l, j), result))
+
+    def _run_units(
+        self, raw_texts: Iterable[str], done: Callable[[str, int, int], bool] = None
+    ) -> Iterator[tuple]:
+        # Yields ((i, l, j), raw_text, preprocessed_text, output, complete) for every unit as soon as it is evaluated,
+        # complete telling whether it was the last unit of text i, every other one having succeeded
+        raw_texts = iter(raw_texts)
+        work, results = WorkQueue(self._model_limit), queue.Queue()
+        texts, remaining, errors, workers = [], [], {}, []
+        pending = 0
+        exceeded = None
+
+        def feed():
+            nonlocal pending
+            while self.llms and self.prompt_templates and len(work) < self.max_queued:
+                raw_text = next(raw_texts, None)
+                if raw_text is None:
+                    break
+                units = [
+                    (l, j)
+                    for j in range(len(self.prompt_templates))
+                    for l in range(len(self.llms))
+                    if done is None or not done(raw_text, l, j)
+                ]
+                if not units:
+                    continue
+                i = len(texts)
+                preprocessed_text = self._preprocess(raw_text)
+                texts.append((raw_text, preprocessed_text))
+                remaining.append(len(units))
+                for l, j in units:
+                    prompt = Prompt(self.prompt_templates[j], preprocessed_text)
+                    work.put(l, (i, l, j, prompt, 1))
+                pending += len(units)
+            while len(workers) < min(self.max_workers, pending):
+                worker = threading.Thread(
+                    target=self._work, args=(work, results), daemon=True
+                )
+                worker.start()
+                workers.append(worker)
+
+        try:
+            feed()
+            while pending:
+                if exceeded is None:
+                    batch = [results.get()]
+                else:
+                    # The requests in flight were already paid for, so their outputs are still yielded; the queued
+                    # units are dropped
+                    work.close()
+                    for worker in workers:
+                        worker.join()
+                    batch = []
+                # The units finished meanwhile are evaluated together, in one batch
+                while True:
+                    try:
+                        batch.append(results.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    break
+                finished = []
+                for (i, l, j), result in batch:
+                    pending -= 1
+                    remaining[i] -= 1
+                    raw_text, preprocessed_text = texts[i]
+                    if remaining[i] == 0:
+                        texts[i] = None
+                    if isinstance(result, BudgetExceededError):
+                        exceeded = exceeded or result
+                        errors.setdefault(i, result)
+                        continue
+                    if isinstance(result, Exception):
+                        logger.error(
+                            f"Failed to process text {i} with {self.llms[l]}: {result!r}"
+                        )
+                        errors.setdefault(i, result)
+                        continue
+                    complete = remaining[i] == 0 and i not in errors
+                    finished.append(
+                        ((i, l, j), raw_text, preprocessed_text, result, complete)
+                    )
+                if exceeded is None:
+                    feed()
+                self._evaluate_outputs(
+                    [(raw_text, result) for _, raw_text, _, result, _ in finished]
+                )
+                yield from finished
+            if exceeded is not None:
+                raise exceeded
+            if errors:
+                logger.error(f"{len(errors)} of {len(texts)} texts failed")
+                raise next(iter(errors.values()))
+        finally:
+            # Requests in flight are allowed to finish; the queued ones are dropped
+            work.close()
+            for worker in workers:
+                worker.join()
+
+    def run_units(
+        self, raw_texts: Iterable[str], done: Callable[[str, int, int], bool] = None
+    ) -> Iterator[PipelineRunOutput]:
+        """
+        Runs the pipeline over many texts, yielding the output of each unit (a text, a model and a prompt template) as
+        soon as it is evaluated, so that it can be saved right away. The units of a failing text that did succeed are
+        yielded too.
+
+        Failed units are logged, and the first error is raised once every other unit has been yielded. An exhausted
+        budget stops the run: the queued units are dropped, and the error is raised once the units in flight have been
+        yielded.
+
+        Args:
+            raw_texts (Iterable[str]): The texts to run the pipeline over.
+            done (Callable[[str, int, int], bool], optional): Returns whether the unit of a raw text, the model at
+                index l and the prompt template at index j is already done (e.g. saved by an interrupted run), in which
+                case it is not dispatched again. Defaults to None (every unit is run).
+
+        Yields:
+            PipelineRunOutput: The evaluated output of each unit, with a single processed output, in completion order.
+        """
+        for _, raw_text, preprocessed_text, output, _ in self._run_units(
+            raw_texts, done
+        ):
+            yield PipelineRunOutput(
+                raw_text, self.preprocessor, preprocessed_text, [output]
+            )
+
+    def run_many(
+        self, raw_texts: Iterable[str], done: Callable[[str, int, int], bool] = None
+    ) -> Iterator[PipelineRunOutput]:
+        """
+        Runs the pipeline over many texts, yielding each text's output as soon as it is complete.
+
+        Texts whose requests fail (once retries are exhausted) are left out and logged, and the first such error is
+        raised once every other text has been yielded. An exhausted budget stops the run, see run_units.
+
+        Args:
+            raw_texts (Iterable[str]): The texts to run the pipeline over.
+            done (Callable[[str, int, int], bool], optional): Returns whether a unit is already done, see run_units.
+                Done units are left out of their text's output. Defaults to None (every unit is run).
+
+        Yields:
+            PipelineRunOutput: The evaluated output for each text, in completion order.
+        """
+        outputs = {}
+        for (i, l, j), raw_text, preprocessed_text, output, complete in self._run_units(
+            raw_texts, done
+        ):
+            outputs.setdefault(i, {})[(l, j)] = output
+            if complete:
+                units = outputs.pop(i)
+                yield PipelineRunOutput(
+                    raw_text,
+                    self.preprocessor,
+                    preprocessed_text,
+                    [units[unit] for unit in sorted(units)],
+                )
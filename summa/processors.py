@@ -1,13 +1,275 @@
+from collections import deque
 from enum import Enum
-from typing import Any
+from typing import Any, Dict, Optional
+from decouple import config
 from .llms import TextGenerationLLM, TextGenerationOutput, Prompt
 from abc import ABC, abstractmethod
-from tenacity import retry, stop_after_attempt, wait_random_exponential, RetryCallState
+import asyncio
+import concurrent.futures
+import threading
+from .budgets import TokenBudget, current_budget
+from .retries import NonRetryableError, RetryPolicy
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 
+class CircuitOpenError(NonRetryableError):
+    """
+    Raised instead of calling a model whose circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker for the calls to one provider (or model).
+
+    While CLOSED, the outcomes of the most recent calls are recorded; once at least min_calls of them are known and
+    their error rate reaches error_rate, the breaker OPENs. An open breaker rejects calls (or parks them, see
+    CircuitBreakers) for open_seconds, then turns HALF_OPEN and lets half_open_calls probe calls through: if they
+    succeed it closes again, otherwise it reopens for twice as long (up to max_open_seconds).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        name: str,
+        error_rate: float = 0.5,
+        min_calls: int = 20,
+        window: int = 100,
+        open_seconds: float = 30.0,
+        max_open_seconds: float = 600.0,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_calls = half_open_calls
+        self._outcomes = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._open_for = open_seconds
+        self._probes = 0
+        self._successes = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            log = logger.warning if state == self.OPEN else logger.info
+            log(f"Circuit breaker {self.name}: {self._state} -> {state}")
+        self._state = state
+
+    def _refresh(self) -> None:
+        if self._state == self.OPEN and time.monotonic() >= self.reopens_at:
+            self._set_state(self.HALF_OPEN)
+            self._probes = self._successes = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    @property
+    def reopens_at(self) -> Optional[float]:
+        """
+        The time.monotonic() at which an open breaker turns half-open.
+        """
+        return None if self._opened_at is None else self._opened_at + self._open_for
+
+    def allow(self) -> bool:
+        """
+        Returns whether a call may go through now. Every allowed call must be followed by record().
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self) -> None:
+        """
+        Gives back an allowed call that was cancelled before its outcome was known.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record(self, success: bool) -> None:
+        """
+        Records the outcome of an allowed call.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                if not success:
+                    self._open(self._open_for * 2)
+                    return
+                self._successes += 1
+                if self._successes >= self.half_open_calls:
+                    self._outcomes.clear()
+                    self._open_for = self.open_seconds
+                    self._set_state(self.CLOSED)
+                return
+            self._outcomes.append(success)
+            if (
+                self._state == self.CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and self._outcomes.count(False) / len(self._outcomes) >= self.error_rate
+            ):
+                self._open(self.open_seconds)
+
+    def _open(self, seconds: float) -> None:
+        self._opened_at = time.monotonic()
+        self._open_for = min(seconds, self.max_open_seconds)
+        self._set_state(self.OPEN)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            errors = self._outcomes.count(False)
+            return {
+                "state": self._state,
+                "calls": len(self._outcomes),
+                "error_rate": errors / len(self._outcomes) if self._outcomes else 0.0,
+                "rejected": self.rejected,
+            }
+
+    def __str__(self) -> str:
+        return f"CircuitBreaker {self.name}: {self.stats}"
+
+
+class CircuitBreakers:
+    """
+    The circuit breakers of every provider (or model), created on first use.
+
+    Args:
+        scope (str): "provider" for one breaker per provider (e.g. all DeepInfra models), or "model" for one per model.
+        park (bool): Whether calls to an open circuit wait for it to turn half-open, instead of failing fast with a
+            CircuitOpenError.
+        **kwargs: The CircuitBreaker settings.
+    """
+
+    def __init__(self, scope: str = "provider", park: bool = False, **kwargs):
+        self.scope = scope
+        self.park = park
+        self.kwargs = kwargs
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: TextGenerationLLM) -> CircuitBreaker:
+        name = (
+            f"{model.provider or model.model}/{model.model_version}"
+            if self.scope == "model"
+            else model.provider or model.model
+        )
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name, **self.kwargs)
+            return self._breakers[name]
+
+    def _wait(self, breaker: CircuitBreaker) -> Optional[float]:
+        # How long a parked call should wait before asking again, or None to fail fast
+        if not self.park:
+            return None
+        reopens_at = breaker.reopens_at
+        return max(0.05, reopens_at - time.monotonic()) if reopens_at else 0.05
+
+    def call(self, model: TextGenerationLLM, fn, *args, **kwargs) -> Any:
+        """
+        Calls fn through the model's circuit breaker.
+
+        Raises:
+            CircuitOpenError: If the circuit is open and calls are not parked.
+        """
+        breaker = self.get(model)
+        while not breaker.allow():
+            wait = self._wait(breaker)
+            if wait is None:
+                raise CircuitOpenError(f"Circuit breaker {breaker.name} is open")
+            time.sleep(wait)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            breaker.record(False)
+            raise
+        breaker.record(True)
+        return result
+
+    async def acall(self, model: TextGenerationLLM, fn, *args, **kwargs) -> Any:
+        """
+        Asynchronous counterpart of call(), for coroutine functions.
+        """
+        breaker = self.get(model)
+        while not breaker.allow():
+            wait = self._wait(breaker)
+            if wait is None:
+                raise CircuitOpenError(f"Circuit breaker {breaker.name} is open")
+            await asyncio.sleep(wait)
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Neither a success nor a failure of the provider (e.g. a hedge that lost)
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record(False)
+            raise
+        breaker.record(True)
+        return result
+
+    @property
+    def stats(self) -> Dict[str, dict]:
+        """
+        Returns the state of every circuit breaker.
+        """
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.stats for breaker in breakers}
+
+
+_default_circuit_breakers = None
+_default_circuit_breakers_lock = threading.Lock()
+
+
+def default_circuit_breakers() -> Optional[CircuitBreakers]:
+    """
+    Returns the process-wide circuit breakers, created on first use from the SUMMA_CIRCUIT_BREAKER_* settings, or
+    None if they are disabled.
+    """
+    global _default_circuit_breakers
+    if not config("SUMMA_CIRCUIT_BREAKER", default=True, cast=bool):
+        return None
+    with _default_circuit_breakers_lock:
+        if _default_circuit_breakers is None:
+            _default_circuit_breakers = CircuitBreakers(
+                scope=config("SUMMA_CIRCUIT_BREAKER_SCOPE", default="provider"),
+                park=config("SUMMA_CIRCUIT_BREAKER_PARK", default=False, cast=bool),
+                error_rate=config(
+                    "SUMMA_CIRCUIT_BREAKER_ERROR_RATE", default=0.5, cast=float
+                ),
+                min_calls=config(
+                    "SUMMA_CIRCUIT_BREAKER_MIN_CALLS", default=20, cast=int
+                ),
+                window=config("SUMMA_CIRCUIT_BREAKER_WINDOW", default=100, cast=int),
+                open_seconds=config(
+                    "SUMMA_CIRCUIT_BREAKER_OPEN_SECONDS", default=30.0, cast=float
+                ),
+            )
+        return _default_circuit_breakers
+
+
 class TextProcessor(ABC):
     """
     Abstract base class for text processors.
@@ -19,11 +281,57 @@ class TextProcessor(ABC):
     def __init__(self, name: str, description: str):
         self.name = name
         self.description = description
+        # None means the process-wide circuit breakers (see default_circuit_breakers)
+        self.circuit_breakers: CircuitBreakers = None
+        # How failed attempts are retried; None means they are not
+        self.retry_policy: RetryPolicy = None
+
+    def _get_circuit_breakers(self) -> Optional[CircuitBreakers]:
+        if self.circuit_breakers is not None:
+            return self.circuit_breakers
+        return default_circuit_breakers()
+
+    def generate(
+        self, model: TextGenerationLLM, prompt: Prompt, **kwargs
+    ) -> TextGenerationOutput:
+        """
+        Calls the model, guarding its calls to the provider with the circuit breakers, so that calls to a provider
+        having an outage fail fast. Responses served from the cache bypass them.
+        """
+        return model.generate(
+            prompt, circuit_breakers=self._get_circuit_breakers(), **kwargs
+        )
+
+    async def agenerate(
+        self, model: TextGenerationLLM, prompt: Prompt, **kwargs
+    ) -> TextGenerationOutput:
+        """
+        Asynchronous counterpart of generate().
+        """
+        return await model.agenerate(
+            prompt, circuit_breakers=self._get_circuit_breakers(), **kwargs
+        )
 
     @abstractmethod
     def process(self, model: TextGenerationLLM, prompt: Prompt) -> TextGenerationOutput:
         pass
 
+    def attempt(self, model: TextGenerationLLM, prompt: Prompt) -> TextGenerationOutput:
+        """
+        Makes a single attempt at what process() does, without retrying, for callers that schedule the retries
+        themselves according to retry_policy (see summa.pipelines.ScheduledPipelineRunner).
+        """
+        return self.process(model, prompt)
+
+    async def aprocess(
+        self, model: TextGenerationLLM, prompt: Prompt
+    ) -> TextGenerationOutput:
+        """
+        Asynchronous counterpart of process(). Defaults to running process() in a worker thread, so processors that
+        do not override it still work with the asynchronous pipeline.
+        """
+        return await asyncio.to_thread(self.process, model, prompt)
+
     def __str__(self) -> str:
         return self.__class__.__name__
 
@@ -41,37 +349,284 @@ class BasicTextProcessor(TextProcessor):
         )
 
     def process(self, model, prompt):
-        return model.generate(prompt)
+        return self.generate(model, prompt)
+
+    async def aprocess(self, model, prompt):
+        return await self.agenerate(model, prompt)
 
 
 class ExponentialBackoffTextProcessor(TextProcessor):
     """
-    A processor class for text generation using exponential backoff.
+    A processor class for text generation using exponential backoff. Errors are retried according to their kind
+    (see summa.retries.RetryPolicy): non-retryable ones are raised at once, and rate limits honour Retry-After.
     """
 
-    def __init__(self):
+    def __init__(self, retry_policy: Optional[RetryPolicy] = None):
         super().__init__(
             "Exponential Backoff Text Processor",
             "A processor class for text generation using exponential backoff.",
         )
+        self.retry_policy = retry_policy or RetryPolicy()
 
-    def log_retry(retry_state: RetryCallState):
-        if retry_state.next_action is not None:
-            sleep_time = retry_state.next_action.sleep
-        else:
-            sleep_time = "N/A"
-        logger.info(
-            f"Retrying {retry_state.fn.__name__} in {sleep_time:.2f} seconds... "
-            f"(attempt {retry_state.attempt_number} of {retry_state.retry_object.stop.max_attempt_number})"
+    def process(self, model, prompt):
+        return self.retry_policy.call(self.generate, model, prompt)
+
+    def attempt(self, model, prompt):
+        return self.generate(model, prompt)
+
+    async def aprocess(self, model, prompt):
+        return await self.retry_policy.acall(self.agenerate, model, prompt)
+
+
+class LatencyTracker:
+    """
+    Keeps a sliding window of the most recent generation times of each model, to estimate its latency percentiles.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, output: TextGenerationOutput) -> None:
+        # Cached outputs carry the generation time of the original call, not a new observation
+        if output.cached or output.generation_time is None:
+            return
+        with self._lock:
+            self._latencies.setdefault(
+                output.model_version, deque(maxlen=self.window)
+            ).append(output.generation_time)
+
+    def percentile(
+        self, model_version: str, percentile: float, min_samples: int = 1
+    ) -> Optional[float]:
+        """
+        Returns the given latency percentile of a model, or None if fewer than min_samples calls were observed.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(model_version, ()))
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return latencies[
+            min(len(latencies) - 1, int(percentile / 100 * len(latencies)))
+        ]
+
+
+class HedgedTextProcessor(TextProcessor):
+    """
+    A processor class that cuts tail latency with hedged requests: when a request is slower than its model's p95
+    latency, a duplicate request is sent (to the same model, or to an equivalent backup model) and whichever answers
+    first wins. Failed requests are retried with exponential backoff.
+
+    Hedging only starts once enough calls to a model were observed to estimate its latency. The losing request is
+    cancelled in the asynchronous pipeline. In the synchronous one, the primary request runs in the calling thread, so
+    its result is waited for even when the hedge answers first, and a losing hedge is left to finish (filling the
+    response cache); hedges there mostly stand in for primary requests that fail. Losing requests that answered are
+    charged to the current budget (see summa.budgets.use_budget).
+
+    Args:
+        backups (Dict[str, TextGenerationLLM], optional): The backup model of each model version. Defaults to the
+            SUMMA_HEDGE_BACKUPS setting, a comma-separated list of PRIMARY:BACKUP TextGenerationLLMs names;
+            models without a backup are hedged with themselves.
+        percentile (float, optional): The latency percentile after which a request is hedged. Defaults to 95.
+        min_samples (int, optional): The number of observed calls needed before hedging a model. Defaults to 20.
+        min_delay (float, optional): The minimum number of seconds to wait before hedging. Defaults to 0.
+        retry_policy (RetryPolicy, optional): The policy for retrying failed requests. Defaults to RetryPolicy().
+    """
+
+    def __init__(
+        self,
+        backups: Optional[Dict[str, TextGenerationLLM]] = None,
+        percentile: Optional[float] = None,
+        min_samples: Optional[int] = None,
+        min_delay: Optional[float] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        super().__init__(
+            "Hedged Text Processor",
+            "A processor class for text generation using hedged requests and exponential backoff.",
+        )
+        self._backups = backups
+        if percentile is None:
+            percentile = config("SUMMA_HEDGE_PERCENTILE", default=95.0, cast=float)
+        if min_samples is None:
+            min_samples = config("SUMMA_HEDGE_MIN_SAMPLES", default=20, cast=int)
+        if min_delay is None:
+            min_delay = config("SUMMA_HEDGE_MIN_DELAY", default=0.0, cast=float)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.latencies = LatencyTracker()
+        self.hedged = 0
+        self.hedges_won = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def backups(self) -> Dict[str, TextGenerationLLM]:
+        if self._backups is None:
+            from .llms import TextGenerationLLMs
+
+            self._backups = {}
+            setting = config("SUMMA_HEDGE_BACKUPS", default="")
+            for pair in filter(None, setting.split(",")):
+                primary, backup = pair.strip().split(":")
+                self._backups[TextGenerationLLMs[primary].model_version] = (
+                    TextGenerationLLMs[backup].value
+                )
+        return self._backups
+
+    @property
+    def executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=config(
+                        "SUMMA_HEDGE_MAX_WORKERS", default=256, cast=int
+                    ),
+                    thread_name_prefix="summa-hedge",
+                )
+            return self._executor
+
+    def hedge_delay(self, model: TextGenerationLLM) -> Optional[float]:
+        """
+        Returns the number of seconds after which a request to the model is hedged, or None if it is not hedged yet.
+        """
+        delay = self.latencies.percentile(
+            model.model_version, self.percentile, self.min_samples
         )
+        return None if delay is None else max(delay, self.min_delay)
+
+    def _hedge(self, model: TextGenerationLLM) -> TextGenerationLLM:
+        with self._lock:
+            self.hedged += 1
+        backup = self.backups.get(model.model_version, model)
+        logger.debug(f"Hedging a slow request to {model} with {backup}")
+        return backup
+
+    def _won(
+        self, model: TextGenerationLLM, output: TextGenerationOutput, is_hedge: bool
+    ) -> TextGenerationOutput:
+        if is_hedge:
+            with self._lock:
+                self.hedges_won += 1
+            # Still the output of the model it was requested from, whichever model answered
+            output.requested_model_version = model.model_version
+        return output
+
+    def _observed(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.latencies.observe(future.result())
+
+    @staticmethod
+    def _lost(budget: Optional[TokenBudget], future) -> None:
+        # Only the winner's output is charged by the pipeline, while the losing request was paid for all the same
+        if budget is not None and not future.cancelled() and future.exception() is None:
+            budget.charge(future.result())
+
+    def _hedged_generate(self, model, prompt):
+        delay = self.hedge_delay(model)
+        if delay is None:
+            output = self.generate(model, prompt)
+            self.latencies.observe(output)
+            return output
+        budget = current_budget()
+        # The primary request runs in the calling thread, so that it can't be held up behind other requests in the
+        # executor (and hedged because of it); only the hedge is submitted there, once the delay has passed
+        hedges = []
+        timer = threading.Timer(
+            delay,
+            lambda: hedges.append(
+                self.executor.submit(
+                    self.generate, self._hedge(model), prompt, coalesce=False
+                )
+            ),
+        )
+        timer.daemon = True
+        timer.start()
+        try:
+            output = self.generate(model, prompt)
+        except Exception as e:
+            output, error = None, e
+        else:
+            error = None
+            self.latencies.observe(output)
+        finally:
+            timer.cancel()
+            # Waits for the hedge to be submitted, if the delay passed meanwhile
+            timer.join()
+        if not hedges:
+            if error is not None:
+                raise error
+            return output
+        (hedge,) = hedges
+        hedge.add_done_callback(self._observed)
+        if error is None and not (hedge.done() and hedge.exception() is None):
+            hedge.add_done_callback(lambda future: self._lost(budget, future))
+            return output
+        try:
+            hedge_output = hedge.result()
+        except Exception:
+            raise error
+        if output is not None and budget is not None:
+            # The primary request lost, but was paid for all the same
+            budget.charge(output)
+        return self._won(model, hedge_output, True)
+
+    async def _ahedged_generate(self, model, prompt):
+        delay = self.hedge_delay(model)
+        if delay is None:
+            output = await self.agenerate(model, prompt)
+            self.latencies.observe(output)
+            return output
+        budget = current_budget()
+        primary = asyncio.ensure_future(self.agenerate(model, prompt))
+        primary.add_done_callback(self._observed)
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            hedge = asyncio.ensure_future(
+                self.agenerate(self._hedge(model), prompt, coalesce=False)
+            )
+            hedge.add_done_callback(self._observed)
+            pending.add(hedge)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        # The other request may have answered at the same time
+                        for lost in done - {task}:
+                            self._lost(budget, lost)
+                        return self._won(model, task.result(), task is hedge)
+                    error = task.exception()
+            raise error
+        finally:
+            # The slower request is no longer needed
+            for task in pending:
+                task.cancel()
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(25),
-        before_sleep=log_retry,
-    )
     def process(self, model, prompt):
-        return model.generate(prompt)
+        return self.retry_policy.call(self._hedged_generate, model, prompt)
+
+    def attempt(self, model, prompt):
+        return self._hedged_generate(model, prompt)
+
+    async def aprocess(self, model, prompt):
+        return await self.retry_policy.acall(self._ahedged_generate, model, prompt)
+
+    @property
+    def stats(self) -> dict:
+        """
+        Returns the number of hedged requests, and how many of them answered first.
+        """
+        with self._lock:
+            return {"hedged": self.hedged, "hedges_won": self.hedges_won}
 
 
 class TextProcessors(Enum):
@@ -81,3 +636,4 @@ class TextProcessors(Enum):
 
     BASIC = BasicTextProcessor()
     EXPONENTIAL_BACKOFF = ExponentialBackoffTextProcessor()
+    HEDGED = HedgedTextProcessor()
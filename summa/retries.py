@@ -0,0 +1,308 @@
+import contextlib
+import contextvars
+import email.utils
+import logging
+import random
+import re
+import threading
+import time
+from typing import Optional
+from decouple import config
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    Retrying,
+    stop_after_attempt,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class NonRetryableError(Exception):
+    """
+    Base class for errors raised by summa itself that must never be retried.
+    """
+
+
+class ErrorKinds:
+    """
+    The kinds of errors a generation can fail with, as far as retrying is concerned.
+    """
+
+    # The provider is throttling us: retry, after the delay it asks for if any
+    RATE_LIMIT = "rate_limit"
+    # Timeouts, dropped connections and server errors: retry with exponential backoff
+    TRANSIENT = "transient"
+    # Bad credentials, unknown models, invalid or blocked prompts: retrying would fail the same way
+    FATAL = "fatal"
+
+
+# Google safety blocks, raised by google.generativeai.types.generation_types
+GOOGLE_BLOCKED_EXCEPTIONS = {"BlockedPromptException", "StopCandidateException"}
+
+# Deterministic errors (e.g. response.text of a Google response blocked for safety raises a ValueError)
+FATAL_EXCEPTION_TYPES = (ValueError, TypeError, KeyError, NotImplementedError)
+
+
+def _status_code(e: Exception) -> Optional[int]:
+    # openai.APIStatusError has status_code, google.api_core exceptions have an HTTP code
+    for attribute in ("status_code", "code"):
+        value = getattr(e, attribute, None)
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    return None
+
+
+def classify_error(e: Exception) -> str:
+    """
+    Classifies an error raised while generating text, without importing the provider SDKs.
+
+    Args:
+        e (Exception): The error.
+
+    Returns:
+        str: One of the ErrorKinds. Errors that can't be classified are TRANSIENT, so that they are retried.
+    """
+    if (
+        isinstance(e, NonRetryableError)
+        or type(e).__name__ in GOOGLE_BLOCKED_EXCEPTIONS
+    ):
+        return ErrorKinds.FATAL
+    status_code = _status_code(e)
+    if status_code == 429:
+        return ErrorKinds.RATE_LIMIT
+    if status_code is not None:
+        if status_code in (408, 409, 425) or status_code >= 500:
+            return ErrorKinds.TRANSIENT
+        return ErrorKinds.FATAL
+    if isinstance(e, FATAL_EXCEPTION_TYPES):
+        return ErrorKinds.FATAL
+    return ErrorKinds.TRANSIENT
+
+
+# OpenAI's x-ratelimit-reset-* durations, e.g. "20ms", "1s", "6m0s", "1h2m3.5s"
+DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _parse_seconds(value: str) -> Optional[float]:
+    value = value.strip()
+    try:
+        seconds = float(value)
+        # x-ratelimit-reset is sometimes a Unix timestamp rather than a delay
+        return seconds - time.time() if seconds > 1e9 else seconds
+    except ValueError:
+        pass
+    matches = DURATION.findall(value)
+    if matches and "".join(n + u for n, u in matches) == value:
+        return sum(float(n) * DURATION_UNITS[u] for n, u in matches)
+    try:
+        # Retry-After may be an HTTP date
+        return email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(e: Exception) -> Optional[float]:
+    """
+    Returns the number of seconds the provider asked to wait before retrying, from the Retry-After, retry-after-ms
+    and x-ratelimit-reset* headers of an HTTP error, or the RetryInfo details of a Google API error.
+
+    Args:
+        e (Exception): The error.
+
+    Returns:
+        Optional[float]: The delay, or None if the error carries no hint.
+    """
+    for detail in getattr(e, "details", None) or ():
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    delays = []
+    if headers.get("retry-after-ms"):
+        delay = _parse_seconds(headers["retry-after-ms"])
+        delays.append(None if delay is None else delay / 1000)
+    elif headers.get("retry-after"):
+        delays.append(_parse_seconds(headers["retry-after"]))
+    else:
+        for quota in ("requests", "tokens"):
+            reset = headers.get(f"x-ratelimit-reset-{quota}")
+            # Only the quotas that are actually exhausted matter, when the headers say which
+            if reset and headers.get(f"x-ratelimit-remaining-{quota}") in (None, "0"):
+                delays.append(_parse_seconds(reset))
+        if headers.get("x-ratelimit-reset"):
+            delays.append(_parse_seconds(headers["x-ratelimit-reset"]))
+    delays = [delay for delay in delays if delay is not None]
+    return max(0.0, max(delays)) if delays else None
+
+
+class RetryBudget:
+    """
+    A retry budget shared by every request of a run: each request earns `ratio` retries, on top of `min_retries`
+    retries to start with. Once the budget is spent, failures are no longer retried, so that an outage or an exhausted
+    quota can't turn into a retry storm.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 100):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.requests = 0
+        self.retries = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def spend(self) -> bool:
+        """
+        Takes a retry from the budget.
+
+        Returns:
+            bool: Whether a retry was left.
+        """
+        with self._lock:
+            if self.retries >= self.min_retries + self.ratio * self.requests:
+                self.denied += 1
+                return False
+            self.retries += 1
+            return True
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "denied": self.denied,
+        }
+
+    def __str__(self) -> str:
+        return f"RetryBudget: {self.stats}"
+
+
+_current_retry_budget = contextvars.ContextVar("retry_budget", default=None)
+
+
+@contextlib.contextmanager
+def use_retry_budget(budget: Optional[RetryBudget]):
+    """
+    Makes the retry policies draw from the given budget within the block (in the current thread or task).
+    """
+    token = _current_retry_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_retry_budget.reset(token)
+
+
+def current_retry_budget() -> Optional[RetryBudget]:
+    return _current_retry_budget.get()
+
+
+class RetryPolicy:
+    """
+    Retries failed generations according to the kind of error: fatal errors are raised at once, rate limits wait for
+    as long as the provider asks (Retry-After and similar headers) and other errors back off exponentially, with
+    jitter. Retries are drawn from the current RetryBudget, if any (see use_retry_budget).
+
+    Args:
+        max_attempts (int, optional): The maximum number of attempts per call. Defaults to 25.
+        min_wait (float, optional): The minimum backoff, in seconds. Defaults to 1.
+        max_wait (float, optional): The maximum backoff, in seconds. Defaults to 60.
+        max_retry_after (float, optional): The longest delay honoured from a provider hint. Defaults to 300.
+    """
+
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        min_wait: Optional[float] = None,
+        max_wait: Optional[float] = None,
+        max_retry_after: Optional[float] = None,
+    ):
+        self.max_attempts = max_attempts or config(
+            "SUMMA_RETRY_MAX_ATTEMPTS", default=25, cast=int
+        )
+        self.min_wait = min_wait or config(
+            "SUMMA_RETRY_MIN_WAIT", default=1.0, cast=float
+        )
+        self.max_wait = max_wait or config(
+            "SUMMA_RETRY_MAX_WAIT", default=60.0, cast=float
+        )
+        self.max_retry_after = max_retry_after or config(
+            "SUMMA_RETRY_MAX_RETRY_AFTER", default=300.0, cast=float
+        )
+
+    def should_retry(self, e: Exception, attempt: int) -> bool:
+        """
+        Returns whether a call that failed with the given error on the given attempt (starting at 1) is retried,
+        taking a retry from the current budget if so.
+        """
+        if attempt >= self.max_attempts or classify_error(e) == ErrorKinds.FATAL:
+            return False
+        budget = current_retry_budget()
+        if budget is not None and not budget.spend():
+            logger.warning(f"Retry budget exhausted, not retrying {e!r} ({budget})")
+            return False
+        return True
+
+    def delay(self, e: Exception, attempt: int) -> float:
+        """
+        Returns the number of seconds to wait before retrying a call that failed with the given error on the given
+        attempt (starting at 1).
+        """
+        hint = retry_after(e)
+        if hint is not None:
+            # A little jitter keeps the callers told to come back at the same time from doing so all at once
+            return min(hint, self.max_retry_after) * random.uniform(1.0, 1.1)
+        return max(
+            self.min_wait,
+            random.uniform(0, min(self.max_wait, self.min_wait * 2**attempt)),
+        )
+
+    def _retry(self, retry_state: RetryCallState) -> bool:
+        e = retry_state.outcome.exception()
+        return e is not None and self.should_retry(e, retry_state.attempt_number)
+
+    def _wait(self, retry_state: RetryCallState) -> float:
+        return self.delay(retry_state.outcome.exception(), retry_state.attempt_number)
+
+    @staticmethod
+    def _log_retry(retry_state: RetryCallState) -> None:
+        e = retry_state.outcome.exception()
+        logger.info(
+            f"Retrying {retry_state.fn.__name__} in {retry_state.next_action.sleep:.2f} seconds after a "
+            f"{classify_error(e)} error: {e!r} "
+            f"(attempt {retry_state.attempt_number} of {retry_state.retry_object.stop.max_attempt_number})"
+        )
+
+    def _retrying_kwargs(self) -> dict:
+        return {
+            "retry": self._retry,
+            "wait": self._wait,
+            "stop": stop_after_attempt(self.max_attempts),
+            "before_sleep": self._log_retry,
+            # The last error is raised as is, rather than wrapped in a tenacity.RetryError
+            "reraise": True,
+        }
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Calls fn, retrying it according to the policy.
+        """
+        budget = current_retry_budget()
+        if budget is not None:
+            budget.record_request()
+        return Retrying(**self._retrying_kwargs())(fn, *args, **kwargs)
+
+    async def acall(self, fn, *args, **kwargs):
+        """
+        Asynchronous counterpart of call(), for coroutine functions; backing off does not block the event loop.
+        """
+        budget = current_retry_budget()
+        if budget is not None:
+            budget.record_request()
+        return await AsyncRetrying(**self._retrying_kwargs())(fn, *args, **kwargs)
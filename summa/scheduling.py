@@ -0,0 +1,113 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class WorkQueue:
+    """
+    A thread-safe queue of units of work, each bound to a key (e.g. the model serving it), from which a pool of workers
+    takes the next unit to run. Keys take turns (round-robin), so that a long backlog for one key doesn't hold up the
+    others, and at most limit(key) units of a key are in flight at once, so that a slow key can't tie up every worker.
+    A unit may also only become available after a delay, e.g. a request waiting to be retried.
+
+    Workers call done(key) once they have finished a unit taken with get().
+    """
+
+    def __init__(self, limit: Optional[Callable[[Hashable], int]] = None):
+        """
+        Initializes the queue.
+
+        Args:
+            limit (Callable[[Hashable], int], optional): Returns the maximum number of units of a key in flight. It is
+                called on every get(), so it may change over time. Defaults to None (no limit).
+        """
+        self.limit = limit
+        self._heaps = {}
+        self._in_flight = Counter()
+        self._counter = itertools.count()
+        self._turn = itertools.count()
+        # The turn a key was last served at; the key served longest ago goes first
+        self._served_at = {}
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def put(self, key: Hashable, item: Any, delay: float = 0.0) -> None:
+        """
+        Adds a unit of work for the given key, available after the given number of seconds.
+        """
+        with self._condition:
+            if key not in self._heaps:
+                self._heaps[key] = []
+                self._served_at.setdefault(key, -1)
+            heapq.heappush(
+                self._heaps[key], (time.monotonic() + delay, next(self._counter), item)
+            )
+            self._condition.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[Hashable, Any]]:
+        """
+        Removes and returns the next unit of work, waiting for one to be available (and within its key's limit).
+
+        Args:
+            timeout (float, optional): The maximum number of seconds to wait. Defaults to None (no limit).
+
+        Returns:
+            Tuple[Hashable, Any]: The key and the unit, or None if the queue was closed or the timeout expired.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._closed:
+                now = time.monotonic()
+                waits = []
+                for key in sorted(self._heaps, key=self._served_at.__getitem__):
+                    heap = self._heaps[key]
+                    if self.limit is not None and self._in_flight[key] >= self.limit(
+                        key
+                    ):
+                        # Woken up by done()
+                        continue
+                    if heap[0][0] <= now:
+                        item = heapq.heappop(heap)[2]
+                        if not heap:
+                            del self._heaps[key]
+                        self._in_flight[key] += 1
+                        self._served_at[key] = next(self._turn)
+                        return key, item
+                    waits.append(heap[0][0] - now)
+                if deadline is not None:
+                    if now >= deadline:
+                        return None
+                    waits.append(deadline - now)
+                self._condition.wait(min(waits) if waits else None)
+            return None
+
+    def done(self, key: Hashable) -> None:
+        """
+        Marks a unit of the given key taken with get() as finished, making room for the next one.
+        """
+        with self._condition:
+            self._in_flight[key] -= 1
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """
+        Wakes up every worker, making get() return None from now on.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def in_flight(self) -> int:
+        """
+        The number of units taken with get() and not done yet.
+        """
+        with self._condition:
+            return sum(self._in_flight.values())
+
+    def __len__(self) -> int:
+        with self._condition:
+            return sum(len(heap) for heap in self._heaps.values())
@@ -0,0 +1,147 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _LeaderCancelled(Exception):
+    """
+    Set on a call's future when its leader was cancelled, telling the waiting followers to retry the call themselves.
+    """
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the leader) makes the call, and every caller that
+    arrives while it is in flight (a follower) waits for and shares its result, or its exception.
+
+    Calls are tracked with concurrent.futures.Future objects, so threads and coroutines (from any event loop) can
+    coalesce with each other.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, concurrent.futures.Future] = {}
+        # The number of calls made, and the number of calls saved by sharing an in-flight call's result
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key: str) -> Tuple[concurrent.futures.Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = concurrent.futures.Future()
+            # A running future can't be cancelled by a follower giving up on it
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            self.calls += 1
+            return future, True
+
+    def _leave(self, key: str) -> None:
+        with self._lock:
+            del self._calls[key]
+
+    def _shared(self) -> None:
+        with self._lock:
+            self.coalesced += 1
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Calls fn, unless a call with the same key is already in flight, in which case its result is shared.
+
+        Args:
+            key (str): The key identifying identical calls.
+            fn (Callable[[], Any]): The call to make.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it was shared from another caller's call.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                result = future.result()
+            except _LeaderCancelled:
+                return self.do(key, fn)
+            self._shared()
+            return result, True
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._leave(key)
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Asynchronous counterpart of do().
+
+        Args:
+            key (str): The key identifying identical calls.
+            fn (Callable[[], Awaitable[Any]]): The coroutine function making the call.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it was shared from another caller's call.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                # Shielded, so that a follower being cancelled doesn't cancel the leader's call
+                result = await asyncio.shield(asyncio.wrap_future(future))
+            except _LeaderCancelled:
+                return await self.ado(key, fn)
+            self._shared()
+            return result, True
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._leave(key)
+
+    @property
+    def stats(self) -> dict:
+        """
+        Returns the call counters.
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
+
+    def __str__(self) -> str:
+        return f"SingleFlight: {self.stats}"
+
+
+_default_single_flight = None
+_default_single_flight_lock = threading.Lock()
+
+
+def default_single_flight() -> SingleFlight:
+    """
+    Returns the process-wide single-flight group shared by all LLMs.
+
+    Returns:
+        SingleFlight: The shared single-flight group.
+    """
+    global _default_single_flight
+    with _default_single_flight_lock:
+        if _default_single_flight is None:
+            _default_single_flight = SingleFlight()
+        return _default_single_flight
@@ -0,0 +1,543 @@
+"""
+A local stand-in for OpenAI-compatible chat completion APIs, for load and chaos testing the pipeline without paying
+for real calls. It serves POST /v1/chat/completions (streamed or not) and GET /v1/models, with configurable latency,
+injected 429/5xx errors with Retry-After headers, provider-like request/token rate limits and record/replay of
+captured responses.
+
+Any OpenAI-compatible TextGenerationLLMs entry can be pointed at it through its SUMMA_<PROVIDER>_BASE_URL setting,
+e.g. SUMMA_OPENAI_BASE_URL=http://127.0.0.1:8080/v1.
+
+Usage: python -m summa.standin [--port 8080] [--latency lognormal:0.8:0.4] [--error-rate-429 0.05] ...
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+from .limiters import TokenBucket, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyDistribution:
+    """
+    A distribution of response latencies, in seconds.
+
+    Supported kinds are "fixed" (always the mean), "uniform" (mean ± stddev), "normal", "lognormal" (with the given
+    mean and standard deviation, i.e. a long right tail like real APIs) and "exponential" (with the given mean).
+    """
+
+    KINDS = ["fixed", "uniform", "normal", "lognormal", "exponential"]
+
+    def __init__(
+        self,
+        kind: str = "fixed",
+        mean: float = 0.0,
+        stddev: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        if kind not in self.KINDS:
+            raise ValueError(
+                f"Unknown latency distribution '{kind}', expected one of {self.KINDS}"
+            )
+        self.kind = kind
+        self.mean = mean
+        self.stddev = stddev
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: Optional[int] = None) -> "LatencyDistribution":
+        """
+        Parses a "kind[:mean[:stddev]]" specification, e.g. "lognormal:0.8:0.4".
+        """
+        kind, *params = spec.split(":")
+        return cls(kind, *map(float, params), seed=seed)
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "fixed" or self.mean <= 0:
+                latency = self.mean
+            elif self.kind == "uniform":
+                latency = self._random.uniform(
+                    self.mean - self.stddev, self.mean + self.stddev
+                )
+            elif self.kind == "normal":
+                latency = self._random.gauss(self.mean, self.stddev)
+            elif self.kind == "lognormal":
+                # The parameters of the underlying normal distribution, from the mean and stddev of the lognormal one
+                sigma = math.sqrt(math.log(1 + (self.stddev / self.mean) ** 2))
+                mu = math.log(self.mean) - sigma**2 / 2
+                latency = self._random.lognormvariate(mu, sigma)
+            else:
+                latency = self._random.expovariate(1 / self.mean)
+        return max(0.0, latency)
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{self.mean}:{self.stddev}"
+
+
+class ResponseRecording:
+    """
+    A JSONL file of captured chat completion responses, keyed on a hash of the model and messages of their request.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._responses = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._responses[record["key"]] = record["response"]
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def key(body: dict) -> str:
+        request = {"model": body.get("model"), "messages": body.get("messages")}
+        return hashlib.sha256(
+            json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, body: dict) -> Optional[dict]:
+        with self._lock:
+            return self._responses.get(self.key(body))
+
+    def add(self, body: dict, response: dict) -> None:
+        key = self.key(body)
+        with self._lock:
+            self._responses[key] = response
+            with open(self.path, "a", encoding="utf-8") as file:
+                record = {"key": key, "response": response}
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+
+def echo(body: dict) -> str:
+    """
+    The default responder: answers with the content of the last message.
+    """
+    return body["messages"][-1]["content"]
+
+
+class StandInConfig:
+    """
+    The behaviour of a stand-in server.
+
+    Args:
+        latency (LatencyDistribution, optional): The time to first token. Defaults to no latency.
+        tokens_per_second (float, optional): The decode speed; completions take an extra completion_tokens /
+            tokens_per_second seconds, spread across the chunks when streaming. Defaults to None (instant).
+        error_rate_429 (float, optional): The fraction of requests rejected with a 429. Defaults to 0.
+        error_rate_5xx (float, optional): The fraction of requests failed with a 500, 502 or 503. Defaults to 0.
+        retry_after (float, optional): The Retry-After header (in seconds) sent with injected errors. Defaults to
+            None (no header). Rate limit rejections always carry the time until the limit allows the request.
+        requests_per_minute (int, optional): The request rate limit. Defaults to None (unlimited).
+        tokens_per_minute (int, optional): The prompt + completion token rate limit. Defaults to None (unlimited).
+        responder (Callable[[dict], str], optional): Produces the completion for a request body. Defaults to echo.
+        record_path (str, optional): The JSONL file responses are recorded to or replayed from. Defaults to None.
+        mode (str, optional): "replay" serves recorded responses (falling back to the responder for unknown
+            requests), "record" forwards requests to upstream_base_url and records the responses. Defaults to "replay".
+        upstream_base_url (str, optional): The real API recorded responses are captured from.
+        upstream_api_key (str, optional): The API key for the upstream API.
+        seed (int, optional): Seeds error injection and latency sampling, for reproducible runs.
+    """
+
+    MODES = ["replay", "record"]
+
+    def __init__(
+        self,
+        latency: Optional[LatencyDistribution] = None,
+        tokens_per_second: Optional[float] = None,
+        error_rate_429: float = 0.0,
+        error_rate_5xx: float = 0.0,
+        retry_after: Optional[float] = None,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        responder: Callable[[dict], str] = echo,
+        record_path: Optional[str] = None,
+        mode: str = "replay",
+        upstream_base_url: Optional[str] = None,
+        upstream_api_key: Optional[str] = None,
+        seed: Optional[int] = None,
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {self.MODES}")
+        if mode == "record" and not (record_path and upstream_base_url):
+            raise ValueError(
+                "Recording requires a record_path and an upstream_base_url"
+            )
+        self.latency = latency or LatencyDistribution(seed=seed)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self.retry_after = retry_after
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.responder = responder
+        self.record_path = record_path
+        self.mode = mode
+        self.upstream_base_url = upstream_base_url
+        self.upstream_api_key = upstream_api_key
+        self.seed = seed
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    server: "StandInServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, body: dict, headers: Optional[dict] = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str, retry_after=None):
+        error_type = "rate_limit_exceeded" if status == 429 else "server_error"
+        headers = {}
+        if retry_after is not None:
+            headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        self.server.count(status)
+        self._send_json(
+            status,
+            {"error": {"message": message, "type": error_type, "code": error_type}},
+            headers,
+        )
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": []})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        server = self.server
+        config = server.config
+        prompt_tokens = sum(
+            estimate_tokens(message.get("content") or "")
+            for message in body.get("messages", [])
+        )
+
+        # Rejections happen before any latency, like a real API gateway
+        rejection = server.check_rate_limits(prompt_tokens)
+        if rejection is not None:
+            self._send_error(429, "Rate limit reached", retry_after=rejection)
+            return
+        roll = server.roll()
+        if roll < config.error_rate_429:
+            self._send_error(429, "Injected rate limit error", config.retry_after)
+            return
+        if roll < config.error_rate_429 + config.error_rate_5xx:
+            status = server.choice([500, 502, 503])
+            self._send_error(status, "Injected server error", config.retry_after)
+            return
+
+        try:
+            completion = server.completion(body)
+        except Exception as e:
+            logger.error(f"Stand-in could not produce a completion: {e}")
+            self._send_error(502, f"Upstream error: {e}")
+            return
+        content = completion["choices"][0]["message"]["content"]
+        completion_tokens = completion.get("usage", {}).get(
+            "completion_tokens"
+        ) or estimate_tokens(content)
+        completion["usage"] = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        decode_time = (
+            completion_tokens / config.tokens_per_second
+            if config.tokens_per_second
+            else 0.0
+        )
+
+        server.charge_completion_tokens(completion_tokens)
+        time.sleep(config.latency.sample())
+        server.count(200)
+        if body.get("stream"):
+            self._stream(completion, decode_time)
+        else:
+            time.sleep(decode_time)
+            self._send_json(200, completion)
+
+    def _stream(self, completion: dict, decode_time: float):
+        content = completion["choices"][0]["message"]["content"]
+        # Roughly one chunk per token, like real APIs
+        pieces = [content[i : i + 4] for i in range(0, len(content), 4)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(data: str):
+            event = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.flush()
+
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(decode_time / len(pieces))
+            chunk = {
+                "id": completion["id"],
+                "object": "chat.completion.chunk",
+                "created": completion["created"],
+                "model": completion["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": piece},
+                        "finish_reason": "stop" if i == len(pieces) - 1 else None,
+                    }
+                ],
+            }
+            send(json.dumps(chunk, ensure_ascii=False))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    A local OpenAI-compatible chat completions server (see the module docstring). Each request is served by its own
+    thread. Use it as a context manager, or call start() and stop().
+    """
+
+    daemon_threads = True
+    # Load tests open hundreds of connections at once
+    request_queue_size = 1024
+
+    def __init__(
+        self, config: Optional[StandInConfig] = None, host="127.0.0.1", port=0
+    ):
+        """
+        Initializes the server, bound but not serving yet.
+
+        Args:
+            config (StandInConfig, optional): The behaviour of the server. Defaults to an instant echo server.
+            host (str, optional): The host to bind to. Defaults to "127.0.0.1".
+            port (int, optional): The port to bind to. Defaults to 0 (any free port).
+        """
+        super().__init__((host, port), _StandInHandler)
+        self.config = config or StandInConfig()
+        self.recording = (
+            ResponseRecording(self.config.record_path)
+            if self.config.record_path
+            else None
+        )
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._request_bucket = (
+            TokenBucket(
+                self.config.requests_per_minute, self.config.requests_per_minute / 60
+            )
+            if self.config.requests_per_minute
+            else None
+        )
+        self._token_bucket = (
+            TokenBucket(
+                self.config.tokens_per_minute, self.config.tokens_per_minute / 60
+            )
+            if self.config.tokens_per_minute
+            else None
+        )
+        self._thread = None
+        self.status_counts = {}
+        self.replayed = 0
+        self.recorded = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def roll(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def choice(self, options: list):
+        with self._lock:
+            return self._random.choice(options)
+
+    def count(self, status: int) -> None:
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def check_rate_limits(self, prompt_tokens: int) -> Optional[float]:
+        """
+        Takes a request (and its prompt tokens) from the rate limits.
+
+        Returns:
+            Optional[float]: None if the request is allowed, otherwise the number of seconds until it would be.
+        """
+        for bucket, amount in [
+            (self._request_bucket, 1),
+            (self._token_bucket, prompt_tokens),
+        ]:
+            if bucket is None:
+                continue
+            wait = bucket.reserve(amount)
+            if wait > 0:
+                bucket.refund(amount)
+                return wait
+        return None
+
+    def charge_completion_tokens(self, completion_tokens: int) -> None:
+        # Completion tokens are only known once generated, so they can't be rejected, but they delay later requests
+        if self._token_bucket is not None:
+            self._token_bucket.reserve(completion_tokens)
+
+    def _forward(self, body: dict) -> dict:
+        request = urllib.request.Request(
+            f"{self.config.upstream_base_url.rstrip('/')}/chat/completions",
+            data=json.dumps({**body, "stream": False}).encode("utf-8"),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.config.upstream_api_key}",
+            },
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def completion(self, body: dict) -> dict:
+        """
+        Produces the chat completion for a request: recorded, forwarded upstream (and recorded) or from the responder.
+        """
+        if self.recording is not None:
+            recorded = self.recording.get(body)
+            if recorded is not None:
+                with self._lock:
+                    self.replayed += 1
+                return json.loads(json.dumps(recorded))
+            if self.config.mode == "record":
+                completion = self._forward(body)
+                self.recording.add(body, completion)
+                with self._lock:
+                    self.recorded += 1
+                return completion
+        return {
+            "id": f"chatcmpl-standin-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "standin"),
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": self.config.responder(body),
+                    },
+                }
+            ],
+        }
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Stand-in LLM server listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "responses": dict(self.status_counts),
+                "replayed": self.replayed,
+                "recorded": self.recorded,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--latency",
+        default="fixed:0",
+        help="kind[:mean[:stddev]] in seconds, kind being one of "
+        + ", ".join(LatencyDistribution.KINDS),
+    )
+    parser.add_argument("--tokens-per-second", type=float)
+    parser.add_argument("--error-rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float)
+    parser.add_argument("--rpm", type=int, help="Requests per minute limit")
+    parser.add_argument("--tpm", type=int, help="Tokens per minute limit")
+    parser.add_argument("--record-path")
+    parser.add_argument("--mode", choices=StandInConfig.MODES, default="replay")
+    parser.add_argument("--upstream-base-url")
+    parser.add_argument("--upstream-api-key")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = StandInConfig(
+        latency=LatencyDistribution.parse(args.latency, seed=args.seed),
+        tokens_per_second=args.tokens_per_second,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        retry_after=args.retry_after,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        record_path=args.record_path,
+        mode=args.mode,
+        upstream_base_url=args.upstream_base_url,
+        upstream_api_key=args.upstream_api_key,
+        seed=args.seed,
+    )
+    server = StandInServer(config, args.host, args.port)
+    try:
+        server.start()
+        server._thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info(f"Stand-in LLM server stopped: {server.stats}")
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+from enum import Enum
+from summa.caches import LLMResponseCache
+from summa.llms import (
+    OpenAIClient,
+    PromptTemplate,
+    Summa,
+    TextGenerationLLM,
+    TextGenerationOutput,
+)
+from summa.singleflight import SingleFlight
+
+
+def make_prompt_template() -> PromptTemplate:
+    """
+    Returns the prompt template of summa/tests/prompts/test_prompt.md ("Hello, {input}!").
+    """
+    return PromptTemplate(
+        template_filename="test_prompt.md", prompts_dir="tests/prompts"
+    )
+
+
+class EchoModel(TextGenerationLLM):
+    """
+    A model answering every prompt with its input, configurable to stand in for a slow, failing or metered model.
+
+    Cacheable models get a bypassed response cache and a single-flight group of their own, so that tests don't share
+    the process-wide ones; tests exercising the cache set one.
+
+    Args:
+        name (str, optional): The model name. Defaults to "Test".
+        delay (float, optional): The number of seconds every call takes. Defaults to 0.
+        delays (List[float], optional): The number of seconds the first calls take, instead of delay. Defaults to
+            None.
+        failures (int, optional): The number of first calls that fail with error. Defaults to 0.
+        error (type, optional): The exception failing calls raise. Defaults to ConnectionError.
+        usage (Tuple[int, int], optional): The prompt and completion tokens reported by every call. Defaults to None
+            (no usage recorded).
+        cacheable (bool, optional): Whether outputs may be cached and coalesced. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        name="Test",
+        delay=0.0,
+        delays=None,
+        failures=0,
+        error=ConnectionError,
+        usage=None,
+        cacheable=False,
+    ):
+        super().__init__(name, Summa.ModelVersions.SUMMA_ECHO)
+        self.cacheable = cacheable
+        if cacheable:
+            self.cache = LLMResponseCache(bypass=True)
+            self.single_flight = SingleFlight()
+        self.delay = delay
+        self.delays = list(delays or [])
+        self.failures = failures
+        self.error = error
+        # Makes every call fail while set
+        self.failing = False
+        self.usage = usage
+        # The time every call started at, and the prompts they were sent
+        self.calls = []
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def answer(self, prompt) -> str:
+        return prompt.kwargs["input"]
+
+    def _start(self, prompt):
+        # The output, the delay of the call and whether it fails
+        with self._lock:
+            self.calls.append(time.monotonic())
+            self.prompts.append(prompt.prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            delay = self.delays.pop(0) if self.delays else self.delay
+            failing = self.failing or len(self.calls) <= self.failures
+        output = TextGenerationOutput(self.model, self.model_version, prompt)
+        output.start_generation_timer()
+        return output, delay, failing
+
+    def _finish(self, prompt, output, failing):
+        with self._lock:
+            self.in_flight -= 1
+        if failing:
+            raise self.error(f"{self.model} failed")
+        output.output = self.answer(prompt)
+        output.measure_generation_time()
+        if self.usage is not None:
+            output.record_usage(*self.usage)
+        return output
+
+    def _generate(self, prompt):
+        output, delay, failing = self._start(prompt)
+        time.sleep(delay)
+        return self._finish(prompt, output, failing)
+
+    async def _agenerate(self, prompt):
+        output, delay, failing = self._start(prompt)
+        await asyncio.sleep(delay)
+        return self._finish(prompt, output, failing)
+
+
+class FakeOpenAIModel(OpenAIClient):
+    """
+    An OpenAI client for a fake API, e.g. a mocked transport or the stand-in server (see summa.standin). Every request
+    reaches the API: responses are neither cached nor coalesced.
+    """
+
+    class ModelVersions(Enum):
+        FAKE = "fake"
+
+    def __init__(self, base_url, model_version=ModelVersions.FAKE):
+        super().__init__("Fake", model_version, "key", base_url=base_url)
+        self.cache = LLMResponseCache(bypass=True)
+        self.coalesce = False
@@ -0,0 +1,206 @@
+import json
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import httpx
+import openai
+from summa.caches import LLMResponseCache
+from summa.evals import Evaluators
+from summa.pipelines import BatchPipelineRunner
+from summa.preprocessors import TextPreprocessors
+from summa.processors import TextProcessors
+from summa.tests.helpers import FakeOpenAIModel, make_prompt_template
+
+RAW_TEXTS = ["Aveți vreo întrebare?", "Transfăgărășanul s-a închis", "Acolo unde"]
+
+
+class FakeBatchAPI:
+    """
+    An in-memory stand-in for the OpenAI files, batches and chat completions endpoints. Completions restore the
+    word "intrebare" and the batch API fails every request whose custom ID is listed in failing_ids. The first
+    poll_failures status checks fail, and the batch never completes if stuck.
+    """
+
+    def __init__(self, failing_ids=(), poll_failures=0, stuck=False):
+        self.failing_ids = failing_ids
+        self.poll_failures = poll_failures
+        self.stuck = stuck
+        self.requests = []
+        self.chat_completions = 0
+        self.cancelled = False
+
+    @staticmethod
+    def _completion(content):
+        return {
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "fake",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": content.replace("intrebare", "întrebare"),
+                    },
+                }
+            ],
+        }
+
+    def _results(self):
+        lines = []
+        for request in self.requests:
+            content = request["body"]["messages"][0]["content"]
+            if request["custom_id"] in self.failing_ids:
+                response = {"status_code": 500, "body": {"error": "boom"}}
+            else:
+                response = {"status_code": 200, "body": self._completion(content)}
+            lines.append(
+                {"custom_id": request["custom_id"], "response": response, "error": None}
+            )
+        return "\n".join(json.dumps(line, ensure_ascii=False) for line in lines)
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/files"):
+            body = request.read().decode("utf-8")
+            self.requests = [
+                json.loads(line)
+                for line in body.splitlines()
+                if line.startswith('{"custom_id"')
+            ]
+            return httpx.Response(
+                200,
+                json={
+                    "id": "file-in",
+                    "object": "file",
+                    "bytes": len(body),
+                    "created_at": 0,
+                    "filename": "batch.jsonl",
+                    "purpose": "batch",
+                    "status": "processed",
+                },
+            )
+        if path.endswith("/batches"):
+            return httpx.Response(200, json={"id": "batch-1", "status": "validating"})
+        if path.endswith("/batches/batch-1/cancel"):
+            self.cancelled = True
+            return httpx.Response(200, json={"id": "batch-1", "status": "cancelling"})
+        if path.endswith("/batches/batch-1"):
+            if self.poll_failures:
+                self.poll_failures -= 1
+                return httpx.Response(502)
+            if self.stuck:
+                return httpx.Response(
+                    200, json={"id": "batch-1", "status": "in_progress"}
+                )
+            return httpx.Response(
+                200,
+                json={
+                    "id": "batch-1",
+                    "status": "completed",
+                    "output_file_id": "file-out",
+                },
+            )
+        if path.endswith("/files/file-out/content"):
+            return httpx.Response(200, content=self._results().encode("utf-8"))
+        if path.endswith("/chat/completions"):
+            self.chat_completions += 1
+            content = json.loads(request.read())["messages"][0]["content"]
+            return httpx.Response(200, json=self._completion(content))
+        return httpx.Response(404)
+
+
+class TestBatchPipelineRunner(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.llm = FakeOpenAIModel("http://batch.test/v1")
+        self.llm.cache = LLMResponseCache()
+        self.prompt_template = make_prompt_template()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, api, **kwargs):
+        client = openai.OpenAI(
+            api_key="key",
+            base_url="http://batch.test/v1",
+            http_client=httpx.Client(transport=httpx.MockTransport(api.handler)),
+            max_retries=0,
+        )
+        runner = BatchPipelineRunner(
+            TextPreprocessors.STRIP_DIACRITICS.value,
+            TextProcessors.BASIC.value,
+            [self.llm],
+            [self.prompt_template],
+            [Evaluators.RA_CS_CL.value],
+            batch_dir=self.tmp.name,
+            **{"poll_interval": 0, **kwargs},
+        )
+        with mock.patch.object(
+            FakeOpenAIModel,
+            "client",
+            new_callable=mock.PropertyMock,
+            return_value=client,
+        ):
+            return list(runner.run_many(RAW_TEXTS))
+
+    def test_outputs_come_from_the_batch(self):
+        api = FakeBatchAPI()
+        outputs = self._run(api)
+        self.assertEqual([o.raw_text for o in outputs], RAW_TEXTS)
+        self.assertEqual(len(api.requests), len(RAW_TEXTS))
+        self.assertEqual(api.chat_completions, 0)
+        self.assertEqual(
+            outputs[0].processed_outputs[0].output, "Hello, Aveti vreo întrebare?!"
+        )
+        self.assertEqual(len(outputs[0].processed_outputs[0].evals), 1)
+
+    def test_failed_requests_fall_back_to_synchronous_generation(self):
+        api = FakeBatchAPI(failing_ids=["1-0"])
+        outputs = self._run(api)
+        self.assertEqual(api.chat_completions, 1)
+        self.assertEqual(len(outputs[1].processed_outputs), 1)
+
+    def test_cached_responses_are_not_resubmitted(self):
+        self._run(FakeBatchAPI())
+        api = FakeBatchAPI()
+        outputs = self._run(api)
+        self.assertEqual(api.requests, [])
+        self.assertTrue(all(o.processed_outputs[0].cached for o in outputs))
+
+    def test_polling_survives_transient_errors(self):
+        api = FakeBatchAPI(poll_failures=2)
+        outputs = self._run(api, poll_interval=0.001)
+        self.assertEqual(len(outputs), len(RAW_TEXTS))
+        self.assertEqual(api.poll_failures, 0)
+        self.assertEqual(api.chat_completions, 0)
+
+    def test_unfinished_batches_fall_back_after_max_wait(self):
+        api = FakeBatchAPI(stuck=True)
+        outputs = self._run(api, poll_interval=0.01, max_wait=0.05)
+        self.assertTrue(api.cancelled)
+        self.assertEqual(api.chat_completions, len(RAW_TEXTS))
+        self.assertEqual(
+            outputs[0].processed_outputs[0].output, "Hello, Aveti vreo întrebare?!"
+        )
+
+    def test_fallback_requests_run_in_parallel(self):
+        # Every missing request must be in flight at once for all of them to get past the barrier
+        barrier = threading.Barrier(len(RAW_TEXTS), timeout=5)
+        process_prompt = BatchPipelineRunner._process_prompt
+
+        def _process_prompt(runner, model, prompt):
+            barrier.wait()
+            return process_prompt(runner, model, prompt)
+
+        api = FakeBatchAPI(stuck=True)
+        with mock.patch.object(BatchPipelineRunner, "_process_prompt", _process_prompt):
+            outputs = self._run(api, max_wait=0)
+        self.assertEqual(len(outputs), len(RAW_TEXTS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from summa.budgets import BudgetExceededError, TokenBudget
+from summa.evals import Evaluators
+from summa.llms import Prompt
+from summa.pipelines import AsyncPipelineRunner, PipelineRunner
+from summa.preprocessors import TextPreprocessors
+from summa.processors import TextProcessors
+from summa.tests.helpers import EchoModel, make_prompt_template
+
+
+class TestTokenBudget(unittest.TestCase):
+    def setUp(self):
+        self.output = EchoModel(usage=(10, 5)).generate(
+            Prompt(make_prompt_template(), "x")
+        )
+
+    def test_charge_tokens_and_cost(self):
+        budget = TokenBudget(prices={self.output.model_version: (1.0, 2.0)})
+        budget.charge(self.output)
+        self.assertEqual(budget.spent_tokens, 15)
+        self.assertAlmostEqual(budget.spent_cost, 20 / 1_000_000)
+        self.assertFalse(budget.exhausted)
+
+    def test_cached_outputs_are_free(self):
+        budget = TokenBudget(max_tokens=1)
+        self.output.cached = True
+        budget.charge(self.output)
+        self.assertEqual(budget.spent_tokens, 0)
+
+    def test_check_raises_once_exhausted(self):
+        budget = TokenBudget(max_tokens=15)
+        budget.check()
+        budget.charge(self.output)
+        self.assertRaises(BudgetExceededError, budget.check)
+
+    def test_recovered_spending_counts(self):
+        self.assertTrue(TokenBudget(max_cost=1.0, spent_cost=1.0).exhausted)
+
+
+class TestPipelineRunnerBudget(unittest.TestCase):
+    def setUp(self):
+        self.llm = EchoModel(usage=(10, 5))
+        self.args = (
+            TextPreprocessors.STRIP_DIACRITICS.value,
+            TextProcessors.BASIC.value,
+            [self.llm],
+            [make_prompt_template()],
+            [Evaluators.RA_CS_CL.value],
+        )
+
+    def test_stops_dispatching_once_exhausted(self):
+        runner = PipelineRunner(*self.args, budget=TokenBudget(max_tokens=30))
+        runner.run("Aveți vreo întrebare?", sequential=True)
+        runner.run("Acolo unde", sequential=True)
+        self.assertRaises(BudgetExceededError, runner.run, "Acolo", sequential=True)
+        self.assertEqual(len(self.llm.calls), 2)
+        self.assertEqual(runner.budget.spent_tokens, 30)
+
+    def test_async_runner(self):
+        runner = AsyncPipelineRunner(*self.args, budget=TokenBudget(max_tokens=15))
+        runner.run("Aveți vreo întrebare?")
+        self.assertRaises(BudgetExceededError, runner.run, "Acolo unde")
+        self.assertEqual(len(self.llm.calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from summa.caches import EvaluatorScoreCache, LLMResponseCache
+from summa.evals import Evaluators, RestorationAccuracyEvaluator, evaluate_batch
+from summa.llms import Prompt, Summa
+from summa.tests.helpers import EchoModel, make_prompt_template
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_params(self):
+        key = LLMResponseCache.key("OpenAI", "gpt-4o", "prompt", {"temperature": 0})
+        self.assertEqual(
+            key, LLMResponseCache.key("OpenAI", "gpt-4o", "prompt", {"temperature": 0})
+        )
+        self.assertNotEqual(
+            key, LLMResponseCache.key("OpenAI", "gpt-4o", "prompt", {"temperature": 1})
+        )
+
+    def test_memory_hit_and_miss_counters(self):
+        cache = LLMResponseCache()
+        self.assertIsNone(cache.get("k"))
+        cache.set("k", {"output": "v"})
+        self.assertEqual(cache.get("k"), {"output": "v"})
+        self.assertEqual(cache.stats["hits"], 1)
+        self.assertEqual(cache.stats["memory_hits"], 1)
+        self.assertEqual(cache.stats["misses"], 1)
+
+    def test_disk_tier_survives_new_instance(self):
+        LLMResponseCache(path=self.path).set("k", {"output": "v"})
+        cache = LLMResponseCache(path=self.path)
+        self.assertEqual(cache.get("k"), {"output": "v"})
+        self.assertEqual(cache.stats["disk_hits"], 1)
+
+    def test_memory_lru_eviction(self):
+        cache = LLMResponseCache(max_memory_entries=2)
+        for key in ["a", "b", "c"]:
+            cache.set(key, {"output": key})
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_disk_size_eviction(self):
+        cache = LLMResponseCache(path=self.path, max_disk_entries=10)
+        for i in range(20):
+            cache.set(str(i), {"output": i})
+        (count,) = cache._disk.execute("SELECT COUNT(*) FROM responses").fetchone()
+        self.assertLessEqual(count, 10)
+        self.assertIsNotNone(LLMResponseCache(path=self.path).get("19"))
+
+    def test_disk_eviction_keeps_recently_read_entries(self):
+        cache = LLMResponseCache(path=self.path, max_disk_entries=10)
+        for i in range(10):
+            cache.set(str(i), {"output": i})
+        cache = LLMResponseCache(path=self.path, max_disk_entries=10)
+        self.assertIsNotNone(cache.get("0"))
+        cache.set("10", {"output": 10})
+        reopened = LLMResponseCache(path=self.path)
+        self.assertIsNotNone(reopened.get("0"))
+        self.assertIsNone(reopened.get("1"))
+
+    def test_disk_is_not_scanned_on_every_insert(self):
+        cache = LLMResponseCache(path=self.path)
+        cache.evict_interval = 10
+        with mock.patch.object(cache, "_evict", wraps=cache._evict) as evict:
+            for i in range(25):
+                cache.set(str(i), {"output": i})
+        self.assertEqual(evict.call_count, 2)
+
+    def test_disk_hits_are_touched_in_batches(self):
+        LLMResponseCache(path=self.path).set_many({"a": 1, "b": 2})
+        cache = LLMResponseCache(path=self.path)
+        cache.touch_batch_size = 2
+        with mock.patch.object(cache, "_touch", wraps=cache._touch) as touch:
+            cache.get("a")
+            self.assertEqual(touch.call_count, 0)
+            cache.get("b")
+            self.assertEqual(touch.call_count, 1)
+
+    def test_disk_ttl_expiry(self):
+        LLMResponseCache(path=self.path).set("k", {"output": "v"})
+        cache = LLMResponseCache(path=self.path, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("k"))
+
+    def test_bypass(self):
+        cache = LLMResponseCache(bypass=True)
+        cache.set("k", {"output": "v"})
+        self.assertIsNone(cache.get("k"))
+
+
+class TestCachedGeneration(unittest.TestCase):
+    def setUp(self):
+        self.prompt_template = make_prompt_template()
+        self.llm = EchoModel(cacheable=True)
+        self.llm.cache = LLMResponseCache()
+
+    def test_second_generation_is_cached(self):
+        first = self.llm.generate(Prompt(self.prompt_template, "Test"))
+        second = self.llm.generate(Prompt(self.prompt_template, "Test"))
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(second.output, first.output)
+        self.assertEqual(second.generation_time, first.generation_time)
+        self.assertEqual(len(self.llm.calls), 1)
+
+    def test_different_prompts_are_not_shared(self):
+        self.llm.generate(Prompt(self.prompt_template, "A"))
+        output = self.llm.generate(Prompt(self.prompt_template, "B"))
+        self.assertFalse(output.cached)
+        self.assertEqual(len(self.llm.calls), 2)
+
+    def test_summa_echo_is_not_cached(self):
+        llm = Summa()
+        llm.cache = LLMResponseCache()
+        llm.generate(Prompt(self.prompt_template, "Test"))
+        self.assertFalse(llm.generate(Prompt(self.prompt_template, "Test")).cached)
+
+
+class TestEvaluatorScoreCache(unittest.TestCase):
+    PAIRS = [("Mâine", "Maine"), ("Mâine", "Mâine"), ("Acolo", "Acolo")]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "scores.sqlite3")
+        self.evaluators = [e.value for e in Evaluators]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cached_scores_are_not_recomputed(self):
+        cache = EvaluatorScoreCache()
+        expected = evaluate_batch(self.PAIRS, self.evaluators)
+        self.assertEqual(evaluate_batch(self.PAIRS, self.evaluators, cache), expected)
+        self.assertEqual(cache.stats["misses"], len(self.PAIRS) * len(self.evaluators))
+        with mock.patch.object(
+            RestorationAccuracyEvaluator, "evaluate_pair"
+        ) as evaluate_pair:
+            scores = evaluate_batch(self.PAIRS, self.evaluators, cache)
+        evaluate_pair.assert_not_called()
+        self.assertEqual(scores, expected)
+
+    def test_persisted_scores_survive_new_instance(self):
+        evaluate_batch(self.PAIRS, self.evaluators, EvaluatorScoreCache(path=self.path))
+        cache = EvaluatorScoreCache(path=self.path)
+        scores = evaluate_batch(self.PAIRS, self.evaluators, cache)
+        self.assertEqual(scores, evaluate_batch(self.PAIRS, self.evaluators))
+        self.assertEqual(
+            cache.stats["disk_hits"], len(self.PAIRS) * len(self.evaluators)
+        )
+
+    def test_key_depends_on_the_evaluator_version(self):
+        cache = EvaluatorScoreCache()
+        evaluator = Evaluators.RA_CS_CL.value
+        evaluate_batch(self.PAIRS[:1], [evaluator], cache)
+        with mock.patch.object(
+            RestorationAccuracyEvaluator,
+            "version",
+            RestorationAccuracyEvaluator.version + 1,
+        ):
+            evaluate_batch(self.PAIRS[:1], [evaluator], cache)
+        self.assertEqual(cache.stats["misses"], 2)
+
+    def test_memory_is_bounded(self):
+        cache = EvaluatorScoreCache(max_memory_entries=4)
+        evaluate_batch(self.PAIRS, self.evaluators, cache)
+        self.assertEqual(len(cache._memory), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
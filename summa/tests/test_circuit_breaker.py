@@ -0,0 +1,129 @@
+import asyncio
+import time
+import unittest
+from summa.caches import LLMResponseCache
+from summa.llms import Prompt, PromptTemplate
+from summa.processors import (
+    BasicTextProcessor,
+    CircuitBreaker,
+    CircuitBreakers,
+    CircuitOpenError,
+)
+from summa.tests.helpers import EchoModel
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(
+            "test", error_rate=0.5, min_calls=4, window=10, open_seconds=0.05
+        )
+
+    def _record(self, *outcomes):
+        for success in outcomes:
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(success)
+
+    def test_opens_at_error_rate(self):
+        self._record(True, False, True)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self._record(False)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.stats["rejected"], 1)
+
+    def test_half_open_probe_closes(self):
+        self._record(False, False, False, False)
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        # Only one probe at a time
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.stats["calls"], 0)
+
+    def test_failed_probe_reopens_for_longer(self):
+        self._record(False, False, False, False)
+        time.sleep(0.06)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_released_probe(self):
+        self._record(False, False, False, False)
+        time.sleep(0.06)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow())
+
+
+class TestCircuitBreakers(unittest.TestCase):
+    def setUp(self):
+        self.llm = EchoModel(cacheable=True)
+        self.llm.provider = "test"
+        self.prompt = Prompt(PromptTemplate("{input}"), "Test")
+        self.processor = BasicTextProcessor()
+
+    def _trip(self, park=False):
+        self.processor.circuit_breakers = CircuitBreakers(
+            park=park, min_calls=2, open_seconds=0.1
+        )
+        self.llm.failing = True
+        for _ in range(2):
+            self.assertRaises(
+                ConnectionError, self.processor.process, self.llm, self.prompt
+            )
+        self.llm.failing = False
+
+    def test_fails_fast(self):
+        self._trip()
+        self.assertRaises(
+            CircuitOpenError, self.processor.process, self.llm, self.prompt
+        )
+        self.assertEqual(len(self.llm.calls), 2)
+        self.assertEqual(
+            self.processor.circuit_breakers.stats["test"]["state"], CircuitBreaker.OPEN
+        )
+
+    def test_parks_until_half_open(self):
+        self._trip(park=True)
+        start = time.perf_counter()
+        output = self.processor.process(self.llm, self.prompt)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        self.assertEqual(output.output, "Test")
+        self.assertEqual(
+            self.processor.circuit_breakers.get(self.llm).state, CircuitBreaker.CLOSED
+        )
+
+    def test_parks_until_half_open_async(self):
+        self._trip(park=True)
+        output = asyncio.run(self.processor.aprocess(self.llm, self.prompt))
+        self.assertEqual(output.output, "Test")
+
+    def test_cached_responses_bypass_the_breaker(self):
+        self.llm.cache = LLMResponseCache()
+        self.processor.process(self.llm, Prompt(PromptTemplate("{input}"), "Cached"))
+        self._trip()
+        breaker = self.processor.circuit_breakers.get(self.llm)
+        calls = breaker.stats["calls"]
+
+        # Served while the breaker is open, without counting as a success
+        output = self.processor.process(
+            self.llm, Prompt(PromptTemplate("{input}"), "Cached")
+        )
+        self.assertTrue(output.cached)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.stats["calls"], calls)
+        self.assertRaises(
+            CircuitOpenError, self.processor.process, self.llm, self.prompt
+        )
+
+    def test_scope(self):
+        breakers = CircuitBreakers(scope="model")
+        self.assertEqual(breakers.get(self.llm).name, "test/summa-echo")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+from summa.clients import ClientRegistry
+from summa.llms import TextGenerationLLMs
+
+
+class TestClientRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = ClientRegistry(max_connections=10, max_keepalive_connections=5)
+
+    def tearDown(self):
+        self.registry.close()
+
+    def test_openai_client_shared_per_base_url_and_key(self):
+        client = self.registry.openai_client("key", "http://localhost:1/v1")
+        self.assertIs(
+            client, self.registry.openai_client("key", "http://localhost:1/v1")
+        )
+        self.assertIsNot(
+            client, self.registry.openai_client("other", "http://localhost:1/v1")
+        )
+        self.assertIsNot(
+            client, self.registry.openai_client("key", "http://localhost:2/v1")
+        )
+
+    def test_async_openai_client_shared_per_loop(self):
+        async def get():
+            return self.registry.async_openai_client("key", "http://localhost:1/v1")
+
+        async def get_twice():
+            return await get(), await get()
+
+        first, second = asyncio.run(get_twice())
+        self.assertIs(first, second)
+        self.assertIsNot(first, asyncio.run(get()))
+
+    def test_pool_limits_exposed(self):
+        stats = self.registry.stats
+        self.assertEqual(stats["max_connections"], 10)
+        self.assertEqual(stats["max_keepalive_connections"], 5)
+
+    def test_google_model_and_safety_settings_cached(self):
+        model = self.registry.google_model(
+            "gemini-1.0-pro-latest", {"temperature": 0.0}, "key"
+        )
+        self.assertIs(
+            model,
+            self.registry.google_model(
+                "gemini-1.0-pro-latest", {"temperature": 0.0}, "key"
+            ),
+        )
+        safety_settings = self.registry.google_safety_settings()
+        self.assertIs(safety_settings, self.registry.google_safety_settings())
+        self.assertNotIn(
+            "HARM_CATEGORY_UNSPECIFIED", [category.name for category in safety_settings]
+        )
+
+    def test_deepinfra_models_share_one_client(self):
+        self.assertIs(
+            TextGenerationLLMs.META_LLAMA_3_8B_INSTRUCT.value.client,
+            TextGenerationLLMs.MISTRALAI_MIXTRAL_8X7B_INSTRUCT_V0_1.value.client,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
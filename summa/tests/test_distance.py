@@ -0,0 +1,117 @@
+import random
+import unittest
+from summa.distance import (
+    alignment_counts,
+    banded_distance,
+    levenshtein_distance,
+    myers_distance,
+    numpy_distance,
+    reference_distance,
+)
+from summa.evals import RestorationErrorRateEvaluator
+
+ALPHABET = "aăâbiîsșțt "
+
+
+class TestEditDistance(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(0)
+
+    def _text(self, max_length=40):
+        return "".join(
+            self.rng.choice(ALPHABET) for _ in range(self.rng.randint(0, max_length))
+        )
+
+    def _pairs(self, count=500):
+        return [(self._text(), self._text()) for _ in range(count)]
+
+    def test_engines_match_reference(self):
+        for s1, s2 in self._pairs():
+            for a, b in [(s1, s2), (s1.split(), s2.split())]:
+                expected = reference_distance(a, b)
+                self.assertEqual(myers_distance(a, b), expected)
+                self.assertEqual(numpy_distance(a, b), expected)
+                self.assertEqual(levenshtein_distance(a, b), expected)
+
+    def test_long_pattern(self):
+        # Longer than a machine word
+        s1 = self._text(200) + "x" * 100
+        s2 = "y" + s1[::-1]
+        self.assertEqual(myers_distance(s1, s2), reference_distance(s1, s2))
+
+    def test_banded(self):
+        for s1, s2 in self._pairs():
+            expected = reference_distance(s1, s2)
+            max_distance = self.rng.randint(0, 12)
+            self.assertEqual(
+                banded_distance(s1, s2, max_distance),
+                expected if expected <= max_distance else None,
+            )
+            self.assertEqual(
+                levenshtein_distance(s1, s2, max_distance),
+                min(expected, max_distance + 1),
+            )
+
+    @staticmethod
+    def _reference_counts(a, b, marked):
+        # Textbook DP over (edits, -(deletions + insertions), -marked matches), keeping the counts along
+        rows = [[None] * (len(b) + 1) for _ in range(len(a) + 1)]
+        rows[0][0] = (0, 0, 0, 0, 0, 0, 0)
+        for i in range(len(a) + 1):
+            for j in range(len(b) + 1):
+                candidates = []
+                if i and j:
+                    e, x, q, mt, s, d, n = rows[i - 1][j - 1]
+                    if a[i - 1] == b[j - 1]:
+                        candidates.append((e, x, q - marked[i - 1], mt + 1, s, d, n))
+                    else:
+                        candidates.append((e + 1, x, q, mt, s + 1, d, n))
+                if i:
+                    e, x, q, mt, s, d, n = rows[i - 1][j]
+                    candidates.append((e + 1, x - 1, q, mt, s, d + 1, n))
+                if j:
+                    e, x, q, mt, s, d, n = rows[i][j - 1]
+                    candidates.append((e + 1, x - 1, q, mt, s, d, n + 1))
+                if candidates:
+                    rows[i][j] = min(candidates)
+        _, _, q, mt, s, d, n = rows[-1][-1]
+        return mt, s, d, n, -q
+
+    def test_alignment_counts(self):
+        for s1, s2 in self._pairs(300):
+            for a, b in [(s1, s2), (s1.split(), s2.split())]:
+                marked = [self.rng.random() < 0.3 for _ in a]
+                self.assertEqual(
+                    alignment_counts(a, b, marked), self._reference_counts(a, b, marked)
+                )
+
+    def test_alignment_counts_ties(self):
+        # Two substitutions, or a deletion, a match and an insertion: the most matches count
+        self.assertEqual(alignment_counts("ab", "ba"), (1, 0, 1, 1, 0))
+        self.assertEqual(alignment_counts("ab", "ba", [False, True]), (1, 0, 1, 1, 1))
+        # Then the most marked matches
+        self.assertEqual(alignment_counts("aa", "a", [False, True]), (1, 0, 1, 0, 1))
+        self.assertEqual(alignment_counts("", "ab"), (0, 0, 0, 2, 0))
+
+    def test_edge_cases(self):
+        self.assertEqual(levenshtein_distance("", ""), 0)
+        self.assertEqual(levenshtein_distance("abc", ""), 3)
+        self.assertEqual(levenshtein_distance([], ["a", "b"]), 2)
+        self.assertEqual(levenshtein_distance("kitten", "sitting"), 3)
+
+    def test_rer_scores_are_unchanged(self):
+        for s1, s2 in self._pairs(200):
+            if not s1.split():
+                continue
+            self.assertEqual(
+                RestorationErrorRateEvaluator.calculate_cer(s1, s2),
+                min(reference_distance(s1, s2) / len(s1), 1),
+            )
+            self.assertEqual(
+                RestorationErrorRateEvaluator.calculate_wer(s1, s2),
+                min(reference_distance(s1.split(), s2.split()) / len(s1.split()), 1),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,19 @@
+import concurrent.futures
+import multiprocessing
+import os
+import random
 import unittest
-from summa.evals import Evaluators
+from unittest import mock
+from summa.caches import EvaluatorScoreCache
+from summa.distance import alignment_counts, levenshtein_distance
+from summa import evals
+from summa.evals import (
+    Evaluators,
+    NormalizedText,
+    TextPair,
+    default_evaluation_executor,
+    evaluate_batch,
+)
 
 """
 Restoration Accuracy: Evaluator for calculating the accuracy of a restoration.
@@ -25,10 +39,16 @@ class TestRestorationAccuracyEvaluator_CS_CL(unittest.TestCase):
 
     def test_unequal_lengths(self):
         processed_text = "Transfăgărășanul"  # len = 16
-        expected_result = 0.0
+        expected_result = 14 / 16  # the 14 original characters are aligned, 2 are added
         result = self.eval.evaluate(RAW_TEXT_WORD, processed_text)
         self.assertEqual(result, expected_result)
 
+    def test_equal_lengths_with_shifted_characters(self):
+        # Texts of the same length are compared position by position (12 equal positions out of 20), although an
+        # alignment deleting one character and inserting another would find 13 matches out of 21 columns
+        result = self.eval.evaluate("eșceîbbsAîîșcbiîA șc", "eșieîebbădîecbțîA șd")
+        self.assertEqual(result, 12 / 20)
+
     def test_case_sensitivity(self):
         raw_text_upper = RAW_TEXT_WORD.upper()
         processed_text = RAW_TEXT_WORD.lower()
@@ -91,10 +111,8 @@ class TestRestorationAccuracyEvaluator_CS_WL(unittest.TestCase):
     def test_unequal_lengths_added_word(self):
         processed_text = (
             RAW_TEXT_WORDS + " " + "EXTRA_WORD"
-        )  # added 'EXTRA_WORD' at the end to make the last word longer which should result in a 0.0 since the word lengths are now different
-        expected_result = (
-            0.0  # this should be 0.0 because the two texts have different word lengths
-        )
+        )  # added 'EXTRA_WORD' at the end, which is penalized as one more aligned word
+        expected_result = 5 / 6  # the 5 original words are aligned, 1 is added
         result = self.eval.evaluate(RAW_TEXT_WORDS, processed_text)
         self.assertEqual(result, expected_result)
 
@@ -283,3 +301,155 @@ class TestRestorationErrorRateEvaluator_CI_WL(unittest.TestCase):
         )
         result = self.eval.evaluate(raw_text_upper, processed_text)
         self.assertEqual(result, expected_result)
+
+
+class TestEvaluateBatch(unittest.TestCase):
+    PAIRS = [
+        (RAW_TEXT_WORDS, RAW_TEXT_WORDS),
+        (RAW_TEXT_WORDS, "Transfagărășanul s-a inchis pentru iarnă"),
+        (RAW_TEXT_WORDS, "transfăgărășanul S-A închis pentru iarnă"),
+        (RAW_TEXT_WORDS, " Transfăgărășanul s-a închis iarnă "),
+        (RAW_TEXT_WORD.upper(), RAW_TEXT_WORD.lower()),
+    ]
+
+    def test_matches_evaluating_each_pair(self):
+        evaluators = [e.value for e in Evaluators]
+        scores = evaluate_batch(self.PAIRS, evaluators)
+        self.assertEqual(len(scores), len(self.PAIRS))
+        for (raw_text, processed_text), pair_scores in zip(self.PAIRS, scores):
+            self.assertEqual(
+                pair_scores,
+                [e.evaluate(raw_text, processed_text) for e in evaluators],
+            )
+
+    def test_process_pool_gives_the_same_scores(self):
+        evaluators = [e.value for e in Evaluators]
+        with concurrent.futures.ProcessPoolExecutor(
+            2, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            self.assertEqual(
+                evaluate_batch(self.PAIRS, evaluators, executor=executor, min_chars=0),
+                evaluate_batch(self.PAIRS, evaluators),
+            )
+
+    def test_process_pool_is_opt_in(self):
+        with mock.patch.object(evals, "_default_evaluation_executor", None):
+            with mock.patch.dict(os.environ):
+                os.environ.pop("SUMMA_EVALUATION_PROCESS_POOL", None)
+                self.assertIsNone(default_evaluation_executor())
+
+    def test_refresh_overwrites_cached_scores(self):
+        evaluators = [Evaluators.RA_CS_CL.value]
+        cache = EvaluatorScoreCache()
+        expected = evaluate_batch(self.PAIRS, evaluators)
+        cache.set_many(
+            {
+                cache.key(
+                    evaluators[0].cache_name,
+                    NormalizedText(raw_text).hash,
+                    NormalizedText(processed_text).hash,
+                ): -1.0
+                for raw_text, processed_text in self.PAIRS
+            }
+        )
+        self.assertEqual(
+            evaluate_batch(self.PAIRS, evaluators, cache), [[-1.0]] * len(self.PAIRS)
+        )
+        self.assertEqual(
+            evaluate_batch(self.PAIRS, evaluators, cache, refresh=True), expected
+        )
+        self.assertEqual(evaluate_batch(self.PAIRS, evaluators, cache), expected)
+
+    def test_small_batches_are_scored_in_the_calling_thread(self):
+        executor = mock.Mock()
+        evaluate_batch(self.PAIRS, [Evaluators.RA_CS_CL.value], executor=executor)
+        executor.submit.assert_not_called()
+
+    def test_batches_are_split_in_chunks(self):
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            with mock.patch.object(executor, "submit", wraps=executor.submit) as submit:
+                scores = evaluate_batch(
+                    self.PAIRS,
+                    [Evaluators.RER_CS_CL.value],
+                    executor=executor,
+                    min_chars=100,
+                )
+        # Each pair has about 80 characters, so chunks hold 2 pairs
+        self.assertEqual(submit.call_count, 3)
+        self.assertEqual(
+            scores, evaluate_batch(self.PAIRS, [Evaluators.RER_CS_CL.value])
+        )
+
+    def test_shares_work_between_variants(self):
+        pair = TextPair(NormalizedText("abc def"), NormalizedText("abd def"))
+        for evaluator in Evaluators:
+            if not evaluator.value.word_level:
+                evaluator.value.evaluate_pair(pair)
+        # Without capitals, the case sensitive and insensitive variants of every metric use the same alignment
+        self.assertEqual(len(pair._alignments), 1)
+
+
+class TestAlignment(unittest.TestCase):
+    def test_counts(self):
+        alignment = TextPair("Transfăgărășan", "Transfagarasanul").alignment(
+            True, True, False
+        )
+        self.assertEqual(alignment.matches, 10)
+        self.assertEqual(alignment.substitutions, 4)
+        self.assertEqual(alignment.insertions, 2)
+        self.assertEqual(alignment.deletions, 0)
+        self.assertEqual(alignment.distance, 6)
+        self.assertEqual(alignment.length, 16)
+        self.assertEqual(alignment.diacritic_matches, 0)
+
+    def test_equal_lengths_are_compared_by_position(self):
+        alignment = TextPair("ab", "ba").alignment(True, True, False)
+        self.assertEqual((alignment.matches, alignment.length), (0, 2))
+        self.assertEqual(alignment.distance, 2)
+        self.assertEqual(Evaluators.RA_CS_CL.value.evaluate("ab", "ba"), 0.0)
+
+    def test_alignments_only_depend_on_the_texts(self):
+        rng = random.Random(0)
+        raw_text = "".join(rng.choice("abc") for _ in range(1500))
+        processed_text = "".join(rng.choice("abc") for _ in range(1400))
+        alignment = TextPair(raw_text, processed_text).alignment(True, True, False)
+        self.assertEqual(
+            alignment.distance, levenshtein_distance(raw_text, processed_text)
+        )
+        self.assertEqual(
+            alignment.distance,
+            alignment.substitutions + alignment.deletions + alignment.insertions,
+        )
+        # The same counts as aligning the texts the other way around, with the roles of deletions and insertions
+        # swapped
+        matches, substitutions, deletions, insertions, _ = alignment_counts(
+            processed_text, raw_text
+        )
+        self.assertEqual(
+            (matches, substitutions, insertions, deletions),
+            (
+                alignment.matches,
+                alignment.substitutions,
+                alignment.deletions,
+                alignment.insertions,
+            ),
+        )
+
+
+class TestDiacriticRestorationAccuracyEvaluator(unittest.TestCase):
+    def test_only_diacritic_positions_count(self):
+        # 5 of the 6 diacritics (in 2 of the 3 words bearing them) restored; the extra word doesn't count
+        processed_text = "Transfăgărășanul s-a inchis pentru iarnă grea"
+        self.assertEqual(
+            Evaluators.DRA_CS_CL.value.evaluate(RAW_TEXT_WORDS, processed_text), 5 / 6
+        )
+        self.assertEqual(
+            Evaluators.DRA_CS_WL.value.evaluate(RAW_TEXT_WORDS, processed_text), 2 / 3
+        )
+
+    def test_case_sensitivity(self):
+        self.assertEqual(Evaluators.DRA_CS_CL.value.evaluate("Ăla", "ăla"), 0.0)
+        self.assertEqual(Evaluators.DRA_CI_CL.value.evaluate("Ăla", "ăla"), 1.0)
+
+    def test_no_diacritics(self):
+        self.assertEqual(Evaluators.DRA_CS_CL.value.evaluate("iarna", "iarnă"), 1.0)
@@ -0,0 +1,175 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+import unittest
+from summa.budgets import TokenBudget, use_budget
+from summa.llms import (
+    DeadlineExceededError,
+    Prompt,
+    PromptTemplate,
+    TextGenerationOutput,
+)
+from summa.processors import HedgedTextProcessor, LatencyTracker
+from summa.standin import StandInConfig, StandInServer
+from summa.tests.helpers import EchoModel, FakeOpenAIModel, make_prompt_template
+
+
+def straggler_echo(delays=(1.0,), **kwargs):
+    """
+    An echo model whose first calls are stragglers, taking the given delays instead of 10 ms.
+    """
+    return EchoModel(
+        delay=0.01, delays=delays, usage=(10, 10), cacheable=True, **kwargs
+    )
+
+
+class TestHedgedTextProcessor(unittest.TestCase):
+    def setUp(self):
+        self.prompt = Prompt(make_prompt_template(), "Test")
+        self.llm = straggler_echo()
+        self.processor = HedgedTextProcessor(backups={}, min_samples=5)
+
+    def _warm_up(self, latency=0.01):
+        for _ in range(5):
+            output = TextGenerationOutput("Test", self.llm.model_version, self.prompt)
+            output.generation_time = latency
+            self.processor.latencies.observe(output)
+
+    def test_no_hedging_before_warm_up(self):
+        self.assertIsNone(self.processor.hedge_delay(self.llm))
+        self.llm.delays = []
+        self.processor.process(self.llm, self.prompt)
+        self.assertEqual(self.processor.stats["hedged"], 0)
+
+    def test_straggler_is_hedged(self):
+        self.llm.delays = [0.2]
+        self._warm_up()
+        output = self.processor.process(self.llm, self.prompt)
+        self.assertEqual(output.output, "Test")
+        self.assertEqual(self.processor.stats, {"hedged": 1, "hedges_won": 1})
+        self.assertEqual(len(self.llm.calls), 2)
+
+    def test_failing_straggler_is_answered_by_the_hedge(self):
+        self.llm.delays = [0.2]
+        self.llm.failures = 1
+        self._warm_up()
+        output = self.processor.attempt(self.llm, self.prompt)
+        self.assertEqual(output.output, "Test")
+        self.assertEqual(self.processor.stats, {"hedged": 1, "hedges_won": 1})
+
+    def test_busy_executor_does_not_cause_hedges(self):
+        self.llm.delays = []
+        self._warm_up(latency=0.05)
+        # Every executor thread is busy, which the primary request, run in the calling thread, doesn't wait for
+        self.processor._executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.addCleanup(self.processor._executor.shutdown)
+        busy = threading.Event()
+        self.addCleanup(busy.set)
+        self.processor.executor.submit(busy.wait, 1)
+        self.processor.process(self.llm, self.prompt)
+        self.assertEqual(self.processor.stats["hedged"], 0)
+
+    def test_losing_primary_is_charged(self):
+        self.llm.delays = [0.2]
+        self._warm_up()
+        with use_budget(TokenBudget()) as budget:
+            self.processor.process(self.llm, self.prompt)
+        self.assertEqual(self.processor.stats["hedges_won"], 1)
+        # The pipeline charges the winner, the processor the loser
+        self.assertEqual(budget.spent_tokens, 20)
+
+    def test_losing_hedge_is_charged(self):
+        backup = straggler_echo(delays=(), name="Backup")
+        backup.delay = 0.2
+        backup.model_version = "backup"
+        self.processor = HedgedTextProcessor(
+            backups={self.llm.model_version: backup}, min_samples=5
+        )
+        self.llm.delays = [0.05]
+        self._warm_up()
+        with use_budget(TokenBudget()) as budget:
+            output = self.processor.process(self.llm, self.prompt)
+        self.assertEqual(output.model_version, self.llm.model_version)
+        self.assertEqual(budget.spent_tokens, 0)
+        # Charged once it answers
+        self.processor.executor.shutdown()
+        self.assertEqual(budget.spent_tokens, 20)
+
+    def test_explicit_zero_settings(self):
+        processor = HedgedTextProcessor(backups={}, percentile=0, min_delay=0)
+        self.assertEqual(processor.percentile, 0)
+        self.assertEqual(processor.min_delay, 0)
+
+    def test_straggler_is_hedged_async(self):
+        self._warm_up()
+        start = time.perf_counter()
+        output = asyncio.run(self.processor.aprocess(self.llm, self.prompt))
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(output.output, "Test")
+        self.assertEqual(self.processor.stats, {"hedged": 1, "hedges_won": 1})
+
+    def test_hedge_goes_to_backup(self):
+        backup = straggler_echo(delays=(), name="Backup")
+        backup.model_version = "backup"
+        self.processor = HedgedTextProcessor(
+            backups={self.llm.model_version: backup}, min_samples=5
+        )
+        self._warm_up()
+        output = self.processor.process(self.llm, self.prompt)
+        self.assertEqual(output.model, "Backup")
+        self.assertEqual(output.model_version, "backup")
+        # Still the output of the model it was requested from
+        self.assertEqual(output.requested_model_version, self.llm.model_version)
+        self.assertEqual(len(self.llm.calls), 1)
+
+    def test_hedge_goes_to_backup_async(self):
+        backup = straggler_echo(delays=(), name="Backup")
+        backup.model_version = "backup"
+        self.processor = HedgedTextProcessor(
+            backups={self.llm.model_version: backup}, min_samples=5
+        )
+        self._warm_up()
+        output = asyncio.run(self.processor.aprocess(self.llm, self.prompt))
+        self.assertEqual(output.model_version, "backup")
+        self.assertEqual(output.requested_model_version, self.llm.model_version)
+
+    def test_fast_requests_are_not_hedged(self):
+        self._warm_up(latency=0.5)
+        self.llm.delays = []
+        self.processor.process(self.llm, self.prompt)
+        self.assertEqual(self.processor.stats["hedged"], 0)
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_percentile(self):
+        tracker = LatencyTracker(window=100)
+        prompt = Prompt(PromptTemplate("{input}"), "x")
+        for latency in range(1, 101):
+            output = TextGenerationOutput("Test", "test", prompt)
+            output.generation_time = latency
+            tracker.observe(output)
+        self.assertEqual(tracker.percentile("test", 95), 96)
+        self.assertIsNone(tracker.percentile("test", 95, min_samples=101))
+        self.assertIsNone(tracker.percentile("other", 95))
+
+
+class TestDeadlines(unittest.TestCase):
+    def setUp(self):
+        self.prompt = Prompt(PromptTemplate("{input}"), "x" * 200)
+
+    def test_slow_stream_exceeds_deadline(self):
+        # ~50 chunks, each well within the socket timeout, but 1 second in total
+        with StandInServer(StandInConfig(tokens_per_second=50)) as server:
+            llm = FakeOpenAIModel(server.base_url)
+            llm.stream = True
+            llm.timeout = 0.3
+            # Creating the client is not part of the call
+            llm.client
+            start = time.perf_counter()
+            self.assertRaises(DeadlineExceededError, llm.generate, self.prompt)
+            self.assertLess(time.perf_counter() - start, 0.6)
+
+
+if __name__ == "__main__":
+    unittest.main()
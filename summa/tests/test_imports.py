@@ -0,0 +1,21 @@
+import unittest
+from summa.benchmarks.import_time import STATEMENTS, loaded_provider_sdks, time_import
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_summa_does_not_import_provider_sdks(self):
+        self.assertEqual(loaded_provider_sdks(STATEMENTS["summa.pipelines"]), [])
+
+    def test_llm_enum_does_not_import_provider_sdks(self):
+        self.assertEqual(
+            loaded_provider_sdks(STATEMENTS["summa.llms + TextGenerationLLMs"]), []
+        )
+
+    def test_summa_imports_faster_than_provider_sdks(self):
+        lazy = min(time_import(STATEMENTS["summa.pipelines"]) for _ in range(3))
+        eager = min(time_import(STATEMENTS["provider SDKs (eager)"]) for _ in range(3))
+        self.assertLess(lazy, eager)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+import unittest
+from unittest import mock
+from summa.llms import Prompt, PromptTemplate
+from summa.limiters import (
+    AdaptiveConcurrencyLimiter,
+    RateLimiter,
+    TokenBucket,
+    estimate_tokens,
+    get_concurrency_limiter,
+    get_rate_limiter,
+)
+from summa.tests.helpers import EchoModel
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(capacity=2, refill_rate=10)
+        self.assertEqual(bucket.reserve(1), 0)
+        self.assertEqual(bucket.reserve(1), 0)
+        self.assertAlmostEqual(bucket.reserve(1), 0.1, places=2)
+        # Reservations queue up behind each other
+        self.assertAlmostEqual(bucket.reserve(1), 0.2, places=2)
+
+    def test_amount_capped_to_capacity(self):
+        bucket = TokenBucket(capacity=5, refill_rate=1)
+        self.assertEqual(bucket.reserve(100), 0)
+        self.assertAlmostEqual(bucket.reserve(5), 5, places=1)
+
+    def test_refund(self):
+        bucket = TokenBucket(capacity=5, refill_rate=1)
+        bucket.reserve(5)
+        bucket.refund(3)
+        self.assertAlmostEqual(bucket.available, 3, places=1)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_requests_per_minute_shared_across_threads(self):
+        limiter = RateLimiter("test", requests_per_minute=6)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            waits = list(executor.map(lambda _: limiter._reserve(1), range(8)))
+        self.assertEqual(sum(1 for w in waits if w == 0), 6)
+        self.assertAlmostEqual(max(waits), 20, places=0)
+
+    def test_tokens_per_minute(self):
+        limiter = RateLimiter("test", tokens_per_minute=600)
+        self.assertEqual(limiter._reserve(600), 0)
+        self.assertAlmostEqual(limiter._reserve(10), 1, places=1)
+
+    def test_settle(self):
+        limiter = RateLimiter("test", tokens_per_minute=600)
+        limiter._reserve(100)
+        # The request used fewer tokens than reserved: the rest is given back
+        limiter.settle(100, 40)
+        self.assertAlmostEqual(limiter._tokens.available, 560, places=0)
+        # It used more: the difference is taken
+        limiter._reserve(100)
+        limiter.settle(100, 300)
+        self.assertAlmostEqual(limiter._tokens.available, 260, places=0)
+
+    def test_unlimited(self):
+        self.assertEqual(RateLimiter("test").acquire(10_000), 0)
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 1)
+        self.assertEqual(estimate_tokens("a" * 9), 3)
+
+
+class TestRateLimiterRegistry(unittest.TestCase):
+    @mock.patch.dict(os.environ, {"SUMMA_RATE_LIMIT_TESTPROVIDER_RPM": "60"})
+    def test_shared_per_provider_and_key(self):
+        limiter = get_rate_limiter("testprovider", "key-1")
+        self.assertEqual(limiter.requests_per_minute, 60)
+        self.assertIs(limiter, get_rate_limiter("testprovider", "key-1"))
+        self.assertIsNot(limiter, get_rate_limiter("testprovider", "key-2"))
+
+    def test_no_quota_configured(self):
+        self.assertIsNone(get_rate_limiter("unconfiguredprovider", "key"))
+
+
+class TestAdaptiveConcurrencyLimiter(unittest.TestCase):
+    def _fill(self, limiter):
+        return [limiter.acquire() for _ in range(int(limiter.limit))]
+
+    def test_slow_start_doubles_the_limit(self):
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=4)
+        # Under steady demand, every finished request is replaced by a new one
+        in_flight = self._fill(limiter)
+        for _ in range(4):
+            limiter.release(in_flight.pop(0))
+            in_flight.append(limiter.acquire())
+        self.assertEqual(limiter.stats["limit"], 8)
+
+    def test_limit_is_not_raised_while_unused(self):
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=4)
+        for _ in range(10):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.stats["limit"], 4)
+
+    def test_rate_limit_cuts_once_per_round_trip(self):
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=8)
+        for acquired_at in self._fill(limiter):
+            limiter.release(acquired_at, RateLimitError())
+        self.assertEqual(limiter.stats["limit"], 4)
+        limiter.release(limiter.acquire(), RateLimitError())
+        self.assertEqual(limiter.stats["limit"], 2)
+        # Congestion avoidance: about one more per round trip
+        for _ in range(3):
+            for acquired_at in self._fill(limiter):
+                limiter.release(acquired_at)
+        self.assertEqual(limiter.stats["limit"], 3)
+
+    def test_fatal_errors_do_not_cut(self):
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=8)
+        limiter.release(limiter.acquire(), ValueError())
+        self.assertEqual(limiter.stats["limit"], 8)
+
+    def test_latency_spike_cuts(self):
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=8, min_samples=2)
+        for _ in range(2):
+            limiter.release(limiter.acquire())
+        limiter.release(limiter.acquire() - 10)
+        self.assertEqual(limiter.stats["limit"], 4)
+
+    def test_blocks_at_the_limit(self):
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, max_limit=1)
+        acquired_at = limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.05))
+        self.assertEqual(limiter.stats["waiting"], 1)
+        limiter.release(acquired_at)
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_async_slots(self):
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=2, max_limit=2)
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            async with limiter.aslot():
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.gather(*[request() for _ in range(10)])
+
+        asyncio.run(main())
+        self.assertEqual(peak, 2)
+        self.assertEqual(limiter.stats["in_flight"], 0)
+
+    def test_cancelled_waiter_gives_back_its_slot(self):
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, max_limit=1)
+
+        async def main():
+            acquired_at = await limiter.aacquire()
+            waiter = asyncio.ensure_future(limiter.aacquire())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            limiter.release(acquired_at)
+            await asyncio.sleep(0.01)
+
+        asyncio.run(main())
+        self.assertEqual(limiter.stats["in_flight"], 0)
+        self.assertEqual(limiter.stats["waiting"], 0)
+
+    @mock.patch.dict(os.environ, {"SUMMA_CONCURRENCY_INITIAL_LIMIT": "3"})
+    def test_shared_per_model(self):
+        limiter = get_concurrency_limiter("testprovider", "model-1")
+        self.assertEqual(limiter.stats["limit"], 3)
+        self.assertIs(limiter, get_concurrency_limiter("testprovider", "model-1"))
+        self.assertIsNot(limiter, get_concurrency_limiter("testprovider", "model-2"))
+
+
+class TestLimitedModel(unittest.TestCase):
+    def setUp(self):
+        self.llm = EchoModel(delay=0.01, usage=(50, 20))
+        self.llm.rate_limiter = RateLimiter("test", requests_per_minute=600)
+        self.llm.concurrency_limiter = AdaptiveConcurrencyLimiter(
+            "test", initial_limit=8, min_samples=2
+        )
+        self.template = PromptTemplate("{input}")
+
+    def test_throttling_does_not_cut_the_concurrency_limit(self):
+        for i in range(3):
+            self.llm.generate(Prompt(self.template, f"Text {i}"))
+        # With the request quota used up, the next request waits for it (100 ms), far longer than the model takes
+        self.llm.rate_limiter._requests.reserve(600)
+        self.llm.generate(Prompt(self.template, "Throttled"))
+        self.assertEqual(self.llm.concurrency_limiter.stats["decreases"], 0)
+        self.assertEqual(self.llm.concurrency_limiter.stats["limit"], 8)
+
+    def test_usage_is_charged_to_the_token_quota(self):
+        self.llm.rate_limiter = RateLimiter("test", tokens_per_minute=6000)
+        # Far more than estimated from the prompt
+        self.llm.generate(Prompt(self.template, "Aveți vreo întrebare?"))
+        self.assertAlmostEqual(self.llm.rate_limiter._tokens.available, 5930, delta=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
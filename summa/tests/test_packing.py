@@ -0,0 +1,137 @@
+import unittest
+from summa.budgets import TokenBudget
+from summa.evals import Evaluators
+from summa.llms import (
+    PromptTemplate,
+    TextGenerationOutput,
+)
+from summa.packing import PromptPacker
+from summa.pipelines import PackedPipelineRunner
+from summa.preprocessors import TextPreprocessors
+from summa.processors import TextProcessors
+from summa.tests.helpers import EchoModel, make_prompt_template
+
+RAW_TEXTS = [
+    "Aveți vreo întrebare?",
+    "Transfăgărășanul s-a închis",
+    "Acolo unde",
+    "O întrebare\ncu două rânduri",
+    "Mâine",
+]
+
+
+class LineEcho(EchoModel):
+    """
+    A model that answers every marked line of a packed prompt, and the input of a single prompt, restoring the word
+    "intrebare". With `broken` set, it answers packed prompts with a single unmarked line.
+    """
+
+    def __init__(self, broken=False):
+        super().__init__(usage=(100, 10))
+        self.broken = broken
+
+    def answer(self, prompt):
+        input = prompt.kwargs["input"].replace("intrebare", "întrebare")
+        if not input.startswith("\n"):
+            return input
+        lines = input.strip().splitlines()
+        return lines[0] if self.broken else "\n".join(lines)
+
+
+class TestPromptPacker(unittest.TestCase):
+    def setUp(self):
+        self.packer = PromptPacker(max_texts=2, max_tokens=10)
+        self.prompt_template = PromptTemplate("Restore: {input}")
+
+    def test_pack_respects_limits(self):
+        texts = ["a", "b", "c", "x" * 40, "d", "two\nlines", "e"]
+        self.assertEqual(self.packer.pack(texts), [[0, 1], [2], [3], [5], [4, 6]])
+
+    def test_prompt(self):
+        prompt = self.packer.prompt(self.prompt_template, ["a", "b"])
+        self.assertTrue(prompt.prompt.endswith("Restore: \n[#1] a\n[#2] b"))
+        self.assertIn("exactly 2 lines", prompt.prompt)
+
+    def test_split(self):
+        self.assertEqual(
+            self.packer.split("OUTPUT:\n[#1] ă\n  [#2]  b c \n", 2), ["ă", " b c"]
+        )
+        self.assertIsNone(self.packer.split("[#1] a", 2))
+        self.assertIsNone(self.packer.split("[#1] a\n[#1] b", 2))
+        self.assertIsNone(self.packer.split("[#1] a\n[#3] b", 2))
+
+    def test_unpack_shares_usage(self):
+        packed = self.packer.prompt(self.prompt_template, ["aaaa", "aaaaaaaa"])
+        packed_output = TextGenerationOutput("Test", "test", packed)
+        packed_output.output = "[#1] x\n[#2] y"
+        packed_output.generation_time = 1.0
+        packed_output.record_usage(30, 9)
+        outputs = self.packer.unpack(
+            packed_output, self.prompt_template, ["aaaa", "aaaaaaaa"]
+        )
+        self.assertEqual([o.output for o in outputs], ["x", "y"])
+        self.assertEqual([o.prompt_tokens for o in outputs], [10, 20])
+        self.assertEqual([o.completion_tokens for o in outputs], [3, 6])
+        self.assertEqual(outputs[0].prompt_template, "Restore: {input}")
+        self.assertEqual(outputs[0].prompt_kwargs, {"input": "aaaa"})
+
+    def test_unpack_keeps_the_requested_model(self):
+        packed = self.packer.prompt(self.prompt_template, ["a", "b"])
+        # Answered by a backup model
+        packed_output = TextGenerationOutput("Backup", "backup", packed)
+        packed_output.requested_model_version = "test"
+        packed_output.output = "[#1] x\n[#2] y"
+        outputs = self.packer.unpack(packed_output, self.prompt_template, ["a", "b"])
+        self.assertEqual([o.model_version for o in outputs], ["backup", "backup"])
+        self.assertEqual([o.requested_model_version for o in outputs], ["test", "test"])
+
+
+class TestPackedPipelineRunner(unittest.TestCase):
+    def _runner(self, llm, **kwargs):
+        return PackedPipelineRunner(
+            TextPreprocessors.STRIP_DIACRITICS.value,
+            TextProcessors.BASIC.value,
+            [llm],
+            [make_prompt_template()],
+            [Evaluators.RA_CS_CL.value],
+            packer=PromptPacker(max_texts=8),
+            **kwargs,
+        )
+
+    def test_outputs_match_unpacked_run(self):
+        llm = LineEcho()
+        outputs = list(self._runner(llm).run_many(RAW_TEXTS))
+        # The 4 single-line texts are packed together, the multi-line one goes on its own
+        self.assertEqual(len(llm.prompts), 2)
+        self.assertEqual([o.raw_text for o in outputs], RAW_TEXTS)
+        self.assertEqual(
+            outputs[0].processed_outputs[0].output, "Aveti vreo întrebare?"
+        )
+        self.assertEqual(len(outputs[0].processed_outputs[0].evals), 1)
+        self.assertEqual(
+            outputs[3].processed_outputs[0].output, "O întrebare\ncu doua randuri"
+        )
+
+    def test_failed_split_falls_back_to_single_prompts(self):
+        llm = LineEcho(broken=True)
+        outputs = list(self._runner(llm).run_many(RAW_TEXTS))
+        self.assertEqual(len(llm.prompts), 2 + 4)
+        self.assertEqual(
+            outputs[0].processed_outputs[0].output, "Aveti vreo întrebare?"
+        )
+
+    def test_chunks(self):
+        llm = LineEcho()
+        outputs = list(self._runner(llm, chunk_size=2).run_many(RAW_TEXTS))
+        self.assertEqual(len(outputs), len(RAW_TEXTS))
+        self.assertEqual(len(llm.prompts), 4)
+
+    def test_budget_is_charged_per_text(self):
+        budget = TokenBudget()
+        list(self._runner(LineEcho(), budget=budget).run_many(RAW_TEXTS))
+        # Shares of the packed call are rounded
+        self.assertAlmostEqual(budget.spent_tokens, 2 * 110, delta=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
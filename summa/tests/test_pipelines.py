@@ -0,0 +1,74 @@
+import threading
+import unittest
+from unittest import mock
+from summa.evals import Evaluators
+from summa.llms import Summa
+from summa.pipelines import AsyncPipelineRunner
+from summa.preprocessors import TextPreprocessors
+from summa.processors import TextProcessors
+from summa.tests.helpers import EchoModel, make_prompt_template
+
+RAW_TEXTS = [
+    "Transfăgărășanul s-a închis pentru iarnă",
+    "Aveți vreo întrebare?",
+    "Acolo unde",
+]
+
+
+class TestAsyncPipelineRunner(unittest.TestCase):
+    def setUp(self):
+        self.prompt_template = make_prompt_template()
+
+    def _runner(self, llms, max_concurrency=1000):
+        return AsyncPipelineRunner(
+            TextPreprocessors.STRIP_DIACRITICS.value,
+            TextProcessors.BASIC.value,
+            llms,
+            [self.prompt_template],
+            [Evaluators.RA_CS_CL.value],
+            max_concurrency=max_concurrency,
+        )
+
+    def test_run_echo(self):
+        output = self._runner([Summa()]).run(RAW_TEXTS[1])
+        self.assertEqual(output.preprocessed_text, "Aveti vreo intrebare?")
+        self.assertEqual(len(output.processed_outputs), 1)
+        self.assertEqual(output.processed_outputs[0].output, "Aveti vreo intrebare?")
+        self.assertEqual(len(output.processed_outputs[0].evals), 1)
+
+    def test_run_many_returns_every_text(self):
+        outputs = self._runner([Summa(), EchoModel(delay=0.01)]).run_many(RAW_TEXTS)
+        self.assertEqual(sorted(o.raw_text for o in outputs), sorted(RAW_TEXTS))
+        for output in outputs:
+            self.assertEqual(len(output.processed_outputs), 2)
+
+    def test_max_concurrency_is_respected(self):
+        llm = EchoModel(delay=0.01)
+        self._runner([llm], max_concurrency=2).run_many(RAW_TEXTS * 3)
+        self.assertEqual(llm.max_in_flight, 2)
+
+    def test_evaluation_does_not_block_the_event_loop(self):
+        runner = self._runner([Summa()])
+        threads = []
+
+        def evaluate(raw_text, processed_outputs):
+            threads.append(threading.current_thread())
+            runner._evaluate_outputs(
+                [(raw_text, output) for output in processed_outputs]
+            )
+
+        with mock.patch.object(runner, "_evaluate", side_effect=evaluate):
+            output = runner.run(RAW_TEXTS[1])
+        self.assertEqual(len(output.processed_outputs[0].evals), 1)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+    def test_exponential_backoff_processor(self):
+        runner = self._runner([Summa()])
+        runner.processor = TextProcessors.EXPONENTIAL_BACKOFF.value
+        output = runner.run(RAW_TEXTS[2])
+        self.assertEqual(output.processed_outputs[0].output, RAW_TEXTS[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
+import os
+import tempfile
 import unittest
-from summa.llms import Prompt, PromptTemplate
+from unittest import mock
+from summa.llms import CompiledTemplate, Prompt, PromptTemplate, compile_template
 
 
 class TestPrompt(unittest.TestCase):
@@ -13,6 +16,65 @@ class TestPrompt(unittest.TestCase):
         # Check if the string representation of the prompt is correct
         self.assertEqual(self.prompt_template.render("Test"), "Hello, Test!")
 
+    def test_render_template_string(self):
+        prompt_template = PromptTemplate("{greeting}, {input}!")
+        self.assertIsNone(prompt_template.template_path)
+        self.assertEqual(
+            prompt_template.render(greeting="Hi", input="Test"), "Hi, Test!"
+        )
+
+    def test_prompt_renders_once(self):
+        prompt = Prompt(self.prompt_template, "Test")
+        with mock.patch.object(
+            CompiledTemplate, "render", autospec=True, return_value="Hello, Test!"
+        ) as render:
+            self.assertEqual(prompt.prompt, "Hello, Test!")
+            self.assertEqual(str(prompt), "Hello, Test!")
+        self.assertEqual(render.call_count, 1)
+
+    def test_prompt_keyword_arguments(self):
+        prompt = Prompt(PromptTemplate("{a}-{b}"), a=1, b=2)
+        self.assertEqual(prompt.prompt, "1-2")
+
+
+class TestCompiledTemplate(unittest.TestCase):
+    def test_render_matches_str_format(self):
+        kwargs = {"input": "Aveți", "n": 3.14159, "items": ["a", "b"]}
+        for source in [
+            "Hello, {input}!",
+            "{{literal}} {input} {{",
+            "{n:.2f} {input!r} {items[1]}",
+            "no fields",
+            "",
+        ]:
+            self.assertEqual(
+                CompiledTemplate(source).render(kwargs), source.format(**kwargs)
+            )
+
+    def test_missing_field_raises_key_error(self):
+        self.assertRaises(KeyError, CompiledTemplate("{input}").render, {})
+
+    def test_compiled_once_per_content(self):
+        self.assertIs(compile_template("{input} x"), compile_template("{input} x"))
+        self.assertIs(
+            PromptTemplate("{input} y").compiled, PromptTemplate("{input} y").compiled
+        )
+
+    def test_file_is_reloaded_when_changed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prompt.md")
+            with open(path, "w") as file:
+                file.write("A {input}")
+            first = PromptTemplate(template_filename=path)
+            self.assertIs(
+                PromptTemplate(template_filename=path).compiled, first.compiled
+            )
+            with open(path, "w") as file:
+                file.write("B {input} changed")
+            second = PromptTemplate(template_filename=path)
+            self.assertNotEqual(second.md5, first.md5)
+            self.assertEqual(second.render("x"), "B x changed")
+
 
 if __name__ == "__main__":
     # Run the unit tests
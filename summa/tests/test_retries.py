@@ -0,0 +1,147 @@
+import asyncio
+import unittest
+import httpx
+import openai
+from summa.processors import CircuitOpenError
+from summa.retries import (
+    ErrorKinds,
+    RetryBudget,
+    RetryPolicy,
+    classify_error,
+    retry_after,
+    use_retry_budget,
+)
+
+
+def api_error(status_code, headers=None):
+    request = httpx.Request("POST", "http://test/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return openai.APIStatusError("Error", response=response, body=None)
+
+
+class BlockedPromptException(Exception):
+    pass
+
+
+class TestClassifyError(unittest.TestCase):
+    def test_http_errors(self):
+        self.assertEqual(classify_error(api_error(429)), ErrorKinds.RATE_LIMIT)
+        self.assertEqual(classify_error(api_error(503)), ErrorKinds.TRANSIENT)
+        self.assertEqual(classify_error(api_error(408)), ErrorKinds.TRANSIENT)
+        for status_code in (400, 401, 403, 404, 422):
+            self.assertEqual(classify_error(api_error(status_code)), ErrorKinds.FATAL)
+
+    def test_other_errors(self):
+        self.assertEqual(classify_error(BlockedPromptException()), ErrorKinds.FATAL)
+        self.assertEqual(classify_error(ValueError("blocked")), ErrorKinds.FATAL)
+        self.assertEqual(classify_error(CircuitOpenError()), ErrorKinds.FATAL)
+        self.assertEqual(classify_error(TimeoutError()), ErrorKinds.TRANSIENT)
+        self.assertEqual(classify_error(ConnectionError()), ErrorKinds.TRANSIENT)
+
+
+class TestRetryAfter(unittest.TestCase):
+    def test_headers(self):
+        self.assertEqual(retry_after(api_error(429, {"Retry-After": "7"})), 7)
+        self.assertEqual(retry_after(api_error(429, {"retry-after-ms": "250"})), 0.25)
+        self.assertEqual(
+            retry_after(
+                api_error(
+                    429,
+                    {
+                        "x-ratelimit-remaining-requests": "10",
+                        "x-ratelimit-reset-requests": "1s",
+                        "x-ratelimit-remaining-tokens": "0",
+                        "x-ratelimit-reset-tokens": "1m30.5s",
+                    },
+                )
+            ),
+            90.5,
+        )
+        self.assertIsNone(retry_after(api_error(429)))
+        self.assertIsNone(retry_after(TimeoutError()))
+
+    def test_malformed_headers(self):
+        self.assertIsNone(retry_after(api_error(429, {"retry-after-ms": "soon"})))
+        self.assertIsNone(retry_after(api_error(429, {"Retry-After": "soon"})))
+
+    def test_http_date(self):
+        delay = retry_after(
+            api_error(503, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        )
+        self.assertEqual(delay, 0)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(max_attempts=5, min_wait=0.001, max_wait=0.01)
+
+    def _failing(self, *errors):
+        errors = list(errors)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            if errors:
+                raise errors.pop(0)
+            return "OK"
+
+        return fn, calls
+
+    def test_retries_transient_errors(self):
+        fn, calls = self._failing(api_error(500), TimeoutError())
+        self.assertEqual(self.policy.call(fn), "OK")
+        self.assertEqual(len(calls), 3)
+
+    def test_fatal_errors_are_not_retried(self):
+        fn, calls = self._failing(api_error(401))
+        self.assertRaises(openai.APIStatusError, self.policy.call, fn)
+        self.assertEqual(len(calls), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        fn, calls = self._failing(*[TimeoutError()] * 10)
+        self.assertRaises(TimeoutError, self.policy.call, fn)
+        self.assertEqual(len(calls), 5)
+
+    def test_delay_honours_retry_after(self):
+        delay = self.policy.delay(api_error(429, {"Retry-After": "2"}), 1)
+        self.assertGreaterEqual(delay, 2)
+        self.assertLessEqual(delay, 2.2)
+        self.assertLessEqual(self.policy.delay(api_error(429), 10), 0.01)
+
+    def test_async(self):
+        errors = [api_error(502)]
+
+        async def fn():
+            if errors:
+                raise errors.pop()
+            return "OK"
+
+        self.assertEqual(asyncio.run(self.policy.acall(fn)), "OK")
+
+
+class TestRetryBudget(unittest.TestCase):
+    def test_budget(self):
+        budget = RetryBudget(ratio=0.5, min_retries=1)
+        for _ in range(2):
+            budget.record_request()
+        self.assertTrue(budget.spend())
+        self.assertTrue(budget.spend())
+        self.assertFalse(budget.spend())
+        self.assertEqual(budget.stats, {"requests": 2, "retries": 2, "denied": 1})
+
+    def test_policy_stops_when_budget_is_spent(self):
+        policy = RetryPolicy(max_attempts=10, min_wait=0.001, max_wait=0.001)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            raise TimeoutError()
+
+        with use_retry_budget(RetryBudget(ratio=0, min_retries=2)) as budget:
+            self.assertRaises(TimeoutError, policy.call, fn)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(budget.stats, {"requests": 1, "retries": 2, "denied": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from summa.budgets import BudgetExceededError, TokenBudget
+from summa.evals import Evaluators
+from summa.llms import PromptTemplate
+from summa.pipelines import ScheduledPipelineRunner
+from summa.preprocessors import TextPreprocessors
+from summa.processors import ExponentialBackoffTextProcessor, TextProcessors
+from summa.retries import RetryBudget, RetryPolicy
+from summa.scheduling import WorkQueue
+from summa.tests.helpers import EchoModel
+
+RAW_TEXTS = ["Aveți vreo întrebare?", "Acolo unde", "Mâine", "Transfăgărășanul"]
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class UnauthorizedError(Exception):
+    status_code = 401
+
+
+def throttled_echo(name, error=RateLimitError, **kwargs):
+    """
+    Returns an echo model whose first `failures` calls fail with a rate limit error, unless another error is given.
+    """
+    return EchoModel(name, error=error, usage=(10, 10), **kwargs)
+
+
+class TestWorkQueue(unittest.TestCase):
+    def test_keys_take_turns(self):
+        queue = WorkQueue()
+        for i in range(3):
+            queue.put("a", f"a{i}")
+        queue.put("b", "b0")
+        queue.put("c", "c0")
+        items = []
+        for _ in range(5):
+            key, item = queue.get()
+            items.append(item)
+            queue.done(key)
+        self.assertEqual(items, ["a0", "b0", "c0", "a1", "a2"])
+
+    def test_keys_are_limited(self):
+        queue = WorkQueue(limit=lambda key: 1)
+        queue.put("slow", "s0")
+        queue.put("slow", "s1")
+        queue.put("fast", "f0")
+        self.assertEqual(queue.get(), ("slow", "s0"))
+        self.assertEqual(queue.get(), ("fast", "f0"))
+        # The second slow unit waits for the first one
+        self.assertIsNone(queue.get(timeout=0.01))
+        self.assertEqual(queue.in_flight, 2)
+        queue.done("slow")
+        self.assertEqual(queue.get(timeout=1), ("slow", "s1"))
+
+    def test_delayed_units_let_others_through(self):
+        queue = WorkQueue()
+        queue.put("a", "later", delay=0.05)
+        queue.put("b", "now")
+        self.assertEqual(queue.get(), ("b", "now"))
+        self.assertIsNone(queue.get(timeout=0.01))
+        start = time.monotonic()
+        self.assertEqual(queue.get(), ("a", "later"))
+        self.assertGreater(time.monotonic() - start, 0.02)
+
+    def test_close_wakes_consumers(self):
+        queue = WorkQueue()
+        results = []
+        thread = threading.Thread(target=lambda: results.append(queue.get()))
+        thread.start()
+        queue.close()
+        thread.join(1)
+        self.assertEqual(results, [None])
+
+
+class TestScheduledPipelineRunner(unittest.TestCase):
+    def _runner(self, llms, **kwargs):
+        return ScheduledPipelineRunner(
+            TextPreprocessors.STRIP_DIACRITICS.value,
+            TextProcessors.BASIC.value,
+            llms,
+            [PromptTemplate("{input}")],
+            [Evaluators.RA_CS_CL.value],
+            **kwargs,
+        )
+
+    def test_slow_model_does_not_block_the_others(self):
+        slow = throttled_echo("Slow", delay=0.2)
+        fast = throttled_echo("Fast", delay=0.01)
+        start = time.monotonic()
+        outputs = list(
+            self._runner([slow, fast], max_workers=4, max_per_model=2).run_many(
+                RAW_TEXTS * 2
+            )
+        )
+        self.assertEqual(len(outputs), len(RAW_TEXTS) * 2)
+        # The slow model holds at most 2 of the 4 workers, so the fast one is done long before it
+        self.assertLess(max(fast.calls) - start, 0.15)
+
+    def test_texts_are_read_lazily(self):
+        read = []
+
+        def raw_texts():
+            for raw_text in RAW_TEXTS * 5:
+                read.append(raw_text)
+                yield raw_text
+
+        llm = throttled_echo("Test")
+        outputs = self._runner([llm], max_workers=1, max_queued=2).run_many(raw_texts())
+        next(outputs)
+        self.assertLess(len(read), len(RAW_TEXTS) * 5)
+        self.assertEqual(len(list(outputs)), len(RAW_TEXTS) * 5 - 1)
+
+    def test_units_are_yielded_as_they_complete(self):
+        llms = [throttled_echo("Slow", delay=0.1), throttled_echo("Fast")]
+        outputs = self._runner(llms, max_workers=2).run_units(RAW_TEXTS)
+        first = next(outputs)
+        self.assertEqual(len(first.processed_outputs), 1)
+        self.assertEqual(len(first.processed_outputs[0].evals), 1)
+        # The fast model's outputs don't wait for the slow one's
+        self.assertEqual(first.processed_outputs[0].model, "Fast")
+        self.assertEqual(len(list(outputs)), len(RAW_TEXTS) * 2 - 1)
+
+    def test_done_units_are_not_dispatched(self):
+        first, second = throttled_echo("First"), throttled_echo("Second")
+        done = {(RAW_TEXTS[0], 0), (RAW_TEXTS[0], 1), (RAW_TEXTS[1], 0)}
+        outputs = list(
+            self._runner([first, second]).run_many(
+                RAW_TEXTS, done=lambda raw_text, l, j: (raw_text, l) in done
+            )
+        )
+        self.assertEqual(len(first.calls) + len(second.calls), len(RAW_TEXTS) * 2 - 3)
+        # Complete texts are left out, partially done ones only hold their missing outputs
+        self.assertEqual(sorted(o.raw_text for o in outputs), sorted(RAW_TEXTS[1:]))
+        self.assertEqual(
+            {o.raw_text: len(o.processed_outputs) for o in outputs}[RAW_TEXTS[1]], 1
+        )
+
+    def test_finished_units_are_evaluated_together(self):
+        runner = self._runner([throttled_echo("Test")], max_workers=4)
+        with mock.patch.object(
+            runner, "_evaluate_outputs", wraps=runner._evaluate_outputs
+        ) as evaluate:
+            outputs = runner.run_units(RAW_TEXTS * 2)
+            next(outputs)
+            # Every other unit finishes while the first one is being consumed
+            time.sleep(0.1)
+            self.assertEqual(len(list(outputs)), len(RAW_TEXTS) * 2 - 1)
+        sizes = [len(call.args[0]) for call in evaluate.call_args_list]
+        self.assertEqual(sum(sizes), len(RAW_TEXTS) * 2)
+        self.assertLessEqual(len(sizes), 2)
+
+
+class TestScheduledRetries(unittest.TestCase):
+    def _runner(self, llms, max_workers=2, **kwargs):
+        processor = ExponentialBackoffTextProcessor(
+            RetryPolicy(max_attempts=5, min_wait=0.5, max_wait=0.5)
+        )
+        return ScheduledPipelineRunner(
+            TextPreprocessors.STRIP_DIACRITICS.value,
+            processor,
+            llms,
+            [PromptTemplate("{input}")],
+            [Evaluators.RA_CS_CL.value],
+            max_workers=max_workers,
+            **kwargs,
+        )
+
+    def test_backing_off_does_not_block_other_models(self):
+        throttled = throttled_echo("Throttled", failures=1)
+        healthy = throttled_echo("Healthy", delay=0.01)
+        start = time.monotonic()
+        outputs = list(self._runner([throttled, healthy]).run_many(RAW_TEXTS))
+        self.assertEqual(sorted(o.raw_text for o in outputs), sorted(RAW_TEXTS))
+        self.assertEqual(outputs[0].processed_outputs[0].evals[0].score, 1.0)
+        # While the throttled request waited for its retry, both workers kept serving the healthy model
+        self.assertLess(max(healthy.calls) - start, 0.3)
+        self.assertEqual(len(throttled.calls), len(RAW_TEXTS) + 1)
+
+    def test_fatal_errors_are_not_retried(self):
+        llm = throttled_echo("Test", failures=1, error=UnauthorizedError)
+        outputs = []
+        with self.assertRaises(UnauthorizedError):
+            for output in self._runner([llm], max_workers=1).run_many(RAW_TEXTS):
+                outputs.append(output)
+        self.assertEqual(len(outputs), len(RAW_TEXTS) - 1)
+        self.assertEqual(len(llm.calls), len(RAW_TEXTS))
+
+    def test_retries_are_drawn_from_the_budget(self):
+        llm = throttled_echo("Test", failures=100)
+        retry_budget = RetryBudget(ratio=0, min_retries=2)
+        runner = self._runner([llm], retry_budget=retry_budget)
+        self.assertRaises(RateLimitError, list, runner.run_many(RAW_TEXTS))
+        self.assertEqual(len(llm.calls), len(RAW_TEXTS) + 2)
+        self.assertEqual(retry_budget.stats["requests"], len(RAW_TEXTS))
+
+    def test_budget_stops_the_run(self):
+        llm = throttled_echo("Test")
+        runner = self._runner([llm], max_workers=1, budget=TokenBudget(max_tokens=30))
+        self.assertRaises(BudgetExceededError, list, runner.run_many(RAW_TEXTS))
+        self.assertEqual(len(llm.calls), 2)
+
+    def test_units_in_flight_are_yielded_when_the_budget_runs_out(self):
+        slow, fast = throttled_echo("Slow", delay=0.2), throttled_echo("Fast")
+        runner = self._runner([slow, fast], budget=TokenBudget(max_tokens=20))
+        outputs = []
+        with self.assertRaises(BudgetExceededError):
+            for output in runner.run_units(RAW_TEXTS):
+                outputs.append(output)
+        # The slow request was in flight when the fast one exhausted the budget, and it was paid for all the same
+        self.assertEqual(len(slow.calls), 1)
+        self.assertEqual(
+            sorted(o.processed_outputs[0].model for o in outputs), ["Fast", "Slow"]
+        )
+        self.assertEqual(runner.budget.spent_tokens, 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
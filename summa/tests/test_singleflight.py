@@ -0,0 +1,121 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+import unittest
+from summa.budgets import TokenBudget
+from summa.llms import Prompt
+from summa.processors import LatencyTracker
+from summa.singleflight import SingleFlight
+from summa.tests.helpers import EchoModel, make_prompt_template
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.prompt_template = make_prompt_template()
+        self.llm = EchoModel(delay=0.05, cacheable=True)
+
+    def _prompt(self, text="Test"):
+        return Prompt(self.prompt_template, text)
+
+    def test_concurrent_identical_requests_share_one_call(self):
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            outputs = list(
+                executor.map(lambda _: self.llm.generate(self._prompt()), range(8))
+            )
+        self.assertEqual(len(self.llm.calls), 1)
+        self.assertEqual(self.llm.single_flight.stats["coalesced"], 7)
+        self.assertEqual({o.output for o in outputs}, {"Test"})
+        # Every request gets its own output object; the followers' are coalesced, not cache hits
+        self.assertEqual(len({id(o) for o in outputs}), 8)
+        self.assertFalse(any(o.cached for o in outputs))
+        self.assertEqual(sum(o.coalesced for o in outputs), 7)
+
+    def test_followers_are_observed_and_charged(self):
+        budget = TokenBudget()
+        latency_tracker = LatencyTracker()
+
+        def generate(_):
+            output = self.llm.generate(self._prompt())
+            output.record_usage(10, 10)
+            budget.charge(output)
+            latency_tracker.observe(output)
+            return output
+
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            list(executor.map(generate, range(4)))
+        self.assertEqual(len(self.llm.calls), 1)
+        self.assertEqual(budget.spent_tokens, 80)
+        self.assertIsNotNone(
+            latency_tracker.percentile(self.llm.model_version, 50, min_samples=4)
+        )
+
+    def test_different_prompts_are_not_coalesced(self):
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            list(
+                executor.map(
+                    lambda i: self.llm.generate(self._prompt(str(i))), range(4)
+                )
+            )
+        self.assertEqual(len(self.llm.calls), 4)
+        self.assertEqual(self.llm.single_flight.stats["coalesced"], 0)
+
+    def test_async_requests_share_one_call(self):
+        async def _generate():
+            return await asyncio.gather(
+                *[self.llm.agenerate(self._prompt()) for _ in range(8)]
+            )
+
+        outputs = asyncio.run(_generate())
+        self.assertEqual(len(self.llm.calls), 1)
+        self.assertEqual(len(outputs), 8)
+        self.assertEqual(self.llm.single_flight.stats["in_flight"], 0)
+
+    def test_errors_are_shared(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.05)
+            raise ValueError("boom")
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            leader = executor.submit(single_flight.do, "key", fail)
+            started.wait()
+            follower = executor.submit(single_flight.do, "key", fail)
+            self.assertRaises(ValueError, leader.result)
+            self.assertRaises(ValueError, follower.result)
+        self.assertEqual(single_flight.stats["calls"], 1)
+
+    def test_followers_retry_when_the_leader_is_cancelled(self):
+        single_flight = SingleFlight()
+
+        async def call(result, delay):
+            await asyncio.sleep(delay)
+            return result
+
+        async def _run():
+            leader = asyncio.ensure_future(
+                single_flight.ado("key", lambda: call("leader", 1))
+            )
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(
+                single_flight.ado("key", lambda: call("follower", 0))
+            )
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(_run()), ("follower", False))
+        self.assertEqual(single_flight.stats["calls"], 2)
+
+    def test_non_cacheable_models_are_not_coalesced(self):
+        self.llm.cacheable = False
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda _: self.llm.generate(self._prompt()), range(4)))
+        self.assertEqual(len(self.llm.calls), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
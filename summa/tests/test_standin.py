@@ -0,0 +1,138 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import httpx
+from summa.llms import OpenAI, Prompt
+from summa.standin import (
+    LatencyDistribution,
+    ResponseRecording,
+    StandInConfig,
+    StandInServer,
+)
+from summa.tests.helpers import FakeOpenAIModel, make_prompt_template
+
+
+class TestStandInServer(unittest.TestCase):
+    def setUp(self):
+        self.prompt_template = make_prompt_template()
+
+    def _post(self, server, body, **kwargs):
+        return httpx.post(
+            f"{server.base_url}/chat/completions", json=body, timeout=5, **kwargs
+        )
+
+    def _body(self, content="Hello"):
+        return {"model": "standin", "messages": [{"role": "user", "content": content}]}
+
+    def test_client_round_trip(self):
+        with StandInServer() as server:
+            llm = FakeOpenAIModel(server.base_url)
+            output = llm.generate(Prompt(self.prompt_template, "Test"))
+        self.assertEqual(output.output, "Hello, Test!")
+        self.assertEqual(output.prompt_tokens, 3)
+        self.assertEqual(server.stats["responses"], {200: 1})
+
+    def test_streamed_round_trip(self):
+        config = StandInConfig(tokens_per_second=200)
+        with StandInServer(config) as server:
+            llm = FakeOpenAIModel(server.base_url)
+            llm.stream = True
+            output = llm.generate(Prompt(self.prompt_template, "Streaming test"))
+        self.assertEqual(output.output, "Hello, Streaming test!")
+        self.assertLess(output.time_to_first_token, output.time_to_last_token)
+
+    def test_injected_errors_carry_retry_after(self):
+        config = StandInConfig(error_rate_429=1.0, retry_after=7)
+        with StandInServer(config) as server:
+            response = self._post(server, self._body())
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "7")
+        self.assertEqual(response.json()["error"]["code"], "rate_limit_exceeded")
+
+    def test_injected_server_errors(self):
+        config = StandInConfig(error_rate_5xx=1.0, seed=1)
+        with StandInServer(config) as server:
+            responses = [self._post(server, self._body()) for _ in range(10)]
+        self.assertTrue({r.status_code for r in responses} <= {500, 502, 503})
+        self.assertTrue(all("Retry-After" not in r.headers for r in responses))
+
+    def test_request_rate_limit(self):
+        config = StandInConfig(requests_per_minute=2)
+        with StandInServer(config) as server:
+            statuses = [self._post(server, self._body()).status_code for _ in range(3)]
+            response = self._post(server, self._body())
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+
+    def test_token_rate_limit(self):
+        config = StandInConfig(tokens_per_minute=10)
+        with StandInServer(config) as server:
+            first = self._post(server, self._body("x" * 20))
+            second = self._post(server, self._body("x" * 20))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+
+    def test_replay(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "recording.jsonl")
+            recorded = {
+                "id": "chatcmpl-recorded",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "standin",
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": "Recorded"},
+                    }
+                ],
+            }
+            ResponseRecording(path).add(self._body(), recorded)
+            with StandInServer(StandInConfig(record_path=path)) as server:
+                replayed = self._post(server, self._body()).json()
+                echoed = self._post(server, self._body("Other")).json()
+        self.assertEqual(replayed["choices"][0]["message"]["content"], "Recorded")
+        self.assertEqual(echoed["choices"][0]["message"]["content"], "Other")
+        self.assertEqual(server.stats["replayed"], 1)
+
+    def test_record(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "recording.jsonl")
+            with StandInServer(
+                StandInConfig(responder=lambda body: "Upstream")
+            ) as upstream:
+                config = StandInConfig(
+                    record_path=path, mode="record", upstream_base_url=upstream.base_url
+                )
+                with StandInServer(config) as server:
+                    self._post(server, self._body())
+                    self._post(server, self._body())
+            self.assertEqual(upstream.stats["responses"], {200: 1})
+            self.assertEqual(server.stats["recorded"], 1)
+            self.assertEqual(len(ResponseRecording(path)), 1)
+
+    def test_base_url_setting(self):
+        with mock.patch.dict(os.environ, {"SUMMA_OPENAI_BASE_URL": "http://x/v1"}):
+            self.assertEqual(OpenAI().base_url, "http://x/v1")
+
+
+class TestLatencyDistribution(unittest.TestCase):
+    def test_parse(self):
+        latency = LatencyDistribution.parse("lognormal:0.5:0.2", seed=1)
+        self.assertEqual(
+            (latency.kind, latency.mean, latency.stddev), ("lognormal", 0.5, 0.2)
+        )
+        self.assertRaises(ValueError, LatencyDistribution.parse, "pareto:1")
+
+    def test_mean(self):
+        for kind in LatencyDistribution.KINDS:
+            latency = LatencyDistribution(kind, 0.5, 0.2, seed=1)
+            samples = [latency.sample() for _ in range(5000)]
+            self.assertTrue(all(s >= 0 for s in samples))
+            self.assertAlmostEqual(sum(samples) / len(samples), 0.5, delta=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import time
+import unittest
+from unittest import mock
+import httpx
+import openai
+from summa.caches import LLMResponseCache
+from summa.llms import Prompt, TextGenerationOutput
+from summa.tests.helpers import FakeOpenAIModel, make_prompt_template
+
+CHUNKS = ["Hello", ", ", "Test", "!"]
+
+
+def sse_stream(chunk_delay):
+    for i, content in enumerate(CHUNKS):
+        chunk = {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "fake",
+            "choices": [
+                {"index": 0, "delta": {"content": content}, "finish_reason": None}
+            ],
+        }
+        if i:
+            time.sleep(chunk_delay)
+        yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+    yield b"data: [DONE]\n\n"
+
+
+class TestStreamingGeneration(unittest.TestCase):
+    def setUp(self):
+        self.prompt_template = make_prompt_template()
+        self.llm = FakeOpenAIModel("http://stream.test/v1")
+        self.llm.cache = LLMResponseCache()
+        self.llm.stream = True
+
+    def _generate(self):
+        def handler(request):
+            self.assertTrue(json.loads(request.read())["stream"])
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                content=sse_stream(chunk_delay=0.02),
+            )
+
+        client = openai.OpenAI(
+            api_key="key",
+            base_url="http://stream.test/v1",
+            http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        )
+        with mock.patch.object(
+            FakeOpenAIModel,
+            "client",
+            new_callable=mock.PropertyMock,
+            return_value=client,
+        ):
+            return self.llm.generate(Prompt(self.prompt_template, "Test"))
+
+    def test_streamed_output_and_metrics(self):
+        output = self._generate()
+        self.assertEqual(output.output, "Hello, Test!")
+        self.assertLess(output.time_to_first_token, output.time_to_last_token)
+        self.assertLessEqual(output.time_to_last_token, output.generation_time)
+        # 3 chunks after the first one, ~0.02 seconds apart
+        self.assertGreater(output.output_tokens_per_second, 0)
+        self.assertLess(output.output_tokens_per_second, 3 / 0.06 * 1.5)
+
+    def test_metrics_survive_the_cache(self):
+        first = self._generate()
+        cached = self.llm.generate(Prompt(self.prompt_template, "Test"))
+        self.assertTrue(cached.cached)
+        self.assertEqual(cached.time_to_first_token, first.time_to_first_token)
+        self.assertEqual(
+            cached.output_tokens_per_second, first.output_tokens_per_second
+        )
+
+
+class TestTextGenerationOutputTimers(unittest.TestCase):
+    def setUp(self):
+        prompt_template = make_prompt_template()
+        self.output = TextGenerationOutput("Test", "test", Prompt(prompt_template, "x"))
+
+    def test_timer_starts_at_request_send(self):
+        time.sleep(0.05)
+        self.output.start_generation_timer()
+        self.output.measure_generation_time()
+        self.assertLess(self.output.generation_time, 0.05)
+
+    def test_non_streamed_output_has_no_token_metrics(self):
+        self.output.measure_generation_time()
+        self.assertIsNone(self.output.time_to_first_token)
+        self.assertIsNone(self.output.output_tokens_per_second)
+
+
+if __name__ == "__main__":
+    unittest.main()